@@ -1,5 +1,6 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from app.core.config import settings
 from app.core.security import decode_access_token
 from app.services.auth_service import auth_service
 
@@ -16,7 +17,24 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     if payload is None:
         raise credentials_exception
     
-    user = await auth_service.get_user_by_id(payload.get("sub"))
+    try:
+        user_id = int(payload.get("sub"))
+    except (TypeError, ValueError):
+        raise credentials_exception
+    
+    if settings.AUTH_TRUST_TOKEN_CLAIMS and "username" in payload and "email" in payload:
+        return {"id": user_id, "username": payload["username"], "email": payload["email"]}
+    
+    user = await auth_service.get_user_by_id(user_id)
     if user is None:
         raise credentials_exception
     return user
+
+async def get_advisor_admin(current_user: dict = Depends(get_current_user)):
+    """The current user, if allowed to see other users' queries, change the analytics database through the query advisor, and drop the shared caches"""
+    if current_user["username"] not in settings.ADVISOR_ADMIN_USERNAMES:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only advisor admins can use this endpoint"
+        )
+    return current_user
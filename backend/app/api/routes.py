@@ -1,19 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
 from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
-from typing import List
+from typing import List, Literal, Optional
 
 from app.core.config import settings
+from app.core.encoding import json_dumps
+from app.core.database import pool_manager, read_db
 from app.core.security import create_access_token
-from app.api.deps import get_current_user
+from app.api.deps import get_advisor_admin, get_current_user
 from app.services.auth_service import auth_service
 from app.services.chat_service import chat_service
+from app.services.schema_catalog import schema_catalog
+from app.services.sql_cache import sql_cache
+from app.services.result_cache import result_cache
+from app.services.job_service import job_service
+from app.services.query_advisor import query_advisor
+from app.services.result_encoding import (
+    ARROW_STREAM_MEDIA_TYPE, arrow_available, encode_columnar, encode_rows, to_arrow_ipc
+)
+from app.services.result_store import result_store
+from app.services.stream_runs import stream_runs
 from app.api.schemas import (
     UserCreate, UserResponse, Token, ChatCreate, 
-    ChatResponse, QueryRequest, SchemaResponse, MessageResponse
+    ChatResponse, QueryRequest, BatchQueryRequest, JobCreate, JobResponse,
+    SchemaResponse, MessageResponse
 )
-from app.core.auth_database import auth_db
 
 router = APIRouter()
 
@@ -23,39 +36,196 @@ async def get_schema():
     schema = await chat_service.get_database_info()
     return {"schema": schema}
 
+@router.post("/schema/refresh")
+async def refresh_schema(current_user: dict = Depends(get_advisor_admin)):
+    """Reload the cached schema catalog"""
+    snapshot = await schema_catalog.refresh()
+    return {"version": snapshot.version, "fingerprint": snapshot.fingerprint}
+
 @router.post("/query")
-async def process_query(request: QueryRequest):
-    """Process query with streaming"""
+async def process_query(request: QueryRequest, current_user: dict = Depends(get_current_user)):
+    """Process query with streaming.
+
+    The first event carries a run_id; a client that loses the connection can
+    resume through /query/runs/{run_id}/events on the same worker. Work stops
+    once no client has read the stream for STREAM_RUN_RESUME_GRACE_SECONDS
+    (at once by default).
+    """
+    if request.result_format == "arrow" and not arrow_available():
+        raise HTTPException(status_code=501, detail="Arrow results require pyarrow to be installed")
+    await chat_service.check_chat_owner(request.chat_id, current_user["id"])
+    run = stream_runs.start(lambda is_abandoned: chat_service.process_user_query_stream(
+        request.question, request.chat_id, is_abandoned, request.result_format
+    ), current_user["id"])
+    return StreamingResponse(
+        run.subscribe(),
+        media_type='text/event-stream',
+        headers={"X-Run-Id": run.run_id}
+    )
+
+@router.get("/query/runs/{run_id}/events")
+async def resume_query(
+    run_id: str,
+    last_event_id: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """Replay the events after Last-Event-ID of a query stream, then follow it live"""
+    return StreamingResponse(
+        stream_runs.resume(run_id, current_user["id"], last_event_id),
+        media_type='text/event-stream'
+    )
+
+@router.delete("/query/runs/{run_id}")
+async def cancel_query(run_id: str, current_user: dict = Depends(get_current_user)):
+    """Stop a query stream; the part of the answer generated so far is saved"""
+    stream_runs.get(run_id, current_user["id"]).cancel()
+    return {"message": "Query stream cancelled"}
+
+@router.post("/query/batch")
+async def process_query_batch(request: BatchQueryRequest, current_user: dict = Depends(get_current_user)):
+    """Answer several questions concurrently, streaming NDJSON lines as each completes"""
+    if request.chat_id is not None:
+        await chat_service.check_chat_owner(request.chat_id, current_user["id"])
+    if len(request.questions) > settings.BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch can hold at most {settings.BATCH_MAX_QUESTIONS} questions"
+        )
+    concurrency = min(request.concurrency or settings.BATCH_MAX_CONCURRENCY, settings.BATCH_MAX_CONCURRENCY)
+    return StreamingResponse(
+        chat_service.process_batch(request.questions, request.chat_id, concurrency, request.explain),
+        media_type="application/x-ndjson"
+    )
+
+@router.get("/results/{query_id}")
+async def get_query_result(query_id: str, current_user: dict = Depends(get_current_user)):
+    """Fetch the rows of a finished query as an Apache Arrow IPC stream"""
+    if not arrow_available():
+        raise HTTPException(status_code=501, detail="Arrow results require pyarrow to be installed")
+    stored = result_store.get(query_id)
+    if stored is None or not await chat_service.owns_chat(stored[0], current_user["id"]):
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    result = stored[1]
+    body = await asyncio.to_thread(
+        to_arrow_ipc, result.columns, result.rows, settings.QUERY_BATCH_ROWS
+    )
+    return Response(content=body, media_type=ARROW_STREAM_MEDIA_TYPE)
+
+@router.post("/jobs", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(job: JobCreate, current_user: dict = Depends(get_current_user)):
+    """Queue a question to be answered in the background"""
+    return await job_service.submit(current_user["id"], job.question, job.chat_id)
+
+@router.get("/jobs", response_model=List[JobResponse])
+async def list_jobs(
+    limit: int = Query(50, ge=1, le=settings.MAX_PAGE_SIZE),
+    current_user: dict = Depends(get_current_user)
+):
+    """The user's most recent jobs"""
+    return await job_service.list_jobs(current_user["id"], limit)
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    return await job_service.get(job_id, current_user["id"])
+
+@router.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Stream status changes of a job until it finishes"""
+    await job_service.get(job_id, current_user["id"])
     return StreamingResponse(
-        chat_service.process_user_query_stream(request.question, request.chat_id),
+        job_service.events(job_id, current_user["id"]),
         media_type='text/event-stream'
     )
 
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(
+    job_id: str,
+    result_format: Literal["rows", "columnar", "arrow"] = "rows",
+    current_user: dict = Depends(get_current_user)
+):
+    """Rows of a succeeded job as JSON objects, JSON columns or an Arrow IPC stream"""
+    if result_format == "arrow" and not arrow_available():
+        raise HTTPException(status_code=501, detail="Arrow results require pyarrow to be installed")
+    columns, rows = await job_service.get_result(job_id, current_user["id"])
+    names = [column["name"] for column in columns]
+    if result_format == "arrow":
+        body = await asyncio.to_thread(to_arrow_ipc, names, rows, settings.QUERY_BATCH_ROWS)
+        return Response(content=body, media_type=ARROW_STREAM_MEDIA_TYPE)
+    if result_format == "columnar":
+        content = encode_columnar(rows, len(names))
+    else:
+        content = encode_rows(names, rows)
+    return Response(
+        content='{"columns": ' + json_dumps(columns) + ', "format": "' + result_format + '", "content": ' + content + "}",
+        media_type="application/json"
+    )
+
+@router.delete("/jobs/{job_id}", response_model=JobResponse)
+async def cancel_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Cancel a queued or running job"""
+    return await job_service.cancel(job_id, current_user["id"])
+
+@router.get("/cache/stats")
+async def get_cache_stats(current_user: dict = Depends(get_current_user)):
+    """Get cache hit/miss counters"""
+    return {"sql_cache": sql_cache.stats(), "result_cache": result_cache.stats()}
+
+@router.get("/advisor/queries")
+async def get_hot_queries(
+    limit: int = Query(20, ge=1, le=settings.MAX_PAGE_SIZE),
+    current_user: dict = Depends(get_advisor_admin)
+):
+    """Get the SQL shapes using the most database time in this worker, with view proposals"""
+    return {"queries": query_advisor.hot_queries(limit)}
+
+@router.get("/advisor/views")
+async def get_materialized_views(current_user: dict = Depends(get_current_user)):
+    """Get the materialized views created by the advisor"""
+    return {"views": await query_advisor.list_views()}
+
+@router.post("/advisor/views/{fingerprint}", status_code=status.HTTP_201_CREATED)
+async def create_materialized_view(fingerprint: str, current_user: dict = Depends(get_advisor_admin)):
+    """Materialize the view proposed for a hot query shape"""
+    return await query_advisor.materialize(fingerprint)
+
+@router.delete("/advisor/views/{name}")
+async def drop_materialized_view(name: str, current_user: dict = Depends(get_advisor_admin)):
+    """Drop a materialized view created by the advisor"""
+    return await query_advisor.drop(name)
+
+@router.get("/pools/stats")
+async def get_pool_stats(current_user: dict = Depends(get_current_user)):
+    """Get usage, waiting clients and checkout latency of each connection pool"""
+    return {"pools": pool_manager.stats(), "replica_fallbacks": read_db.fallbacks}
+
+@router.delete("/cache")
+async def clear_caches(
+    table: Optional[str] = None,
+    current_user: dict = Depends(get_advisor_admin)
+):
+    """Drop all cached entries, or only the results that read from one table"""
+    if table is not None:
+        removed = result_cache.invalidate(table)
+        return {"message": f"Invalidated {removed} cached results for {table}"}
+    await sql_cache.clear()
+    result_cache.invalidate()
+    return {"message": "Caches cleared"}
+
 @router.get("/chats/{chat_id}/messages", response_model=List[MessageResponse])
 async def get_chat_messages(
     chat_id: int,
+    response: Response,
+    limit: int = Query(settings.MESSAGES_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    async with auth_db.get_conn() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(
-                """
-                SELECT m.id, m.chat_id, m.role, m.content, m.created_at 
-                FROM messages m
-                JOIN chats c ON m.chat_id = c.id
-                WHERE c.user_id = %s AND m.chat_id = %s
-                ORDER BY m.created_at
-                """,
-                (current_user["id"], chat_id)
-            )
-            messages = await cur.fetchall()
-            return [{
-                "id": msg[0],
-                "chat_id": msg[1],
-                "role": msg[2],
-                "content": msg[3],
-                "created_at": msg[4]
-            } for msg in messages]
+    """Newest messages of a chat; X-Next-Cursor pages back to older ones"""
+    messages, next_cursor = await chat_service.get_chat_messages(
+        chat_id, current_user["id"], limit, cursor
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return messages
 
 @router.post("/auth/signup", response_model=UserResponse)
 async def signup(user_data: UserCreate):
@@ -72,7 +242,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         )
     
     access_token = create_access_token(
-        data={"sub": str(user["id"])},
+        data={"sub": str(user["id"]), "username": user["username"], "email": user["email"]},
         expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     )
     
@@ -90,8 +260,17 @@ async def create_chat(
     return await chat_service.create_chat(current_user["id"], chat_data.title)
 
 @router.get("/chats", response_model=List[ChatResponse])
-async def get_chats(current_user: dict = Depends(get_current_user)):
-    return await chat_service.get_user_chats(current_user["id"])
+async def get_chats(
+    response: Response,
+    limit: int = Query(settings.CHATS_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Newest chats first; X-Next-Cursor loads the next page"""
+    chats, next_cursor = await chat_service.get_user_chats(current_user["id"], limit, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return chats
 
 @router.delete("/chats/{chat_id}")
 async def delete_chat(
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Literal, Optional
 from datetime import datetime
 
 class MessageResponse(BaseModel):
@@ -12,6 +12,38 @@ class MessageResponse(BaseModel):
 class QueryRequest(BaseModel):
     question: str
     chat_id: int  
+    # "rows": objects per row, "columnar": value arrays per column,
+    # "arrow": no inline rows, fetch GET /results/{query_id} instead
+    result_format: Literal["rows", "columnar", "arrow"] = "rows"
+
+class BatchQueryRequest(BaseModel):
+    questions: List[str] = Field(min_length=1)
+    # Without a chat the questions see no history and nothing is saved
+    chat_id: Optional[int] = None
+    # Lower than BATCH_MAX_CONCURRENCY to go easier on the database
+    concurrency: Optional[int] = Field(None, ge=1)
+    explain: bool = True
+
+class JobCreate(BaseModel):
+    question: str
+    chat_id: Optional[int] = None
+
+class JobResponse(BaseModel):
+    job_id: str
+    chat_id: Optional[int]
+    question: str
+    # queued, running, succeeded, failed or cancelled
+    status: str
+    attempts: int
+    sql_query: Optional[str]
+    row_count: Optional[int]
+    truncated: Optional[bool]
+    explanation: Optional[str]
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    expires_at: Optional[datetime]
 
 class QueryResponse(BaseModel):
     success: bool
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "Database Query API"
@@ -18,13 +18,152 @@ class Settings(BaseSettings):
     AUTH_DB_USER: str = "postgres"  # Make sure this matches your PostgreSQL user
     AUTH_DB_PASSWORD: str = "postgres"  # Make sure this matches your PostgreSQL password
     
+    # Connection pools
+    DB_POOL_MIN_SIZE: int = 5
+    DB_POOL_MAX_SIZE: int = 20
+    AUTH_DB_POOL_MIN_SIZE: int = 5
+    AUTH_DB_POOL_MAX_SIZE: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0  # Wait for a free connection before failing
+    DB_POOL_MAX_WAITING: int = 0  # Clients allowed to queue for a connection, 0 = unlimited
+    DB_POOL_MAX_IDLE_SECONDS: float = 600.0
+    DB_POOL_MAX_LIFETIME_SECONDS: float = 3600.0
+    
+    # Read replicas for generated analytics SQL ("host", "host:port" or a conninfo string)
+    DB_READ_REPLICAS: List[str] = []
+    DB_REPLICA_ROUTING: str = "round_robin"  # or "least_loaded"
+    DB_REPLICA_POOL_MIN_SIZE: int = 2
+    DB_REPLICA_POOL_MAX_SIZE: int = 20
+    DB_HEALTH_CHECK_INTERVAL_SECONDS: float = 10.0
+    DB_HEALTH_CHECK_TIMEOUT_SECONDS: float = 5.0
+    
+    # Schema catalog
+    SCHEMA_CACHE_TTL_SECONDS: int = 300
+    SCHEMA_LISTEN_ENABLED: bool = True
+    SCHEMA_LISTEN_CHANNEL: str = "schema_catalog_changed"
+    
+    # Query execution
+    QUERY_BATCH_ROWS: int = 500
+    QUERY_MAX_ROWS: int = 10000
+    QUERY_MAX_BYTES: int = 5_000_000
+    RESULT_SUMMARY_THRESHOLD_BYTES: int = 16384  # Larger results reach the model as a summary, 0 = never
+    RESULT_SUMMARY_SAMPLE_ROWS: int = 5  # Rows shown from the start and from the end
+    RESULT_SUMMARY_TOP_VALUES: int = 5  # Most common values listed per text column
+    QUERY_STATEMENT_TIMEOUT_MS: int = 15000
+    QUERY_LOCK_TIMEOUT_MS: int = 2000
+    QUERY_EXPLAIN_ENABLED: bool = True
+    QUERY_MAX_COST: float = 1_000_000  # Planner cost units, 0 disables the check
+    QUERY_AUTO_LIMIT: bool = True
+    QUERY_PREPARED_STATEMENTS: bool = True  # Run literals as parameters of statements prepared per connection
+    QUERY_PREPARED_MAX: int = 100  # Prepared statements kept per pooled connection (LRU)
+    
+    # Prompt retrieval
+    PROMPT_RETRIEVAL_ENABLED: bool = True
+    PROMPT_TOP_K_TABLES: int = 6
+    PROMPT_TOP_K_EXAMPLES: int = 3
+    PROMPT_MIN_SCORE: float = 1.0
+    
+    # Chat history
+    HISTORY_TOKEN_BUDGET: int = 3000
+    HISTORY_CACHE_MAX_CHATS: int = 1000
+    HISTORY_CACHE_TTL_SECONDS: int = 600
+    HISTORY_SUMMARY_ENABLED: bool = True
+    HISTORY_SUMMARY_MODEL: str = "gpt-4o-mini"
+    
+    # Message persistence
+    MESSAGE_WRITE_BEHIND: bool = True
+    MESSAGE_QUEUE_MAX_SIZE: int = 10000
+    MESSAGE_BATCH_SIZE: int = 200
+    MESSAGE_FLUSH_INTERVAL_MS: int = 50
+    
+    # Question-to-SQL cache
+    SQL_CACHE_ENABLED: bool = True
+    SQL_CACHE_BACKEND: str = "memory"  # "memory" or "sqlite"
+    SQL_CACHE_PATH: str = "sql_cache.sqlite3"
+    SQL_CACHE_MAX_ENTRIES: int = 1000
+    SQL_CACHE_TTL_SECONDS: int = 3600
+    SQL_CACHE_HISTORY_FREE_ONLY: bool = True  # False also caches follow-ups, keyed by the history sent with them
+    
+    # Result-set cache
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESULT_CACHE_TTL_SECONDS: int = 300
+    RESULT_CACHE_TABLE_TTLS: Dict[str, int] = {}  # e.g. {"rental": 60, "category": 86400}
+
+    # Identical concurrent SQL executions and history-free SQL generations share one call
+    SINGLE_FLIGHT_ENABLED: bool = True
+
+    # Resumable query streams (per worker)
+    STREAM_RUN_MAX_RUNS: int = 1000
+    STREAM_RUN_BUFFER_BYTES: int = 1_048_576  # Events kept per stream for replay
+    STREAM_RUN_RESUME_GRACE_SECONDS: float = 0.0  # A stream nobody reads is cancelled after this, 0 = at once (no resume after a disconnect)
+    STREAM_RUN_TTL_SECONDS: float = 120.0  # Finished streams can be replayed for this long
+
+    # Chat and message list pagination
+    CHATS_PAGE_SIZE: int = 50
+    MESSAGES_PAGE_SIZE: int = 100
+    MAX_PAGE_SIZE: int = 500
+
+    # Batch questions
+    BATCH_MAX_QUESTIONS: int = 100
+    BATCH_MAX_CONCURRENCY: int = 8  # Questions of one batch answered at the same time
+    
+    # Query jobs (questions answered in the background, results kept in the auth DB)
+    JOB_WORKERS: int = 2  # Jobs run at a time by each API process, 0 = only accept jobs
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    JOB_TIMEOUT_SECONDS: float = 1800.0  # Runs taking longer fail; stuck runs are retried after this
+    JOB_MAX_ATTEMPTS: int = 2
+    JOB_RESULT_TTL_SECONDS: int = 86400  # Finished jobs are deleted after this
+    JOB_STATEMENT_TIMEOUT_MS: int = 600000
+    JOB_MAX_COST: float = 100000000.0  # EXPLAIN cost limit for job queries, 0 = no limit
+    
+    # Materialization advisor (hot aggregate queries precomputed as materialized views)
+    ADVISOR_ENABLED: bool = True  # Track the shapes of executed SQL
+    ADVISOR_MAX_SHAPES: int = 500
+    ADVISOR_MIN_EXECUTIONS: int = 20  # A shape is a candidate after this many runs...
+    ADVISOR_MIN_TOTAL_SECONDS: float = 10.0  # ...and this much database time
+    ADVISOR_AUTO_MATERIALIZE: bool = False  # Create views for candidates without being asked
+    ADVISOR_MAX_VIEWS: int = 10
+    ADVISOR_VIEW_PREFIX: str = "mv_hot_"
+    ADVISOR_REFRESH_INTERVAL_SECONDS: int = 3600
+    ADVISOR_CHECK_INTERVAL_SECONDS: float = 60.0
+    ADVISOR_STATEMENT_TIMEOUT_MS: int = 600000  # Creating or refreshing one view
+    ADVISOR_ADMIN_USERNAMES: List[str] = []  # Users allowed to list hot queries, create and drop views, and clear caches through the API
+    
+    # Result transport (results fetched by query id, e.g. as Arrow IPC)
+    RESULT_STORE_MAX_ENTRIES: int = 32
+    RESULT_STORE_TTL_SECONDS: int = 300
+    
     # JWT
     JWT_SECRET_KEY: str = "your-secret-key"  # Change this in production
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    AUTH_USER_CACHE_TTL_SECONDS: int = 300
+    AUTH_USER_CACHE_MAX_ENTRIES: int = 10000
+    AUTH_TOKEN_CACHE_MAX_ENTRIES: int = 10000
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64  # Hash/verify calls allowed to wait beyond the workers
+    AUTH_TRUST_TOKEN_CLAIMS: bool = False  # Skip the user lookup for tokens carrying user claims
+    
+    # Production server (serve.py)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0  # Worker processes, 0 = one per CPU
+    SERVER_GRACEFUL_TIMEOUT_SECONDS: float = 30.0  # Time in-flight streams get to finish on shutdown
+    SERVER_WARMUP: bool = True  # Open pool connections and build prompt indexes before serving
+    
+    # Telemetry
+    METRICS_ENABLED: bool = True  # Serve Prometheus metrics on /metrics
+    OTEL_ENABLED: bool = False  # Also emit OpenTelemetry spans (needs opentelemetry-api)
     
     # API
     OPENAI_API_KEY: str
+    OPENAI_MODEL: str = "gpt-4o-2024-11-20"
+    OPENAI_BASE_URL: Optional[str] = None  # OpenAI-compatible endpoint, e.g. the benchmark stand-in
+    OPENAI_TIMEOUT_SECONDS: float = 60.0
+    OPENAI_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    OPENAI_MAX_RETRIES: int = 2
+    OPENAI_MAX_CONNECTIONS: int = 200
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 50
     CORS_ORIGINS: List[str] = ["*"]
     
     class Config:
@@ -1,42 +1,251 @@
+import asyncio
+import itertools
+import logging
+import time
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator, Dict, List, Optional
+import psycopg
 import psycopg_pool
 from psycopg import AsyncConnection
-from psycopg.rows import dict_row
+from psycopg.conninfo import make_conninfo
 
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
+def analytics_conninfo(host: str) -> str:
+    """Conninfo for the analytics database on a host ("host" or "host:port")"""
+    if "=" in host:
+        # Already a full libpq connection string
+        return host
+    host, _, port = host.partition(":")
+    return make_conninfo(
+        host=host,
+        port=port or None,
+        dbname=settings.DB_NAME,
+        user=settings.DB_USER,
+        password=settings.DB_PASSWORD
+    )
+
 class DatabasePool:
-    def __init__(self):
+    """A named connection pool with checkout telemetry"""
+
+    def __init__(
+        self,
+        name: str,
+        conninfo: str,
+        min_size: int = settings.DB_POOL_MIN_SIZE,
+        max_size: int = settings.DB_POOL_MAX_SIZE
+    ):
+        self.name = name
+        self.conninfo = conninfo
+        self.min_size = min_size
+        self.max_size = max_size
         self.pool = None
+        self.healthy = True
+        self.in_use = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.checkout_errors = 0
+        self.checkout_seconds = 0.0
+        self.max_checkout_seconds = 0.0
 
-    async def initialize(self):
-        """Initialize the connection pool"""
+    async def initialize(self, wait: bool = False):
+        """Initialize the connection pool; with wait, until min_size connections are open"""
         if not self.pool:
             self.pool = psycopg_pool.AsyncConnectionPool(
-                conninfo=(
-                    f"host={settings.DB_HOST} "
-                    f"dbname={settings.DB_NAME} "
-                    f"user={settings.DB_USER} "
-                    f"password={settings.DB_PASSWORD}"
-                ),
-                min_size=5,
-                max_size=20,
+                conninfo=self.conninfo,
+                name=self.name,
+                min_size=self.min_size,
+                max_size=self.max_size,
+                timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+                max_waiting=settings.DB_POOL_MAX_WAITING,
+                max_idle=settings.DB_POOL_MAX_IDLE_SECONDS,
+                max_lifetime=settings.DB_POOL_MAX_LIFETIME_SECONDS,
                 open=False # Don't open in constructor
             )
-        await self.pool.open() # Explicitly open the pool
+        try:
+            await self.pool.open(wait=wait, timeout=settings.DB_POOL_TIMEOUT_SECONDS) # Explicitly open the pool
+        except psycopg_pool.PoolTimeout:
+            # Keep starting; the pool goes on connecting in the background
+            logger.warning("Pool %s could not open %d connections at startup", self.name, self.min_size)
+
+    async def getconn(self) -> AsyncConnection:
+        """Check a connection out of the pool; return it with putconn()"""
+        if not self.pool:
+            await self.initialize()
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            conn = await self.pool.getconn()
+        except Exception:
+            self.checkout_errors += 1
+            raise
+        finally:
+            self.waiting -= 1
+        elapsed = time.perf_counter() - start
+        self.checkouts += 1
+        self.checkout_seconds += elapsed
+        self.max_checkout_seconds = max(self.max_checkout_seconds, elapsed)
+        self.in_use += 1
+        return conn
+
+    async def putconn(self, conn: AsyncConnection):
+        self.in_use -= 1
+        await self.pool.putconn(conn)
 
     @asynccontextmanager
     async def get_conn(self) -> AsyncGenerator[AsyncConnection, None]:
         """Get a database connection from the pool"""
-        if not self.pool:
-            await self.initialize()
-        async with self.pool.connection() as conn:
+        conn = await self.getconn()
+        try:
             yield conn
+        finally:
+            await self.putconn(conn)
+
+    async def connect(self, **kwargs) -> AsyncConnection:
+        """Open a dedicated connection outside the pool (e.g. for LISTEN)"""
+        return await AsyncConnection.connect(self.conninfo, **kwargs)
+
+    async def check_health(self) -> bool:
+        """Probe the server and evict broken idle connections"""
+        try:
+            async with self.pool.connection(timeout=settings.DB_HEALTH_CHECK_TIMEOUT_SECONDS) as conn:
+                await conn.execute("SELECT 1")
+            await self.pool.check()
+            self.healthy = True
+        except Exception as e:
+            if self.healthy:
+                logger.warning("Pool %s failed its health check: %s", self.name, e)
+            self.healthy = False
+        return self.healthy
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {
+            "healthy": self.healthy,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "checkouts": self.checkouts,
+            "checkout_errors": self.checkout_errors,
+            "avg_checkout_ms": self.checkout_seconds / self.checkouts * 1000 if self.checkouts else 0.0,
+            "max_checkout_ms": self.max_checkout_seconds * 1000,
+        }
+        if self.pool:
+            pool_stats = self.pool.get_stats()
+            stats.update({
+                "size": pool_stats.get("pool_size", 0),
+                "available": pool_stats.get("pool_available", 0),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "usage_ms": pool_stats.get("usage_ms", 0),
+                "connections_lost": pool_stats.get("connections_lost", 0),
+                "connection_errors": pool_stats.get("connections_errors", 0),
+            })
+        return stats
 
     async def close_all(self):
         """Close all connections"""
         if self.pool:
             await self.pool.close()
 
-db = DatabasePool()
\ No newline at end of file
+class ReplicaRouter:
+    """Routes read-only analytics connections to healthy read replicas.
+
+    Replicas that fail a checkout or a health check leave the rotation until
+    a later health check succeeds. With no healthy replica (or none
+    configured) connections come from the primary pool.
+    """
+
+    def __init__(
+        self,
+        primary: DatabasePool,
+        replicas: List[DatabasePool],
+        strategy: str = settings.DB_REPLICA_ROUTING,
+        check_interval: float = settings.DB_HEALTH_CHECK_INTERVAL_SECONDS
+    ):
+        self.primary = primary
+        self.replicas = replicas
+        self.strategy = strategy
+        self.check_interval = check_interval
+        self._round_robin = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+        self.fallbacks = 0
+
+    def choose(self) -> DatabasePool:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return self.primary
+        if self.strategy == "least_loaded":
+            return min(healthy, key=lambda replica: replica.in_use + replica.waiting)
+        return healthy[next(self._round_robin) % len(healthy)]
+
+    @asynccontextmanager
+    async def get_conn(self) -> AsyncGenerator[AsyncConnection, None]:
+        """Get a connection for a read-only query"""
+        pool = self.choose()
+        try:
+            conn = await pool.getconn()
+        except (psycopg.OperationalError, psycopg_pool.PoolTimeout) as e:
+            if pool is self.primary:
+                raise
+            logger.warning("Replica %s unavailable, using the primary: %s", pool.name, e)
+            pool.healthy = False
+            self.fallbacks += 1
+            pool = self.primary
+            conn = await pool.getconn()
+        try:
+            yield conn
+        finally:
+            await pool.putconn(conn)
+
+    def start(self):
+        if self.replicas and self._task is None:
+            self._task = asyncio.create_task(self._check_replicas())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _check_replicas(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await asyncio.gather(*(replica.check_health() for replica in self.replicas))
+
+class PoolManager:
+    """Registry of the named pools, opened and closed together"""
+
+    def __init__(self):
+        self.pools: Dict[str, DatabasePool] = {}
+
+    def add(self, pool: DatabasePool) -> DatabasePool:
+        self.pools[pool.name] = pool
+        return pool
+
+    async def open_all(self, wait: bool = False):
+        """Open every pool concurrently"""
+        await asyncio.gather(*(pool.initialize(wait) for pool in self.pools.values()))
+
+    async def close_all(self):
+        await asyncio.gather(*(pool.close_all() for pool in self.pools.values()))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+pool_manager = PoolManager()
+
+db = pool_manager.add(DatabasePool("analytics", analytics_conninfo(settings.DB_HOST)))
+
+read_db = ReplicaRouter(db, [
+    pool_manager.add(DatabasePool(
+        f"replica-{i}",
+        analytics_conninfo(host),
+        settings.DB_REPLICA_POOL_MIN_SIZE,
+        settings.DB_REPLICA_POOL_MAX_SIZE
+    ))
+    for i, host in enumerate(settings.DB_READ_REPLICAS)
+])
@@ -0,0 +1,16 @@
+from decimal import Decimal
+from typing import Any
+
+import orjson
+
+def _default(value: Any) -> Any:
+    """Fallback for database types orjson does not serialize natively"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, memoryview):
+        return value.tobytes().hex()
+    return str(value)
+
+def json_dumps(value: Any) -> str:
+    """Serialize query rows and events to a compact JSON string"""
+    return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS).decode()
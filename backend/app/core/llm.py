@@ -0,0 +1,33 @@
+import anyio
+import httpx
+from openai import AsyncOpenAI, AsyncStream, DefaultAsyncHttpxClient
+
+from app.core.config import settings
+
+def create_llm_client() -> AsyncOpenAI:
+    """Create the async OpenAI client with its own pooled HTTP transport"""
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        max_retries=settings.OPENAI_MAX_RETRIES,
+        timeout=httpx.Timeout(
+            settings.OPENAI_TIMEOUT_SECONDS,
+            connect=settings.OPENAI_CONNECT_TIMEOUT_SECONDS
+        ),
+        http_client=DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS
+            )
+        )
+    )
+
+
+async def close_stream(stream: AsyncStream):
+    """Close a streamed completion, even from a task that is being cancelled.
+
+    Closing the response drops the HTTP connection, which makes OpenAI stop
+    generating (and billing) the rest of the completion.
+    """
+    with anyio.CancelScope(shield=True):
+        await stream.close()
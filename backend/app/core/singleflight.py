@@ -0,0 +1,109 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+SINGLE_FLIGHT_CALLS = registry.counter(
+    "single_flight_calls_total",
+    "Calls that started a shared in-flight operation (leader) or joined one (follower)",
+    ("operation", "role")
+)
+
+class _Flight:
+    def __init__(self, future: "asyncio.Future[Any]"):
+        self.future = future
+        self.waiters = 0
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one in-flight operation.
+
+    The first caller for a key becomes the leader; callers arriving while it
+    runs wait for the same outcome, result or exception. A waiter that is
+    cancelled only stops waiting, unless it is the last one left.
+    """
+
+    def __init__(self, operation: str, enabled: bool = settings.SINGLE_FLIGHT_ENABLED):
+        self.operation = operation
+        self.enabled = enabled
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: Optional[Hashable], fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn, or wait for the identical call already running under key.
+
+        The result is shared between all callers, so they must not mutate it.
+        A None key runs fn without coalescing.
+        """
+        if key is None or not self.enabled:
+            return await fn()
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fn()))
+            self._flights[key] = flight
+            flight.future.add_done_callback(lambda _: self._forget(key, flight))
+            SINGLE_FLIGHT_CALLS.inc(self.operation, "leader")
+        else:
+            SINGLE_FLIGHT_CALLS.inc(self.operation, "follower")
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.future)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.future.done():
+                flight.future.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def lead(self, key: Optional[Hashable]) -> Optional["asyncio.Future[Any]"]:
+        """Register the caller as the leader for key when nobody else is.
+
+        Returns the future the caller must resolve with settle(), or None when
+        the caller should run without coalescing.
+        """
+        if key is None or not self.enabled or key in self._flights:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        self._flights[key] = _Flight(future)
+        SINGLE_FLIGHT_CALLS.inc(self.operation, "leader")
+        return future
+
+    def settle(self, key: Hashable, future: "asyncio.Future[Any]", result: Any = None, error: Optional[BaseException] = None):
+        """Hand a leader's outcome to its followers and retire the flight"""
+        flight = self._flights.get(key)
+        if flight is not None and flight.future is future:
+            del self._flights[key]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+            future.exception()
+        else:
+            future.set_result(result)
+
+    async def follow(self, key: Optional[Hashable]) -> Any:
+        """Wait for the leader running under key.
+
+        Returns None when there is no such leader or it ended without a result;
+        re-raises the leader's error.
+        """
+        if key is None or not self.enabled:
+            return None
+        flight = self._flights.get(key)
+        if flight is None:
+            return None
+        SINGLE_FLIGHT_CALLS.inc(self.operation, "follower")
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.future)
+        finally:
+            flight.waiters -= 1
+
+    def _forget(self, key: Hashable, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.future.cancelled():
+            # Mark the error retrieved even if every waiter gave up
+            flight.future.exception()
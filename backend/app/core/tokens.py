@@ -0,0 +1,26 @@
+from functools import lru_cache
+from typing import Callable
+
+from app.core.config import settings
+
+@lru_cache(maxsize=1)
+def _encoder() -> Callable[[str], int]:
+    """Use tiktoken when it is installed and its encoding is available locally"""
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(settings.OPENAI_MODEL)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception:
+        # Roughly four characters per token for English text and SQL
+        return lambda text: (len(text) + 3) // 4
+
+def count_tokens(text: str) -> int:
+    """Count (or estimate) the prompt tokens a piece of text will use"""
+    return _encoder()(text) if text else 0
+
+def count_message_tokens(role: str, content: str) -> int:
+    # Every chat message carries a few tokens of role/formatting overhead
+    return count_tokens(content) + 4
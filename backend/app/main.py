@@ -1,20 +1,65 @@
+import logging
+import os
+import time
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from typing import Dict
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.routes import router
 from app.core.config import settings
-from app.core.database import db
-from app.core.auth_database import auth_db
+from app.core.database import pool_manager, read_db
+from app.core.auth_database import auth_db  # noqa: F401  registers the auth pool
+from app.core.metrics import MetricsMiddleware, registry
+from app.core.security import password_hasher
+from app.services.schema_catalog import schema_catalog
+from app.services.chat_service import chat_service
+from app.services.job_service import job_service
+from app.services.query_advisor import query_advisor
+from app.services.stream_runs import stream_runs
+from app.services.message_writer import message_writer
+from app.services.telemetry import render_metrics
 
+logger = logging.getLogger(__name__)
+
+# Seconds spent warming up and, when started by serve.py, from launch to ready
+startup_timings: Dict[str, float] = {}
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await db.initialize()
-    await auth_db.initialize()
+    started = time.perf_counter()
+    await pool_manager.open_all(wait=settings.SERVER_WARMUP)
+    read_db.start()
+    await schema_catalog.start()
+    if settings.SERVER_WARMUP:
+        await chat_service.warm_up()
+    if settings.MESSAGE_WRITE_BEHIND:
+        message_writer.start()
+    job_service.start()
+    query_advisor.start()
+    startup_timings["warmup"] = time.perf_counter() - started
+    launched_at = os.environ.get("SERVER_LAUNCHED_AT")
+    if launched_at:
+        startup_timings["cold_start"] = time.time() - float(launched_at)
+    logger.info(
+        "Worker %d ready: warm-up %.2fs, cold start %s",
+        os.getpid(),
+        startup_timings["warmup"],
+        f"{startup_timings['cold_start']:.2f}s" if launched_at else "n/a"
+    )
     yield
-    await db.close_all()
-    await auth_db.close_all()
+    # The server has stopped accepting requests and waited for open streams
+    if chat_service.streams_in_flight:
+        logger.warning("Cancelled %d streams at shutdown", chat_service.streams_in_flight)
+    await stream_runs.stop()
+    await query_advisor.stop()
+    await job_service.stop()
+    await message_writer.stop()
+    await schema_catalog.stop()
+    await chat_service.close()
+    await read_db.stop()
+    await pool_manager.close_all()
+    password_hasher.shutdown()
 
 
 app = FastAPI(
@@ -31,6 +76,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+@app.get("/health", include_in_schema=False)
+async def health():
+    """Liveness of this worker; it only answers once warm-up has finished"""
+    return {
+        "status": "ok",
+        "pid": os.getpid(),
+        "startup_seconds": startup_timings,
+        "streams_in_flight": chat_service.streams_in_flight
+    }
+
+def _startup_metrics():
+    yield ("process_startup_seconds", "gauge", "Worker warm-up and launch-to-ready time", [
+        ({"phase": phase}, seconds) for phase, seconds in startup_timings.items()
+    ])
+    yield ("chat_streams_in_flight", "gauge", "Streamed questions currently running", [
+        ({}, chat_service.streams_in_flight)
+    ])
+
+if settings.METRICS_ENABLED:
+    registry.register_collector(_startup_metrics)
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus metrics of this worker process"""
+        return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 app.include_router(router, prefix="/api/v1")
\ No newline at end of file
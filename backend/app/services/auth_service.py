@@ -1,13 +1,42 @@
 from typing import Optional
 from datetime import timedelta
 from fastapi import HTTPException, status
-from app.core.security import verify_password, get_password_hash, create_access_token
+from psycopg import errors
+from app.core.security import password_hasher, PasswordHasherBusy
 from app.core.config import settings
 from app.core.auth_database import auth_db
+from app.core.ttl_cache import TTLCache
 from app.api.schemas import UserCreate, UserResponse
 
 class AuthService:
+    def __init__(self):
+        self.user_cache = TTLCache(
+            settings.AUTH_USER_CACHE_MAX_ENTRIES,
+            settings.AUTH_USER_CACHE_TTL_SECONDS
+        )
+
+    def invalidate_user(self, user_id: Optional[int] = None):
+        """Drop a cached user (or all users) after the record changes"""
+        if user_id is None:
+            self.user_cache.clear()
+        else:
+            self.user_cache.pop(int(user_id))
+
+    async def _hash_password(self, password: str) -> str:
+        try:
+            return await password_hasher.hash(password)
+        except PasswordHasherBusy:
+            raise HTTPException(status_code=503, detail="Server busy, please retry")
+
+    async def _verify_password(self, password: str, hashed_password: str) -> bool:
+        try:
+            return await password_hasher.verify(password, hashed_password)
+        except PasswordHasherBusy:
+            raise HTTPException(status_code=503, detail="Server busy, please retry")
+
     async def create_user(self, user_data: UserCreate) -> UserResponse:
+        # Hashing happens between the two connections, so slow bcrypt calls
+        # never hold auth pool connections
         async with auth_db.get_conn() as conn:
             async with conn.cursor() as cur:
                 # Check if user exists
@@ -20,18 +49,29 @@ class AuthService:
                         status_code=400,
                         detail="Username or email already registered"
                     )
-                
+
+        hashed_password = await self._hash_password(user_data.password)
+
+        async with auth_db.get_conn() as conn:
+            async with conn.cursor() as cur:
                 # Create new user
-                hashed_password = get_password_hash(user_data.password)
-                await cur.execute(
-                    """
-                    INSERT INTO users (username, email, password_hash)
-                    VALUES (%s, %s, %s) RETURNING id, username, email
-                    """,
-                    (user_data.username, user_data.email, hashed_password)
-                )
+                try:
+                    await cur.execute(
+                        """
+                        INSERT INTO users (username, email, password_hash)
+                        VALUES (%s, %s, %s) RETURNING id, username, email
+                        """,
+                        (user_data.username, user_data.email, hashed_password)
+                    )
+                except errors.UniqueViolation:
+                    # Registered concurrently since the check above
+                    raise HTTPException(
+                        status_code=400,
+                        detail="Username or email already registered"
+                    )
                 user = await cur.fetchone()
                 await conn.commit()
+                self.invalidate_user(user[0])
                 
                 return UserResponse(
                     id=user[0],
@@ -47,17 +87,26 @@ class AuthService:
                     (username,)
                 )
                 user = await cur.fetchone()
-                
-                if not user or not verify_password(password, user[3]):
-                    return None
-                
-                return {
-                    "id": user[0],
-                    "username": user[1],
-                    "email": user[2]
-                }
+
+        # Verified after the connection is back in the pool
+        if not user or not await self._verify_password(password, user[3]):
+            return None
+        
+        user = {
+            "id": user[0],
+            "username": user[1],
+            "email": user[2]
+        }
+        # The next authenticated request will look this user up
+        self.user_cache.set(user["id"], user)
+        return user
 
     async def get_user_by_id(self, user_id: int) -> Optional[dict]:
+        user_id = int(user_id)
+        cached = self.user_cache.get(user_id)
+        if cached is not None:
+            return cached
+
         async with auth_db.get_conn() as conn:
             async with conn.cursor() as cur:
                 await cur.execute(
@@ -69,10 +118,12 @@ class AuthService:
                 if not user:
                     return None
                 
-                return {
+                user = {
                     "id": user[0],
                     "username": user[1],
                     "email": user[2]
                 }
+                self.user_cache.set(user_id, user)
+                return user
 
 auth_service = AuthService()
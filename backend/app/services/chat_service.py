@@ -1,201 +1,552 @@
+import copy
 import json
 import asyncio
+import logging
 import os
+import uuid
 from datetime import datetime
-from typing import Dict, List, Any, AsyncGenerator, Optional
-from openai import OpenAI
+from typing import Awaitable, Callable, Dict, List, Any, AsyncGenerator, Optional, Set, Tuple
 from fastapi import HTTPException
 from pathlib import Path
 
 from app.core.config import settings
 from app.core.database import db
+from app.core.encoding import json_dumps
 from app.core.auth_database import auth_db
+from app.core.llm import create_llm_client, close_stream
+from app.core.metrics import StageTimer, registry
+from app.core.pagination import decode_cursor, encode_cursor
+from app.core.singleflight import SingleFlight
+from app.core.tokens import count_tokens
+from app.services.schema_catalog import schema_catalog, SchemaSnapshot
+from app.services.sql_cache import normalize_question, sql_cache
+from app.services.history_manager import HistoryManager, HistoryMessage
+from app.services.message_writer import message_writer
+from app.services.prompt_retriever import PromptRetriever, PromptExample, parse_examples
+from app.services.query_executor import QueryExecutor, query_executor, QueryResult
+from app.services.query_guard import QueryRejected
+from app.services.result_encoding import describe_columns, encode_columnar, encode_rows
+from app.services.result_store import result_store
+
+logger = logging.getLogger(__name__)
+
+# Keyset pages; both orderings are served by the indexes of sql/migrations/001
+CHATS_PAGE_QUERY = """
+    SELECT id, title, created_at
+    FROM chats
+    WHERE user_id = %s
+    ORDER BY created_at DESC, id DESC
+    LIMIT %s
+"""
+CHATS_PAGE_AFTER_QUERY = """
+    SELECT id, title, created_at
+    FROM chats
+    WHERE user_id = %s AND (created_at, id) < (%s, %s)
+    ORDER BY created_at DESC, id DESC
+    LIMIT %s
+"""
+MESSAGES_PAGE_QUERY = """
+    SELECT m.id, m.chat_id, m.role, m.content, m.created_at
+    FROM messages m
+    JOIN chats c ON m.chat_id = c.id
+    WHERE c.user_id = %s AND m.chat_id = %s
+    ORDER BY m.created_at DESC, m.id DESC
+    LIMIT %s
+"""
+MESSAGES_PAGE_BEFORE_QUERY = """
+    SELECT m.id, m.chat_id, m.role, m.content, m.created_at
+    FROM messages m
+    JOIN chats c ON m.chat_id = c.id
+    WHERE c.user_id = %s AND m.chat_id = %s AND (m.created_at, m.id) < (%s, %s)
+    ORDER BY m.created_at DESC, m.id DESC
+    LIMIT %s
+"""
+
+INTERRUPTED_NOTE = "\n\n[Answer interrupted: the client disconnected.]"
+
+STAGE_SECONDS = registry.histogram(
+    "chat_stage_duration_seconds",
+    "Time spent in each stage of a streamed question",
+    ("stage",)
+)
+REQUEST_SECONDS = registry.histogram(
+    "chat_request_duration_seconds",
+    "Total time of a streamed question by outcome",
+    ("outcome",)
+)
+TIME_TO_FIRST_TOKEN = registry.histogram(
+    "chat_time_to_first_token_seconds",
+    "Time from receiving a question to streaming the first explanation token"
+)
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total",
+    "Tokens reported by OpenAI by completion purpose and kind",
+    ("call", "kind")
+)
+CHAT_ERRORS = registry.counter(
+    "chat_errors_total",
+    "Streamed questions that failed, by stage and exception class",
+    ("stage", "error")
+)
+CHAT_DISCONNECTS = registry.counter(
+    "chat_disconnects_total",
+    "Streamed questions abandoned by the client, by stage",
+    ("stage",)
+)
+PARTIAL_ANSWERS_SAVED = registry.counter(
+    "chat_partial_answers_saved_total",
+    "Interrupted explanations saved to the chat history"
+)
+ABANDONED_ANSWER_TOKENS = registry.counter(
+    "chat_abandoned_answer_tokens_total",
+    "Explanation tokens streamed to clients that disconnected"
+)
+BATCH_QUESTIONS = registry.counter(
+    "chat_batch_questions_total",
+    "Questions answered through the batch endpoint, by outcome",
+    ("outcome",)
+)
+
+def record_usage(call: str, usage: Any):
+    if usage is not None:
+        LLM_TOKENS.inc(call, "prompt", amount=usage.prompt_tokens)
+        LLM_TOKENS.inc(call, "completion", amount=usage.completion_tokens)
+
+class ClientDisconnected(Exception):
+    """The client of a streamed answer went away between stages"""
 
 class ChatService:
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = create_llm_client()
         self.system_prompt = self._load_system_prompt()
+        self.prompt_retriever = PromptRetriever(self._load_examples())
+        self.history = HistoryManager(
+            self._summarize_history if settings.HISTORY_SUMMARY_ENABLED else None
+        )
+        self._background_tasks: Set[asyncio.Task] = set()
+        self.streams_in_flight = 0
+        # Identical history-free questions asked at the same time share one completion
+        self.sql_generations = SingleFlight("sql_generation")
     
     def _load_system_prompt(self) -> str:
         try:
-            path = Path(__file__).parent.parent / "prompt.txt"
+            path = Path(__file__).parent.parent.parent / "prompt.txt"
             with open(path, "r") as f:
                 return f.read().strip()
         except Exception:
             return """You are a helpful SQL assistant. Use the database schema to create accurate queries:
 {SCHEMA}"""
 
+    def _load_examples(self) -> List[PromptExample]:
+        try:
+            path = Path(__file__).parent.parent.parent / "prompt_examples.txt"
+            with open(path, "r") as f:
+                return parse_examples(f.read())
+        except Exception:
+            return []
+
+    def _build_prompt(
+        self, user_question: str, history: List[Dict[str, Any]], snapshot: SchemaSnapshot
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """Assemble the system message and tools from the tables relevant to the question"""
+        previous = [msg["content"] for msg in history if msg["role"] == "user"][-1:]
+        context = self.prompt_retriever.select(" ".join([*previous, user_question]), snapshot)
+        system_message = (
+            self.system_prompt
+            .replace("{SCHEMA}", context.schema_json)
+            .replace("{EXAMPLES}", context.examples)
+        )
+        return system_message, context.tools
+
+    async def warm_up(self):
+        """Build the prompt indexes and load the tokenizer before the first question"""
+        snapshot = await schema_catalog.get_snapshot()
+        self.prompt_retriever.warm_up(snapshot)
+        system_message, _ = self._build_prompt("warm up", [], snapshot)
+        count_tokens(system_message)
+
+    async def close(self):
+        """Finish pending background saves and close the LLM client connection pool"""
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        await self.client.close()
+
     async def get_database_info(self) -> List[Dict[str, Any]]:
         """Get database schema information with column types"""
-        async with db.get_conn() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute("""
-                    SELECT table_name 
-                    FROM information_schema.tables 
-                    WHERE table_schema = 'public'
-                """)
-                tables = await cur.fetchall()
-                
-                schema_info = []
-                for table in tables:
-                    await cur.execute("""
-                        SELECT column_name, data_type 
-                        FROM information_schema.columns 
-                        WHERE table_schema = 'public' 
-                        AND table_name = %s
-                    """, (table[0],))
-                    columns = await cur.fetchall()
-                    
-                    schema_info.append({
-                        "table_name": table[0],
-                        "columns": [
-                            {"name": col[0], "type": col[1]} 
-                            for col in columns
-                        ]
-                    })
-                return schema_info
+        snapshot = await schema_catalog.get_snapshot()
+        return snapshot.tables
 
     async def execute_query(self, query: str) -> str:
         """Execute a database query"""
+        result = await query_executor.execute(query)
+        return result.to_tool_content()
+
+    async def _generate_tool_calls(
+        self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Stream the forced ask_database completion and assemble its tool calls"""
+        stream = await self.client.chat.completions.create(
+            model=settings.OPENAI_MODEL,
+            messages=messages,
+            tools=tools,
+            tool_choice={"type": "function", "function": {"name": "ask_database"}},
+            temperature=0.2,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+
+        tool_calls: Dict[int, Dict[str, Any]] = {}
         try:
-            async with db.get_conn() as conn:
-                async with conn.cursor() as cur:
-                    await cur.execute(query)
-                    results = await cur.fetchall()
-                    return str([dict(zip([col.name for col in cur.description], row)) for row in results])
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Query failed: {str(e)}")
-
-    def _setup_tools(self, database_schema: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Setup tools configuration with data types"""
-        schema_string = "\n".join([
-            f"Table: {table['table_name']}\n" + "\n".join(
-                [f"- {col['name']} ({col['type']})" 
-                 for col in table['columns']]
-            ) 
-            for table in database_schema
-        ])
-        
-        return [{
-            "type": "function",
-            "function": {
-                "name": "ask_database",
-                "description": "Use this function to answer database questions.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "query": {
-                            "type": "string",
-                            "description": f"SQL query using schema:\n{schema_string}",
-                        }
-                    },
-                    "required": ["query"],
+            async for chunk in stream:
+                if chunk.usage:
+                    record_usage("sql_generation", chunk.usage)
+                if not chunk.choices:
+                    continue
+                for delta in chunk.choices[0].delta.tool_calls or []:
+                    call = tool_calls.setdefault(delta.index, {
+                        "id": None,
+                        "type": "function",
+                        "function": {"name": "", "arguments": ""}
+                    })
+                    if delta.id:
+                        call["id"] = delta.id
+                    if delta.function:
+                        if delta.function.name:
+                            call["function"]["name"] += delta.function.name
+                        if delta.function.arguments:
+                            call["function"]["arguments"] += delta.function.arguments
+        finally:
+            await close_stream(stream)
+        return [tool_calls[index] for index in sorted(tool_calls)]
+
+    async def _get_tool_calls(
+        self,
+        user_question: str,
+        history: List[Dict[str, Any]],
+        messages: List[Dict[str, Any]],
+        tools: List[Dict[str, Any]],
+        snapshot: SchemaSnapshot
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Reuse cached SQL for a repeated question, otherwise ask the model.
+
+        Returns the tool calls and the cache key to store the SQL under once
+        it has executed successfully (None on a cache hit or when uncacheable).
+        Concurrent history-free askers of the same question share one completion.
+        """
+        cache_key = sql_cache.make_key(
+            user_question, history, snapshot.fingerprint, settings.OPENAI_MODEL
+        )
+        cached_sql = await sql_cache.get(cache_key)
+        if cached_sql is not None:
+            return [{
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {
+                    "name": "ask_database",
+                    "arguments": json.dumps({"query": cached_sql})
                 }
+            }], None
+        if history:
+            return await self._generate_tool_calls(messages, tools), cache_key
+        flight_key = (settings.OPENAI_MODEL, snapshot.fingerprint, normalize_question(user_question))
+        tool_calls = await self.sql_generations.do(
+            flight_key, lambda: self._generate_tool_calls(messages, tools)
+        )
+        # Every caller appends the calls to its own messages
+        return copy.deepcopy(tool_calls), cache_key
+
+    async def _regenerate_after_rejection(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: List[Dict[str, Any]],
+        tool_calls: List[Dict[str, Any]],
+        reason: str
+    ) -> List[Dict[str, Any]]:
+        """Tell the model why its SQL was refused and ask once for a cheaper query"""
+        messages.extend([
+            {"role": "assistant", "content": None, "tool_calls": tool_calls},
+            {
+                "role": "tool",
+                "tool_call_id": tool_calls[0]["id"],
+                "name": tool_calls[0]["function"]["name"],
+                "content": (
+                    f"Query rejected before execution: {reason} "
+                    "Write a cheaper query that answers the same question."
+                )
             }
-        }]
+        ])
+        regenerated = await self._generate_tool_calls(messages, tools)
+        if not regenerated:
+            raise HTTPException(status_code=400, detail="Could not generate valid SQL")
+        return regenerated
 
     async def _get_chat_history(self, chat_id: int) -> List[Dict[str, Any]]:
-        """Retrieve chat history with roles from database"""
-        async with auth_db.get_conn() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute(
-                    "SELECT role, content FROM messages WHERE chat_id = %s ORDER BY created_at",
-                    (chat_id,)
-                )
-                messages = await cur.fetchall()
-                return [{"role": msg[0], "content": msg[1]} for msg in messages]
+        """Retrieve the token-budgeted chat history for the prompt"""
+        return await self.history.get_prompt_messages(chat_id)
 
-    async def _save_message(self, chat_id: int, content: str, role: str):
-        """Save message to database with role"""
-        async with auth_db.get_conn() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute(
-                    "INSERT INTO messages (chat_id, role, content) VALUES (%s, %s, %s)",
-                    (chat_id, role, content)
-                )
-                await conn.commit()
+    async def _summarize_history(
+        self, summary: Optional[str], messages: List[Dict[str, str]]
+    ) -> str:
+        """Compact older turns (and any previous summary) into a short summary"""
+        transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
+        if summary:
+            transcript = f"Previous summary:\n{summary}\n\nNew messages:\n{transcript}"
+        response = await self.client.chat.completions.create(
+            model=settings.HISTORY_SUMMARY_MODEL,
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "Summarize this conversation between a user and a SQL assistant. "
+                        "Keep the questions asked, the tables, filters and figures involved, "
+                        "and anything a follow-up question might refer to. Be concise."
+                    )
+                },
+                {"role": "user", "content": transcript}
+            ],
+            temperature=0
+        )
+        record_usage("summary", response.usage)
+        return response.choices[0].message.content
 
-    async def process_user_query(self, user_question: str, chat_id: int):
-        """Process a user query with history"""
+    async def _save_turn(self, chat_id: int, user_question: str, answer: str):
+        """Save the user question and assistant answer together"""
+        messages = [
+            HistoryMessage(None, "user", user_question),
+            HistoryMessage(None, "assistant", answer)
+        ]
+        self.history.append(chat_id, messages)
+        await message_writer.save(chat_id, messages)
+
+    async def _save_interrupted_turn(self, chat_id: int, user_question: str, answer: str):
         try:
-            database_schema = await self.get_database_info()
-            history = await self._get_chat_history(chat_id)
-            
-            system_message = self.system_prompt.replace(
-                "{SCHEMA}", 
-                json.dumps(database_schema, indent=2)
+            await self._save_turn(chat_id, user_question, answer)
+        except Exception:
+            logger.exception("Failed to save the interrupted answer for chat %s", chat_id)
+
+    def _record_disconnect(
+        self, stage: str, chat_id: int, user_question: str, partial_answer: List[str]
+    ):
+        """Count an abandoned streamed answer and keep whatever was already generated"""
+        CHAT_DISCONNECTS.inc(stage)
+        logger.info("Client disconnected from chat %s during %s", chat_id, stage)
+        if not partial_answer:
+            return
+        answer = "".join(partial_answer)
+        ABANDONED_ANSWER_TOKENS.inc(amount=count_tokens(answer))
+        PARTIAL_ANSWERS_SAVED.inc()
+        # The streaming task is being torn down, so save from a task of its own
+        task = asyncio.create_task(
+            self._save_interrupted_turn(chat_id, user_question, answer + INTERRUPTED_NOTE)
+        )
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def answer(
+        self,
+        user_question: str,
+        chat_id: Optional[int],
+        snapshot: SchemaSnapshot,
+        history: List[Dict[str, Any]],
+        explain: bool = True,
+        executor: QueryExecutor = query_executor
+    ) -> Tuple[str, QueryResult, Optional[str]]:
+        """Generate, run and (optionally) explain the SQL for one question.
+
+        Returns the executed query, its result and the explanation. The turn
+        is saved to the chat when there is a chat and an explanation.
+        """
+        system_message, tools = self._build_prompt(user_question, history, snapshot)
+
+        messages = [
+            {"role": "system", "content": system_message},
+            *history,
+            {"role": "user", "content": user_question}
+        ]
+
+        tool_calls, cache_key = await self._get_tool_calls(
+            user_question, history, messages, tools, snapshot
+        )
+
+        if not tool_calls or tool_calls[0]["function"]["name"] != "ask_database":
+            raise HTTPException(
+                status_code=400,
+                detail="Could not generate valid SQL"
             )
-            
-            messages = [
-                {"role": "system", "content": system_message},
-                *history,
-                {"role": "user", "content": user_question}
-            ]
-            
-            tools = self._setup_tools(database_schema)
-            
-            response = self.client.chat.completions.create(
-                model='gpt-4o-2024-11-20',
-                messages=messages,
-                tools=tools,
-                tool_choice={"type": "function", "function": {"name": "ask_database"}},
-                temperature=0.2
+
+        query = json.loads(tool_calls[0]["function"]["arguments"])['query']
+        try:
+            result = await executor.execute(query)
+        except QueryRejected as e:
+            tool_calls = await self._regenerate_after_rejection(
+                messages, tools, tool_calls, e.reason
             )
-            
-            response_message = response.choices[0].message
-            tool_calls = response_message.tool_calls
+            query = json.loads(tool_calls[0]["function"]["arguments"])['query']
+            result = await executor.execute(query)
+        await sql_cache.set(cache_key, query)
 
-            if not tool_calls:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Could not generate valid SQL"
-                )
+        if not explain:
+            return query, result, None
 
-            if tool_calls[0].function.name == 'ask_database':
-                query = json.loads(tool_calls[0].function.arguments)['query']
-                results = await self.execute_query(query)
-                
-                messages.extend([
-                    response_message,
-                    {
-                        "role": "tool",
-                        "tool_call_id": tool_calls[0].id,
-                        "name": tool_calls[0].function.name,
-                        "content": results
-                    }
-                ])
+        messages.extend([
+            {"role": "assistant", "content": None, "tool_calls": tool_calls},
+            {
+                "role": "tool",
+                "tool_call_id": tool_calls[0]["id"],
+                "name": tool_calls[0]["function"]["name"],
+                "content": result.to_tool_content()
+            }
+        ])
 
-                final_response = self.client.chat.completions.create(
-                    model="gpt-4o-2024-11-20",
-                    messages=messages
-                )
-                
-                # Save messages with proper roles
-                await self._save_message(chat_id, user_question, "user")
-                await self._save_message(chat_id, final_response.choices[0].message.content, "assistant")
-                
-                return {
-                    "success": True,
-                    "sql_query": query,
-                    "query_results": results,
-                    "explanation": final_response.choices[0].message.content
-                }
-                
-            raise HTTPException(status_code=400, detail="Query processing failed")
-            
+        final_response = await self.client.chat.completions.create(
+            model=settings.OPENAI_MODEL,
+            messages=messages
+        )
+        record_usage("explanation", final_response.usage)
+        explanation = final_response.choices[0].message.content
+
+        if chat_id is not None:
+            await self._save_turn(chat_id, user_question, explanation)
+        return query, result, explanation
+
+    async def process_user_query(self, user_question: str, chat_id: int):
+        """Process a user query with history"""
+        try:
+            snapshot = await schema_catalog.get_snapshot()
+            history = await self._get_chat_history(chat_id)
+            query, result, explanation = await self.answer(user_question, chat_id, snapshot, history)
+            return {
+                "success": True,
+                "sql_query": query,
+                "query_results": result.to_tool_content(summarize=False),
+                "explanation": explanation
+            }
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
-    async def process_user_query_stream(self, user_question: str, chat_id: int) -> AsyncGenerator[str, None]:
-        """Process query with streaming response"""
+    async def process_batch(
+        self,
+        questions: List[str],
+        chat_id: Optional[int] = None,
+        concurrency: int = settings.BATCH_MAX_CONCURRENCY,
+        explain: bool = True
+    ) -> AsyncGenerator[str, None]:
+        """Answer questions concurrently, yielding one NDJSON line per question as it completes.
+
+        The questions share one schema snapshot and the chat history as it
+        was when the batch started; at most `concurrency` of them run at a
+        time. Without a chat_id nothing is read from or saved to a chat.
+        Closing the generator cancels the questions still running.
+        """
+        snapshot = await schema_catalog.get_snapshot()
+        history = await self._get_chat_history(chat_id) if chat_id is not None else []
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(index: int, question: str) -> str:
+            async with semaphore:
+                try:
+                    query, result, explanation = await self.answer(
+                        question, chat_id, snapshot, history, explain
+                    )
+                except Exception as e:
+                    BATCH_QUESTIONS.inc("error")
+                    return json_dumps({
+                        "index": index,
+                        "question": question,
+                        "success": False,
+                        "error": e.detail if isinstance(e, HTTPException) else str(e)
+                    }) + "\n"
+            BATCH_QUESTIONS.inc("ok")
+            return json_dumps({
+                "index": index,
+                "question": question,
+                "success": True,
+                "sql_query": query,
+                "columns": describe_columns(result.columns, result.column_types),
+                "rows": [dict(zip(result.columns, row)) for row in result.rows],
+                "truncated": result.truncated,
+                "explanation": explanation
+            }) + "\n"
+
+        tasks = [asyncio.create_task(run(index, question)) for index, question in enumerate(questions)]
+        try:
+            for completed in asyncio.as_completed(tasks):
+                yield await completed
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _result_events(
+        self, query: str, result: QueryResult, result_format: str, chat_id: int
+    ) -> AsyncGenerator[str, None]:
+        """SSE events carrying the rows of a query in the encoding the client asked for"""
+        started = False
+        async for batch in query_executor.stream(query, result):
+            if not started:
+                yield self._results_start_event(result, result_format)
+                started = True
+            if result_format == "rows":
+                yield 'data: {"type": "results", "content": ' + encode_rows(result.columns, batch) + "}\n\n"
+            elif result_format == "columnar":
+                yield (
+                    'data: {"type": "results", "format": "columnar", "content": '
+                    + encode_columnar(batch, len(result.columns)) + "}\n\n"
+                )
+        if not started:
+            yield self._results_start_event(result, result_format)
+        if result_format == "arrow":
+            yield "data: " + json.dumps({
+                "type": "results_ready",
+                "format": "arrow",
+                "query_id": result_store.put(result, chat_id)
+            }) + "\n\n"
+
+    def _results_start_event(self, result: QueryResult, result_format: str) -> str:
+        return "data: " + json.dumps({
+            "type": "results_start",
+            "format": result_format,
+            "columns": describe_columns(result.columns, result.column_types)
+        }) + "\n\n"
+
+    async def process_user_query_stream(
+        self,
+        user_question: str,
+        chat_id: int,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        result_format: str = "rows"
+    ) -> AsyncGenerator[str, None]:
+        """Process query with streaming response.
+
+        Starlette cancels this generator when the client disconnects; the
+        in-flight completion is closed and a running statement is cancelled
+        on the server. is_disconnected is also polled before each expensive
+        stage for servers that only report a disconnect on the next write.
+        """
+        timer = StageTimer(STAGE_SECONDS, REQUEST_SECONDS, "chat.query_stream")
+        self.streams_in_flight += 1
+        stage = "schema"
+        outcome = "error"
+        full_response: List[str] = []
+
+        def enter(next_stage: str):
+            nonlocal stage
+            stage = next_stage
+            timer.enter(next_stage)
+
+        async def check_connected(next_stage: str):
+            if is_disconnected is not None and await is_disconnected():
+                raise ClientDisconnected()
+            enter(next_stage)
+
         try:
-            database_schema = await self.get_database_info()
+            enter("schema")
+            snapshot = await schema_catalog.get_snapshot()
+            enter("history")
             history = await self._get_chat_history(chat_id)
             
-            system_message = self.system_prompt.replace(
-                "{SCHEMA}", 
-                json.dumps(database_schema, indent=2)
-            )
+            enter("prompt")
+            system_message, tools = self._build_prompt(user_question, history, snapshot)
             
             messages = [
                 {"role": "system", "content": system_message},
@@ -203,18 +554,10 @@ class ChatService:
                 {"role": "user", "content": user_question}
             ]
             
-            tools = self._setup_tools(database_schema)
-            
-            response = self.client.chat.completions.create(
-                model='gpt-4o-2024-11-20',
-                messages=messages,
-                tools=tools,
-                tool_choice={"type": "function", "function": {"name": "ask_database"}},
-                temperature=0.2
+            await check_connected("sql_generation")
+            tool_calls, cache_key = await self._get_tool_calls(
+                user_question, history, messages, tools, snapshot
             )
-            
-            response_message = response.choices[0].message
-            tool_calls = response_message.tool_calls
 
             if not tool_calls:
                 yield "data: " + json.dumps({
@@ -223,59 +566,116 @@ class ChatService:
                 }) + "\n\n"
                 return
 
-            if tool_calls[0].function.name == 'ask_database':
-                query = json.loads(tool_calls[0].function.arguments)['query']
+            if tool_calls[0]["function"]["name"] == 'ask_database':
+                query = json.loads(tool_calls[0]["function"]["arguments"])['query']
                 
-                yield "data: " + json.dumps({
-                    "type": "sql",
-                    "content": query
-                }) + "\n\n"
-                await asyncio.sleep(0.1)
+                for attempt in range(2):
+                    yield "data: " + json.dumps({
+                        "type": "sql",
+                        "content": query
+                    }) + "\n\n"
 
-                results = await self.execute_query(query)
+                    await check_connected("query")
+                    result = QueryResult()
+                    try:
+                        async for event in self._result_events(query, result, result_format, chat_id):
+                            yield event
+                        break
+                    except QueryRejected as e:
+                        if attempt:
+                            raise
+                        yield "data: " + json.dumps({
+                            "type": "rejected",
+                            "content": e.reason
+                        }) + "\n\n"
+                        await check_connected("sql_generation")
+                        tool_calls = await self._regenerate_after_rejection(
+                            messages, tools, tool_calls, e.reason
+                        )
+                        query = json.loads(tool_calls[0]["function"]["arguments"])['query']
                 yield "data: " + json.dumps({
-                    "type": "results",
-                    "content": results
+                    "type": "results_end",
+                    "columns": result.columns,
+                    "row_count": result.row_count,
+                    "truncated": result.truncated,
+                    "truncated_reason": result.truncated_reason
                 }) + "\n\n"
-                await asyncio.sleep(0.1)
+                enter("summary")
+                results = result.to_tool_content()
+                await sql_cache.set(cache_key, query)
                 
                 messages.extend([
-                    response_message,
+                    {"role": "assistant", "content": None, "tool_calls": tool_calls},
                     {
                         "role": "tool",
-                        "tool_call_id": tool_calls[0].id,
-                        "name": tool_calls[0].function.name,
+                        "tool_call_id": tool_calls[0]["id"],
+                        "name": tool_calls[0]["function"]["name"],
                         "content": results
                     }
                 ])
 
-                final_response = self.client.chat.completions.create(
-                    model="gpt-4o-2024-11-20",
+                await check_connected("explanation")
+                final_response = await self.client.chat.completions.create(
+                    model=settings.OPENAI_MODEL,
                     messages=messages,
-                    stream=True
+                    stream=True,
+                    stream_options={"include_usage": True}
                 )
                 
-                full_response = []
-                for chunk in final_response:
-                    if chunk.choices[0].delta.content:
-                        chunk_content = chunk.choices[0].delta.content
-                        full_response.append(chunk_content)
-                        yield "data: " + json.dumps({
-                            "type": "token",
-                            "content": chunk_content
-                        }) + "\n\n"
+                try:
+                    async for chunk in final_response:
+                        if chunk.usage:
+                            record_usage("explanation", chunk.usage)
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            chunk_content = chunk.choices[0].delta.content
+                            if not full_response:
+                                TIME_TO_FIRST_TOKEN.observe(timer.elapsed())
+                            full_response.append(chunk_content)
+                            yield "data: " + json.dumps({
+                                "type": "token",
+                                "content": chunk_content
+                            }) + "\n\n"
+                finally:
+                    await close_stream(final_response)
                 
-                # Save messages with proper roles
-                await self._save_message(chat_id, user_question, "user")
-                await self._save_message(chat_id, "".join(full_response), "assistant")
+                enter("save")
+                await self._save_turn(chat_id, user_question, "".join(full_response))
+                # Saved in full; a disconnect from here on loses nothing
+                outcome = "ok"
+                timer.finish(outcome)
+                stage = "end"
+                full_response = []
                 
                 yield "data: " + json.dumps({"type": "end"}) + "\n\n"
                 
+        except ClientDisconnected:
+            outcome = "disconnected"
+            self._record_disconnect(stage, chat_id, user_question, full_response)
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "disconnected"
+            self._record_disconnect(stage, chat_id, user_question, full_response)
+            raise
         except Exception as e:
+            CHAT_ERRORS.inc(stage, type(e).__name__)
             yield "data: " + json.dumps({
                 "type": "error",
                 "content": str(e)
             }) + "\n\n"
+        finally:
+            self.streams_in_flight -= 1
+            timer.finish(outcome)
+
+    async def owns_chat(self, chat_id: int, user_id: int) -> bool:
+        async with auth_db.get_conn() as conn:
+            cur = await conn.execute(
+                "SELECT 1 FROM chats WHERE id = %s AND user_id = %s", (chat_id, user_id)
+            )
+            return await cur.fetchone() is not None
+
+    async def check_chat_owner(self, chat_id: int, user_id: int):
+        """Raise 404 unless the chat exists and belongs to the user"""
+        if not await self.owns_chat(chat_id, user_id):
+            raise HTTPException(status_code=404, detail="Chat not found")
 
     async def create_chat(self, user_id: int, title: Optional[str] = None) -> Dict[str, Any]:
         """Create a new chat"""
@@ -301,29 +701,65 @@ class ChatService:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to create chat: {str(e)}")
 
-    async def get_user_chats(self, user_id: int) -> List[Dict[str, Any]]:
-        """Get all chats for a user"""
+    async def get_user_chats(
+        self, user_id: int, limit: int = settings.CHATS_PAGE_SIZE, cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Get a page of a user's chats, newest first, and the cursor of the next page"""
+        after = decode_cursor(cursor)
         try:
             async with auth_db.get_conn() as conn:
                 async with conn.cursor() as cur:
-                    await cur.execute(
-                        """
-                        SELECT id, title, created_at 
-                        FROM chats 
-                        WHERE user_id = %s 
-                        ORDER BY created_at DESC
-                        """,
-                        (user_id,)
-                    )
+                    if after is None:
+                        await cur.execute(CHATS_PAGE_QUERY, (user_id, limit + 1))
+                    else:
+                        await cur.execute(CHATS_PAGE_AFTER_QUERY, (user_id, *after, limit + 1))
                     chats = await cur.fetchall()
-                    return [{
-                        "id": chat[0],
-                        "title": chat[1],
-                        "created_at": chat[2],
-                        "user_id": user_id
-                    } for chat in chats]
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to fetch chats: {str(e)}")
+        next_cursor = None
+        if len(chats) > limit:
+            chats = chats[:limit]
+            next_cursor = encode_cursor(chats[-1][2], chats[-1][0])
+        return [{
+            "id": chat[0],
+            "title": chat[1],
+            "created_at": chat[2],
+            "user_id": user_id
+        } for chat in chats], next_cursor
+
+    async def get_chat_messages(
+        self,
+        chat_id: int,
+        user_id: int,
+        limit: int = settings.MESSAGES_PAGE_SIZE,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Get the newest page of a chat's messages in chronological order.
+
+        The returned cursor loads the page of older messages before it.
+        """
+        before = decode_cursor(cursor)
+        try:
+            async with auth_db.get_conn() as conn:
+                async with conn.cursor() as cur:
+                    if before is None:
+                        await cur.execute(MESSAGES_PAGE_QUERY, (user_id, chat_id, limit + 1))
+                    else:
+                        await cur.execute(MESSAGES_PAGE_BEFORE_QUERY, (user_id, chat_id, *before, limit + 1))
+                    messages = await cur.fetchall()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to fetch messages: {str(e)}")
+        next_cursor = None
+        if len(messages) > limit:
+            messages = messages[:limit]
+            next_cursor = encode_cursor(messages[-1][4], messages[-1][0])
+        return [{
+            "id": msg[0],
+            "chat_id": msg[1],
+            "role": msg[2],
+            "content": msg[3],
+            "created_at": msg[4]
+        } for msg in reversed(messages)], next_cursor
 
     async def delete_chat(self, chat_id: int, user_id: int) -> bool:
         """Delete a specific chat"""
@@ -335,6 +771,7 @@ class ChatService:
                         (chat_id, user_id)
                     )
                     await conn.commit()
+                    self.history.forget(chat_id)
                     return cur.rowcount > 0
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to delete chat: {str(e)}")
@@ -349,6 +786,7 @@ class ChatService:
                         (user_id,)
                     )
                     await conn.commit()
+                    self.history.forget()
                     return True
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to delete chats: {str(e)}")
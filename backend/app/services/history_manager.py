@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Any, Optional, Tuple
+
+from app.core.auth_database import auth_db
+from app.core.config import settings
+from app.core.tokens import count_message_tokens, count_tokens
+
+logger = logging.getLogger(__name__)
+
+MESSAGES_AFTER_QUERY = """
+    SELECT id, role, content FROM messages
+    WHERE chat_id = %s AND id > %s
+    ORDER BY created_at, id
+"""
+
+class HistoryMessage:
+    """A chat message; id stays None until the message writer has persisted it"""
+
+    def __init__(self, message_id: Optional[int], role: str, content: str):
+        self.id = message_id
+        self.role = role
+        self.content = content
+        self.tokens = count_message_tokens(role, content)
+
+class ChatHistory:
+    """Stored summary of older turns plus the not yet summarized tail"""
+
+    def __init__(
+        self,
+        summary: Optional[str],
+        summary_upto_id: int,
+        messages: List[HistoryMessage]
+    ):
+        self.summary = summary
+        self.summary_upto_id = summary_upto_id
+        self.summary_tokens = count_tokens(summary) if summary else 0
+        self.messages = messages
+        self.loaded_at = time.monotonic()
+
+    @property
+    def tail_tokens(self) -> int:
+        return sum(message.tokens for message in self.messages)
+
+    @property
+    def last_message_id(self) -> int:
+        """Id of the newest persisted message known to the cache"""
+        return max((message.id for message in self.messages if message.id is not None), default=self.summary_upto_id)
+
+    def merge(self, rows: List[Tuple[int, str, str]]):
+        """Add the messages persisted since the last read, by other workers or this one"""
+        known = {message.id for message in self.messages}
+        pending = [message for message in self.messages if message.id is None]
+        added = []
+        for message_id, role, content in rows:
+            if message_id in known:
+                continue
+            if pending and pending[0].role == role and pending[0].content == content:
+                # Saved by this worker before the writer handed back its id
+                pending.pop(0).id = message_id
+                continue
+            added.append(HistoryMessage(message_id, role, content))
+        if added:
+            persisted = [message for message in self.messages if message.id is not None]
+            self.messages = [
+                *sorted(persisted + added, key=lambda message: message.id),
+                *(message for message in self.messages if message.id is None)
+            ]
+
+class HistoryManager:
+    """Per-chat history cache that keeps prompts within a token budget.
+
+    The cache is per worker process. Every read also fetches the messages
+    persisted after the newest cached one, so turns answered by other
+    workers are in the next prompt; entries are reloaded in full after
+    HISTORY_CACHE_TTL_SECONDS to pick up summaries written elsewhere.
+    """
+
+    def __init__(
+        self,
+        summarize: Optional[Callable[[Optional[str], List[Dict[str, str]]], Awaitable[str]]] = None,
+        token_budget: int = settings.HISTORY_TOKEN_BUDGET,
+        max_chats: int = settings.HISTORY_CACHE_MAX_CHATS,
+        ttl_seconds: int = settings.HISTORY_CACHE_TTL_SECONDS
+    ):
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.max_chats = max_chats
+        self.ttl_seconds = ttl_seconds
+        self._chats: "OrderedDict[int, ChatHistory]" = OrderedDict()
+        self._compactions: Dict[int, asyncio.Task] = {}
+
+    async def _load(self, chat_id: int) -> ChatHistory:
+        """Read the latest summary and the messages written after it"""
+        async with auth_db.get_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT summary, upto_message_id FROM chat_summaries WHERE chat_id = %s",
+                    (chat_id,)
+                )
+                summary = await cur.fetchone()
+                upto_id = summary[1] if summary else 0
+                await cur.execute(MESSAGES_AFTER_QUERY, (chat_id, upto_id))
+                messages = await cur.fetchall()
+        return ChatHistory(
+            summary[0] if summary else None,
+            upto_id,
+            [HistoryMessage(*msg) for msg in messages]
+        )
+
+    async def _refresh(self, chat_id: int, history: ChatHistory):
+        """Merge the messages persisted after the newest cached one (an index range scan)"""
+        async with auth_db.get_conn() as conn:
+            cur = await conn.execute(MESSAGES_AFTER_QUERY, (chat_id, history.last_message_id))
+            history.merge(await cur.fetchall())
+
+    async def _get(self, chat_id: int) -> ChatHistory:
+        history = self._chats.get(chat_id)
+        if history is None or time.monotonic() - history.loaded_at > self.ttl_seconds:
+            history = await self._load(chat_id)
+            self._chats[chat_id] = history
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            await self._refresh(chat_id, history)
+        self._chats.move_to_end(chat_id)
+        return history
+
+    async def get_prompt_messages(self, chat_id: int) -> List[Dict[str, Any]]:
+        """Summary of older turns plus the most recent messages that fit the budget"""
+        history = await self._get(chat_id)
+        self._maybe_compact(chat_id, history)
+
+        budget = self.token_budget - history.summary_tokens
+        tail: List[Dict[str, Any]] = []
+        for message in reversed(history.messages):
+            if message.tokens > budget:
+                break
+            budget -= message.tokens
+            tail.append({"role": message.role, "content": message.content})
+        tail.reverse()
+
+        if history.summary:
+            return [{
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{history.summary}"
+            }, *tail]
+        return tail
+
+    def append(self, chat_id: int, messages: List[HistoryMessage]):
+        """Record newly saved messages in the cached tail"""
+        history = self._chats.get(chat_id)
+        if history is not None:
+            history.messages.extend(messages)
+            self._maybe_compact(chat_id, history)
+
+    def forget(self, chat_id: Optional[int] = None):
+        """Drop one chat, or every chat, from the cache"""
+        if chat_id is None:
+            self._chats.clear()
+        else:
+            self._chats.pop(chat_id, None)
+
+    def _maybe_compact(self, chat_id: int, history: ChatHistory):
+        if (
+            self.summarize is None
+            or chat_id in self._compactions
+            or history.summary_tokens + history.tail_tokens <= self.token_budget
+        ):
+            return
+        self._compactions[chat_id] = asyncio.create_task(self._compact(chat_id, history))
+
+    async def _compact(self, chat_id: int, history: ChatHistory):
+        """Fold the oldest turns into the stored summary, keeping half the budget as raw tail"""
+        try:
+            keep_tokens = 0
+            split = len(history.messages)
+            while split > 0 and keep_tokens + history.messages[split - 1].tokens <= self.token_budget // 2:
+                split -= 1
+                keep_tokens += history.messages[split].tokens
+            older = history.messages[:split]
+            # Only persisted messages can be folded into the stored summary
+            for i, message in enumerate(older):
+                if message.id is None:
+                    older = older[:i]
+                    break
+            if not older:
+                return
+
+            summary = await self.summarize(
+                history.summary,
+                [{"role": message.role, "content": message.content} for message in older]
+            )
+            upto_id = older[-1].id
+            async with auth_db.get_conn() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(
+                        """
+                        INSERT INTO chat_summaries (chat_id, summary, upto_message_id)
+                        VALUES (%s, %s, %s)
+                        ON CONFLICT (chat_id) DO UPDATE
+                        SET summary = EXCLUDED.summary,
+                            upto_message_id = EXCLUDED.upto_message_id,
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE chat_summaries.upto_message_id < EXCLUDED.upto_message_id
+                        """,
+                        (chat_id, summary, upto_id)
+                    )
+                    await conn.commit()
+
+            history.summary = summary
+            history.summary_tokens = count_tokens(summary)
+            history.summary_upto_id = upto_id
+            # Messages appended while summarizing stay in the tail
+            history.messages = [
+                message for message in history.messages
+                if message.id is None or message.id > upto_id
+            ]
+        except Exception:
+            logger.exception("Failed to compact history for chat %s", chat_id)
+        finally:
+            self._compactions.pop(chat_id, None)
@@ -0,0 +1,340 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+import orjson
+from fastapi import HTTPException
+
+from app.core.auth_database import auth_db
+from app.core.config import settings
+from app.core.encoding import json_dumps
+from app.core.metrics import registry
+from app.services.chat_service import chat_service
+from app.services.query_executor import QueryExecutor, QueryResult
+from app.services.query_guard import QueryGuard
+from app.services.result_encoding import Row, describe_columns
+from app.services.schema_catalog import schema_catalog
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+JOB_COLUMNS = """
+    id, chat_id, question, status, attempts, sql_query, row_count, truncated,
+    explanation, error, created_at, started_at, finished_at, expires_at
+"""
+
+INSERT_JOB = """
+    INSERT INTO query_jobs (id, user_id, chat_id, question)
+    SELECT %s, %s, %s::integer, %s
+    WHERE %s::integer IS NULL OR EXISTS (SELECT 1 FROM chats WHERE id = %s AND user_id = %s)
+    RETURNING """ + JOB_COLUMNS
+
+# The oldest queued job, or a run whose worker died before finishing it
+CLAIM_JOB = """
+    UPDATE query_jobs SET status = 'running', started_at = now(), attempts = attempts + 1
+    WHERE id = (
+        SELECT id FROM query_jobs
+        WHERE status = 'queued'
+           OR (status = 'running' AND started_at < now() - make_interval(secs => %s) AND attempts < %s)
+        ORDER BY created_at
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING id, user_id, chat_id, question, attempts, extract(epoch FROM started_at - created_at)
+"""
+
+# Only the run that claimed the job may finish it; a cancelled job stays cancelled
+FINISH_JOB = """
+    UPDATE query_jobs
+    SET status = %s, sql_query = %s, result = %s, row_count = %s, truncated = %s,
+        explanation = %s, error = %s, finished_at = now(),
+        expires_at = now() + make_interval(secs => %s)
+    WHERE id = %s AND status = 'running' AND attempts = %s
+"""
+
+REQUEUE_JOB = "UPDATE query_jobs SET status = 'queued' WHERE id = %s AND status = 'running' AND attempts = %s"
+
+FAIL_ABANDONED_JOBS = """
+    UPDATE query_jobs
+    SET status = 'failed', error = 'The job timed out', finished_at = now(),
+        expires_at = now() + make_interval(secs => %s)
+    WHERE status = 'running' AND started_at < now() - make_interval(secs => %s) AND attempts >= %s
+"""
+
+DELETE_EXPIRED_JOBS = "DELETE FROM query_jobs WHERE expires_at < now()"
+
+JOB_SECONDS = registry.histogram(
+    "query_job_duration_seconds",
+    "Run time of query jobs by outcome",
+    ("outcome",)
+)
+JOB_QUEUE_SECONDS = registry.histogram(
+    "query_job_queue_seconds",
+    "Time query jobs waited before a worker picked them up"
+)
+
+# (id, user_id, chat_id, question, attempts, seconds queued) of a claimed job
+ClaimedJob = Tuple[uuid.UUID, int, Optional[int], str, int, float]
+
+def _job_dict(row: Tuple[Any, ...]) -> Dict[str, Any]:
+    (job_id, chat_id, question, status, attempts, sql_query, row_count, truncated,
+     explanation, error, created_at, started_at, finished_at, expires_at) = row
+    return {
+        "job_id": str(job_id),
+        "chat_id": chat_id,
+        "question": question,
+        "status": status,
+        "attempts": attempts,
+        "sql_query": sql_query,
+        "row_count": row_count,
+        "truncated": truncated,
+        "explanation": explanation,
+        "error": error,
+        "created_at": created_at,
+        "started_at": started_at,
+        "finished_at": finished_at,
+        "expires_at": expires_at
+    }
+
+def _parse_job_id(job_id: str) -> uuid.UUID:
+    try:
+        return uuid.UUID(job_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+class JobService:
+    """Questions answered in the background, with results kept in the auth database.
+
+    Jobs are rows of query_jobs. Every API process runs `workers` runners
+    that claim queued jobs with FOR UPDATE SKIP LOCKED, so each job runs
+    once whichever process accepted it, and its status and result can be
+    read through any process. Job queries get their own (longer) statement
+    timeout and cost limit. Jobs running at shutdown go back to the queue;
+    runs whose process died are retried after `timeout` seconds, up to
+    `max_attempts` runs. Finished jobs expire after `result_ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        workers: int = settings.JOB_WORKERS,
+        poll_interval: float = settings.JOB_POLL_INTERVAL_SECONDS,
+        timeout: float = settings.JOB_TIMEOUT_SECONDS,
+        max_attempts: int = settings.JOB_MAX_ATTEMPTS,
+        result_ttl: int = settings.JOB_RESULT_TTL_SECONDS
+    ):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.result_ttl = result_ttl
+        self.executor = QueryExecutor(guard=QueryGuard(
+            statement_timeout_ms=settings.JOB_STATEMENT_TIMEOUT_MS,
+            max_cost=settings.JOB_MAX_COST
+        ))
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._running: Dict[uuid.UUID, asyncio.Task] = {}
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def start(self):
+        if self._tasks or self.workers <= 0:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._runner()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._maintain()))
+
+    async def stop(self):
+        """Stop the runners; their jobs are put back in the queue"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, user_id: int, question: str, chat_id: Optional[int] = None) -> Dict[str, Any]:
+        async with auth_db.get_conn() as conn:
+            cur = await conn.execute(
+                INSERT_JOB, (uuid.uuid4(), user_id, chat_id, question, chat_id, chat_id, user_id)
+            )
+            row = await cur.fetchone()
+            await conn.commit()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Chat not found")
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return _job_dict(row)
+
+    async def get(self, job_id: str, user_id: int) -> Dict[str, Any]:
+        async with auth_db.get_conn() as conn:
+            cur = await conn.execute(
+                f"SELECT {JOB_COLUMNS} FROM query_jobs WHERE id = %s AND user_id = %s",
+                (_parse_job_id(job_id), user_id)
+            )
+            row = await cur.fetchone()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return _job_dict(row)
+
+    async def list_jobs(self, user_id: int, limit: int) -> List[Dict[str, Any]]:
+        async with auth_db.get_conn() as conn:
+            cur = await conn.execute(
+                f"""
+                SELECT {JOB_COLUMNS} FROM query_jobs
+                WHERE user_id = %s
+                ORDER BY created_at DESC
+                LIMIT %s
+                """,
+                (user_id, limit)
+            )
+            return [_job_dict(row) for row in await cur.fetchall()]
+
+    async def events(self, job_id: str, user_id: int) -> AsyncGenerator[str, None]:
+        """Server-sent status events of a job until it finishes"""
+        job = await self.get(job_id, user_id)
+        status = None
+        while True:
+            if job["status"] != status:
+                status = job["status"]
+                yield "data: " + json_dumps({"type": "status", **job}) + "\n\n"
+            if status in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(self.poll_interval)
+            job = await self.get(job_id, user_id)
+
+    async def get_result(self, job_id: str, user_id: int) -> Tuple[List[Dict[str, str]], List[Row]]:
+        """Column descriptions and rows of a succeeded job"""
+        async with auth_db.get_conn() as conn:
+            cur = await conn.execute(
+                "SELECT status, result FROM query_jobs WHERE id = %s AND user_id = %s",
+                (_parse_job_id(job_id), user_id)
+            )
+            row = await cur.fetchone()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        status, result = row
+        if status != "succeeded":
+            raise HTTPException(status_code=409, detail=f"Job is {status}")
+        stored = orjson.loads(result)
+        return stored["columns"], [tuple(values) for values in stored["rows"]]
+
+    async def cancel(self, job_id: str, user_id: int) -> Dict[str, Any]:
+        """Cancel a queued or running job.
+
+        A job running in another process finishes its statement there, but
+        its result is discarded.
+        """
+        job_uuid = _parse_job_id(job_id)
+        async with auth_db.get_conn() as conn:
+            await conn.execute(
+                """
+                UPDATE query_jobs
+                SET status = 'cancelled', finished_at = now(),
+                    expires_at = now() + make_interval(secs => %s)
+                WHERE id = %s AND user_id = %s AND status IN ('queued', 'running')
+                """,
+                (self.result_ttl, job_uuid, user_id)
+            )
+            await conn.commit()
+        task = self._running.get(job_uuid)
+        if task is not None:
+            task.cancel()
+        return await self.get(job_id, user_id)
+
+    async def _claim(self) -> Optional[ClaimedJob]:
+        async with auth_db.get_conn() as conn:
+            cur = await conn.execute(CLAIM_JOB, (self.timeout, self.max_attempts))
+            job = await cur.fetchone()
+            await conn.commit()
+        return job
+
+    async def _runner(self):
+        while True:
+            try:
+                job = await self._claim()
+            except Exception:
+                logger.exception("Failed to claim a query job")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._execute(job)
+
+    async def _answer(self, question: str, chat_id: Optional[int]) -> Tuple[str, QueryResult, Optional[str]]:
+        snapshot = await schema_catalog.get_snapshot()
+        history = await chat_service.history.get_prompt_messages(chat_id) if chat_id is not None else []
+        return await chat_service.answer(question, chat_id, snapshot, history, executor=self.executor)
+
+    async def _execute(self, job: ClaimedJob):
+        job_id, _, chat_id, question, attempts, queued_seconds = job
+        JOB_QUEUE_SECONDS.observe(float(queued_seconds))
+        started = time.perf_counter()
+        task = asyncio.create_task(self._answer(question, chat_id))
+        self._running[job_id] = task
+        try:
+            done, _ = await asyncio.wait({task}, timeout=self.timeout)
+        except asyncio.CancelledError:
+            # Shutting down: stop the run and let another worker pick the job up
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await self._update(REQUEUE_JOB, (job_id, attempts))
+            raise
+        finally:
+            self._running.pop(job_id, None)
+
+        if not done:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            outcome, values = "failed", (None, None, None, None, None, f"The job timed out after {self.timeout:.0f}s")
+        elif task.cancelled():
+            # Cancelled through the API, which already recorded the status
+            JOB_SECONDS.observe(time.perf_counter() - started, "cancelled")
+            return
+        elif task.exception() is not None:
+            error = task.exception()
+            outcome, values = "failed", (
+                None, None, None, None, None,
+                error.detail if isinstance(error, HTTPException) else str(error)
+            )
+        else:
+            query, result, explanation = task.result()
+            stored = json_dumps({
+                "columns": describe_columns(result.columns, result.column_types),
+                "rows": result.rows
+            })
+            outcome, values = "succeeded", (query, stored, result.row_count, result.truncated, explanation, None)
+
+        JOB_SECONDS.observe(time.perf_counter() - started, outcome)
+        await self._update(FINISH_JOB, (outcome, *values, self.result_ttl, job_id, attempts))
+
+    async def _update(self, statement: str, params: Tuple[Any, ...]):
+        try:
+            async with auth_db.get_conn() as conn:
+                await conn.execute(statement, params)
+                await conn.commit()
+        except Exception:
+            logger.exception("Failed to update query job %s", params[-2])
+
+    async def _maintain(self):
+        """Fail runs that exhausted their attempts and delete expired jobs"""
+        while True:
+            await asyncio.sleep(max(self.poll_interval, 60.0))
+            try:
+                async with auth_db.get_conn() as conn:
+                    await conn.execute(
+                        FAIL_ABANDONED_JOBS, (self.result_ttl, self.timeout, self.max_attempts)
+                    )
+                    await conn.execute(DELETE_EXPIRED_JOBS)
+                    await conn.commit()
+            except Exception:
+                logger.exception("Query job maintenance failed")
+
+job_service = JobService()
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from app.core.auth_database import auth_db
+from app.core.config import settings
+from app.services.history_manager import HistoryMessage
+
+logger = logging.getLogger(__name__)
+
+INSERT_MESSAGE = "INSERT INTO messages (chat_id, role, content) VALUES (%s, %s, %s) RETURNING id"
+
+# (chat_id, messages of one turn)
+PendingTurn = Tuple[int, List[HistoryMessage]]
+
+class MessageWriter:
+    """Write-behind persistence of chat messages.
+
+    Durability: a turn is acknowledged to the client once it is queued, so
+    up to MESSAGE_FLUSH_INTERVAL_MS of turns can be lost if the process is
+    killed. A graceful shutdown drains the queue. A full queue applies
+    backpressure to new answers instead of dropping them. Both messages of a
+    turn are always written in the same transaction. A batch that fails is
+    retried turn by turn, and turns that still fail (e.g. the chat was
+    deleted meanwhile) are logged and dropped.
+    """
+
+    def __init__(
+        self,
+        max_queue_size: int = settings.MESSAGE_QUEUE_MAX_SIZE,
+        batch_size: int = settings.MESSAGE_BATCH_SIZE,
+        flush_interval: float = settings.MESSAGE_FLUSH_INTERVAL_MS / 1000
+    ):
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued and stop the background writer"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    async def save(self, chat_id: int, messages: List[HistoryMessage]):
+        """Persist a turn, in the background when the writer is running"""
+        if self._task is None:
+            await self._write([(chat_id, messages)])
+        else:
+            await self._queue.put((chat_id, messages))
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            turn = await self._queue.get()
+            if turn is None:
+                break
+            batch: List[PendingTurn] = [turn]
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                try:
+                    turn = self._queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if turn is None:
+                    stopping = True
+                    break
+                batch.append(turn)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[PendingTurn]):
+        try:
+            await self._write(batch)
+        except Exception:
+            logger.exception("Batched message write failed, retrying turn by turn")
+            for turn in batch:
+                try:
+                    await self._write([turn])
+                except Exception:
+                    self.dropped += len(turn[1])
+                    logger.exception("Dropping messages for chat %s", turn[0])
+
+    async def _write(self, batch: List[PendingTurn]):
+        """Insert a batch of turns in one transaction and record their ids"""
+        messages = [message for _, turn in batch for message in turn]
+        params = [
+            (chat_id, message.role, message.content)
+            for chat_id, turn in batch for message in turn
+        ]
+        async with auth_db.get_conn() as conn:
+            async with conn.transaction():
+                async with conn.cursor() as cur:
+                    await cur.executemany(INSERT_MESSAGE, params, returning=True)
+                    for message in messages:
+                        message.id = (await cur.fetchone())[0]
+                        cur.nextset()
+        self.written += len(messages)
+
+message_writer = MessageWriter()
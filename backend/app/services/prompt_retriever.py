@@ -0,0 +1,191 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Any, Optional
+
+from app.core.config import settings
+from app.services.schema_catalog import SchemaSnapshot
+
+_WORD = re.compile(r"[a-z0-9]+(?:_[a-z0-9]+)*")
+_EXAMPLE_HEADING = re.compile(r"^(\d+)\.\s+(.+)$", re.MULTILINE)
+_STOPWORDS = frozenset("""
+    a all an and any are as at be by can did do does each for from give has have how i in
+    is it list me most my of on or per show than that the their them there these this to
+    was were what when where which who whose with
+""".split())
+
+def _stem(token: str) -> str:
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, with snake_case identifiers also split into parts"""
+    tokens = []
+    for word in _WORD.findall(text.lower()):
+        if word in _STOPWORDS:
+            continue
+        tokens.append(_stem(word))
+        if "_" in word:
+            tokens.extend(_stem(part) for part in word.split("_"))
+    return tokens
+
+class BM25Index:
+    """Okapi BM25 over a small, static document collection"""
+
+    def __init__(self, documents: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(doc) for doc in documents]
+        self.lengths = [len(doc) for doc in documents]
+        self.avg_length = (sum(self.lengths) / len(documents)) if documents else 0.0
+        doc_freqs: Counter = Counter()
+        for freqs in self.term_freqs:
+            doc_freqs.update(freqs.keys())
+        total = len(documents)
+        self.idf = {
+            term: math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for term, df in doc_freqs.items()
+        }
+
+    def scores(self, query: List[str]) -> List[float]:
+        terms = [term for term in set(query) if term in self.idf]
+        results = []
+        for freqs, length in zip(self.term_freqs, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+            score = 0.0
+            for term in terms:
+                tf = freqs.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            results.append(score)
+        return results
+
+def _top(scores: List[float], k: int) -> List[int]:
+    """Indices of the k best positive scores, best first"""
+    ranked = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: scores[i], reverse=True)
+    return ranked[:k]
+
+class PromptExample:
+    def __init__(self, title: str, body: str):
+        self.title = title
+        self.body = body
+        self.identifiers = frozenset(_WORD.findall(body.lower()))
+
+    def render(self, number: int) -> str:
+        return f"{number}. {self.title}\n{self.body}"
+
+def parse_examples(text: str) -> List[PromptExample]:
+    """Split the numbered example file into individual examples"""
+    headings = list(_EXAMPLE_HEADING.finditer(text))
+    examples = []
+    for i, heading in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(text)
+        examples.append(PromptExample(heading.group(2).strip(), text[heading.end():end].strip()))
+    return examples
+
+def render_examples(examples: List[PromptExample]) -> str:
+    return "\n\n".join(example.render(i) for i, example in enumerate(examples, start=1))
+
+class PromptContext:
+    """Schema, tool and example renderings selected for one question"""
+
+    def __init__(
+        self,
+        schema_json: str,
+        tools: List[Dict[str, Any]],
+        examples: str,
+        table_names: List[str],
+        full: bool
+    ):
+        self.schema_json = schema_json
+        self.tools = tools
+        self.examples = examples
+        self.table_names = table_names
+        self.full = full
+
+class PromptRetriever:
+    """Selects the tables and examples relevant to a question for the system prompt"""
+
+    def __init__(
+        self,
+        examples: List[PromptExample],
+        enabled: bool = settings.PROMPT_RETRIEVAL_ENABLED,
+        top_k_tables: int = settings.PROMPT_TOP_K_TABLES,
+        top_k_examples: int = settings.PROMPT_TOP_K_EXAMPLES,
+        min_score: float = settings.PROMPT_MIN_SCORE
+    ):
+        self.examples = examples
+        self.enabled = enabled
+        self.top_k_tables = top_k_tables
+        self.top_k_examples = top_k_examples
+        self.min_score = min_score
+        self.all_examples = render_examples(examples)
+        self.example_index = BM25Index([
+            tokenize(f"{example.title} {example.body}") for example in examples
+        ])
+        self._table_index: Optional[BM25Index] = None
+        self._indexed_version: Optional[int] = None
+
+    def _index_for(self, snapshot: SchemaSnapshot) -> BM25Index:
+        """Build the table index once per schema snapshot version"""
+        if self._table_index is None or self._indexed_version != snapshot.version:
+            documents = []
+            for table in snapshot.tables:
+                name = table["table_name"]
+                # Repeat the table name so it outweighs incidental column matches
+                tokens = tokenize(name) * 3
+                for column in table["columns"]:
+                    tokens.extend(tokenize(column["name"]))
+                tokens.extend(tokenize(table.get("description", "")))
+                for other in snapshot.neighbours[name]:
+                    tokens.extend(tokenize(other))
+                documents.append(tokens)
+            self._table_index = BM25Index(documents)
+            self._indexed_version = snapshot.version
+        return self._table_index
+
+    def warm_up(self, snapshot: SchemaSnapshot):
+        """Index the tables of a snapshot ahead of the first question"""
+        if self.enabled:
+            self._index_for(snapshot)
+
+    def full_context(self, snapshot: SchemaSnapshot) -> PromptContext:
+        return PromptContext(
+            snapshot.schema_json, snapshot.tools, self.all_examples, snapshot.table_names, True
+        )
+
+    def select(self, question: str, snapshot: SchemaSnapshot) -> PromptContext:
+        """Pick the top-k tables plus their FK neighbours and the closest examples"""
+        if not self.enabled or len(snapshot.tables) <= self.top_k_tables:
+            return self.full_context(snapshot)
+
+        query = tokenize(question)
+        table_scores = self._index_for(snapshot).scores(query)
+        top_tables = _top(table_scores, self.top_k_tables)
+        example_scores = self.example_index.scores(query)
+        top_examples = _top(example_scores, self.top_k_examples)
+
+        best = max(
+            [table_scores[i] for i in top_tables[:1]] + [example_scores[i] for i in top_examples[:1]],
+            default=0.0
+        )
+        if best < self.min_score:
+            return self.full_context(snapshot)
+
+        selected = {snapshot.table_names[i] for i in top_tables}
+        for i in top_tables:
+            selected.update(snapshot.neighbours[snapshot.table_names[i]])
+        # Tables joined by the matching examples count as relevant too
+        for i in top_examples:
+            selected.update(
+                name for name in snapshot.table_names if name in self.examples[i].identifiers
+            )
+        # Keep catalog order so the rendering is stable for caching
+        table_names = [name for name in snapshot.table_names if name in selected]
+        schema_json, tools = snapshot.render_subset(table_names)
+        examples = render_examples([self.examples[i] for i in sorted(top_examples)])
+
+        return PromptContext(schema_json, tools, examples, table_names, False)
@@ -0,0 +1,353 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from psycopg import errors, sql
+
+from app.core.auth_database import auth_db
+from app.core.config import settings
+from app.core.database import db
+from app.core.metrics import registry
+from app.services.result_cache import is_volatile, normalize_sql, result_cache
+from app.services.schema_catalog import schema_catalog
+from app.services.sql_shapes import parameterize
+
+logger = logging.getLogger(__name__)
+
+_GROUP_BY = re.compile(r"\bgroup by\b")
+# Views keep every group; questions apply their own ordering and limit
+_TRAILING_LIMIT = re.compile(r"\s+(?:limit|offset) \d+(?: (?:limit|offset) \d+)?$")
+_TRAILING_ORDER = re.compile(r"\s+order by [^()']*$")
+
+VIEW_COLUMNS = "name, fingerprint, definition, source_tables, created_at, refreshed_at, refresh_seconds, last_error"
+
+# The view refreshed longest ago among those due, skipping views another process is refreshing
+CLAIM_REFRESH = """
+    UPDATE materialized_views SET refreshed_at = now()
+    WHERE name = (
+        SELECT name FROM materialized_views
+        WHERE refreshed_at < now() - make_interval(secs => %s)
+        ORDER BY refreshed_at
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING name
+"""
+
+VIEW_BUILD_SECONDS = registry.histogram(
+    "advisor_view_build_seconds",
+    "Time to create or refresh a materialized view proposed by the query advisor",
+    ("operation", "outcome")
+)
+
+def view_definition(statement: str) -> str:
+    """The statement to materialize: a normalized statement without its trailing ORDER BY and LIMIT"""
+    return _TRAILING_ORDER.sub("", _TRAILING_LIMIT.sub("", statement))
+
+def _view_dict(row: Tuple[Any, ...]) -> Dict[str, Any]:
+    name, fingerprint, definition, source_tables, created_at, refreshed_at, refresh_seconds, last_error = row
+    return {
+        "name": name,
+        "fingerprint": fingerprint,
+        "definition": definition,
+        "source_tables": list(source_tables or []),
+        "created_at": created_at,
+        "refreshed_at": refreshed_at,
+        "refresh_seconds": refresh_seconds,
+        "last_error": last_error
+    }
+
+class QueryShape:
+    """Execution statistics of the statements sharing one shape"""
+
+    def __init__(self, fingerprint: str, shape: str, statement: str, tables: List[str]):
+        self.fingerprint = fingerprint
+        self.shape = shape
+        self.statement = statement
+        self.tables = tables
+        # Only needs to tell one distinct statement from several
+        self.statements = {statement}
+        self.executions = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.last_seen = 0.0
+
+    def add(self, statement: str, seconds: float, rows: int):
+        if len(self.statements) < 2:
+            self.statements.add(statement)
+        self.executions += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.rows = rows
+        self.last_seen = time.time()
+
+class QueryAdvisor:
+    """Finds the hottest SQL shapes and precomputes them as materialized views.
+
+    Every statement read from the database is recorded under its shape (the
+    normalized SQL with literals replaced), counting runs and database time
+    per worker. Aggregate shapes that run often enough are proposed as
+    materialized views; views are created on request, or automatically with
+    `auto_materialize`, and refreshed every `refresh_interval` seconds. The
+    views are listed in the auth database so only one process refreshes each
+    one. Their comment tells the model to prefer them, and the schema
+    catalog passes it on in the prompt.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = settings.ADVISOR_ENABLED,
+        max_shapes: int = settings.ADVISOR_MAX_SHAPES,
+        min_executions: int = settings.ADVISOR_MIN_EXECUTIONS,
+        min_total_seconds: float = settings.ADVISOR_MIN_TOTAL_SECONDS,
+        auto_materialize: bool = settings.ADVISOR_AUTO_MATERIALIZE,
+        max_views: int = settings.ADVISOR_MAX_VIEWS,
+        view_prefix: str = settings.ADVISOR_VIEW_PREFIX,
+        refresh_interval: int = settings.ADVISOR_REFRESH_INTERVAL_SECONDS,
+        check_interval: float = settings.ADVISOR_CHECK_INTERVAL_SECONDS,
+        statement_timeout_ms: int = settings.ADVISOR_STATEMENT_TIMEOUT_MS
+    ):
+        self.enabled = enabled
+        self.max_shapes = max_shapes
+        self.min_executions = min_executions
+        self.min_total_seconds = min_total_seconds
+        self.auto_materialize = auto_materialize
+        self.max_views = max_views
+        self.view_prefix = view_prefix
+        self.refresh_interval = refresh_interval
+        self.check_interval = check_interval
+        self.statement_timeout_ms = statement_timeout_ms
+        self._shapes: Dict[str, QueryShape] = {}
+        # Fingerprint to view name, as last read from the auth database
+        self._views: Dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def shape_count(self) -> int:
+        return len(self._shapes)
+
+    @property
+    def view_count(self) -> int:
+        return len(self._views)
+
+    def record(self, query: str, seconds: float, rows: int, tables: List[str]):
+        """Count one database execution of a statement"""
+        if not self.enabled or is_volatile(query):
+            return
+        statement = normalize_sql(query)
+        # Runs that differ only in their values share a shape, the one the
+        # prepared statements and the query guard are keyed by
+        parsed = parameterize(statement)
+        shape, fingerprint = parsed.shape, parsed.fingerprint
+        entry = self._shapes.get(fingerprint)
+        if entry is None:
+            if len(self._shapes) >= self.max_shapes:
+                coldest = min(self._shapes.values(), key=lambda s: s.total_seconds)
+                del self._shapes[coldest.fingerprint]
+            entry = self._shapes[fingerprint] = QueryShape(fingerprint, shape, statement, tables)
+        entry.add(statement, seconds, rows)
+
+    def _blocker(self, shape: QueryShape) -> Optional[str]:
+        """Why a shape cannot be materialized, or None"""
+        if not _GROUP_BY.search(shape.shape):
+            return "not an aggregate query"
+        if ";" in shape.shape:
+            return "more than one statement"
+        if len(shape.statements) > 1:
+            return "runs differ in their literal values"
+        if not shape.tables:
+            return "reads no known table"
+        if any(table.startswith(self.view_prefix) for table in shape.tables):
+            return "already reads a materialized view"
+        return None
+
+    def _is_hot(self, shape: QueryShape) -> bool:
+        return shape.executions >= self.min_executions and shape.total_seconds >= self.min_total_seconds
+
+    def _describe(self, shape: QueryShape) -> Dict[str, Any]:
+        blocker = self._blocker(shape)
+        return {
+            "fingerprint": shape.fingerprint,
+            "sql": shape.statement,
+            "executions": shape.executions,
+            "total_seconds": round(shape.total_seconds, 3),
+            "mean_seconds": round(shape.total_seconds / shape.executions, 3) if shape.executions else 0.0,
+            "max_seconds": round(shape.max_seconds, 3),
+            "rows": shape.rows,
+            "tables": shape.tables,
+            "candidate": self._is_hot(shape) and blocker is None,
+            "reason": blocker,
+            "view_definition": view_definition(shape.statement) if blocker is None else None,
+            "view": self._views.get(shape.fingerprint)
+        }
+
+    def hot_queries(self, limit: int) -> List[Dict[str, Any]]:
+        """Recorded shapes by total database time, with their proposals"""
+        shapes = sorted(self._shapes.values(), key=lambda s: s.total_seconds, reverse=True)
+        return [self._describe(shape) for shape in shapes[:limit]]
+
+    def candidates(self) -> List[QueryShape]:
+        """Hot aggregate shapes without a view, hottest first"""
+        return sorted(
+            (shape for shape in self._shapes.values()
+             if self._is_hot(shape) and self._blocker(shape) is None and shape.fingerprint not in self._views),
+            key=lambda s: s.total_seconds,
+            reverse=True
+        )
+
+    async def list_views(self) -> List[Dict[str, Any]]:
+        async with auth_db.get_conn() as conn:
+            cur = await conn.execute(f"SELECT {VIEW_COLUMNS} FROM materialized_views ORDER BY created_at")
+            views = [_view_dict(row) for row in await cur.fetchall()]
+        self._views = {view["fingerprint"]: view["name"] for view in views}
+        return views
+
+    async def _build(self, operation: str, statements: List[sql.Composable]):
+        """Run DDL against the analytics database under the advisor's statement timeout"""
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            async with db.get_conn() as conn:
+                async with conn.transaction():
+                    await conn.execute(sql.SQL("SET LOCAL statement_timeout = {}").format(self.statement_timeout_ms))
+                    for statement in statements:
+                        await conn.execute(statement)
+            outcome = "ok"
+        finally:
+            VIEW_BUILD_SECONDS.observe(time.perf_counter() - started, operation, outcome)
+
+    async def materialize(self, fingerprint: str) -> Dict[str, Any]:
+        """Create the materialized view proposed for a recorded shape"""
+        shape = self._shapes.get(fingerprint)
+        if shape is None:
+            raise HTTPException(status_code=404, detail="Query shape not found")
+        blocker = self._blocker(shape)
+        if blocker is not None:
+            raise HTTPException(status_code=409, detail=f"Cannot materialize this query: {blocker}")
+
+        name = self.view_prefix + fingerprint
+        definition = view_definition(shape.statement)
+        async with auth_db.get_conn() as conn:
+            cur = await conn.execute("SELECT count(*) FROM materialized_views")
+            (views,) = await cur.fetchone()
+            if views >= self.max_views:
+                raise HTTPException(status_code=409, detail=f"The limit of {self.max_views} views is reached")
+            cur = await conn.execute(
+                f"""
+                INSERT INTO materialized_views (name, fingerprint, definition, source_tables)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT DO NOTHING
+                RETURNING {VIEW_COLUMNS}
+                """,
+                (name, fingerprint, definition, shape.tables)
+            )
+            row = await cur.fetchone()
+            await conn.commit()
+        if row is None:
+            raise HTTPException(status_code=409, detail="This query is already materialized")
+
+        comment = (
+            f"Precomputed result of a frequent query over {', '.join(shape.tables)}, "
+            f"refreshed every {max(1, self.refresh_interval // 60)} minutes. "
+            f"Prefer it to recomputing: {definition}"
+        )
+        try:
+            await self._build("create", [
+                sql.SQL("CREATE MATERIALIZED VIEW IF NOT EXISTS {} AS ").format(sql.Identifier(name)) + sql.SQL(definition),
+                sql.SQL("COMMENT ON MATERIALIZED VIEW {} IS {}").format(sql.Identifier(name), sql.Literal(comment))
+            ])
+        except Exception as e:
+            async with auth_db.get_conn() as conn:
+                await conn.execute("DELETE FROM materialized_views WHERE name = %s", (name,))
+                await conn.commit()
+            raise HTTPException(status_code=400, detail=f"Could not create the view: {str(e)}")
+
+        self._views[fingerprint] = name
+        logger.info("Materialized query shape %s as %s", fingerprint, name)
+        await schema_catalog.refresh()
+        return _view_dict(row)
+
+    async def drop(self, name: str) -> Dict[str, Any]:
+        async with auth_db.get_conn() as conn:
+            cur = await conn.execute(
+                f"DELETE FROM materialized_views WHERE name = %s RETURNING {VIEW_COLUMNS}", (name,)
+            )
+            row = await cur.fetchone()
+            await conn.commit()
+        if row is None:
+            raise HTTPException(status_code=404, detail="View not found")
+        view = _view_dict(row)
+        await self._build("drop", [
+            sql.SQL("DROP MATERIALIZED VIEW IF EXISTS {}").format(sql.Identifier(name))
+        ])
+        self._views.pop(view["fingerprint"], None)
+        result_cache.invalidate(name)
+        await schema_catalog.refresh()
+        return view
+
+    async def refresh_due(self) -> int:
+        """Refresh every view older than the refresh interval, returning how many were refreshed"""
+        refreshed = 0
+        while True:
+            async with auth_db.get_conn() as conn:
+                cur = await conn.execute(CLAIM_REFRESH, (self.refresh_interval,))
+                row = await cur.fetchone()
+                await conn.commit()
+            if row is None:
+                return refreshed
+            (name,) = row
+            started = time.perf_counter()
+            error = None
+            try:
+                await self._build("refresh", [
+                    sql.SQL("REFRESH MATERIALIZED VIEW {}").format(sql.Identifier(name))
+                ])
+                refreshed += 1
+            except errors.UndefinedTable:
+                # Dropped outside of the advisor
+                logger.warning("Materialized view %s no longer exists, forgetting it", name)
+                async with auth_db.get_conn() as conn:
+                    await conn.execute("DELETE FROM materialized_views WHERE name = %s", (name,))
+                    await conn.commit()
+                continue
+            except Exception as e:
+                logger.exception("Failed to refresh materialized view %s", name)
+                error = str(e)
+            async with auth_db.get_conn() as conn:
+                await conn.execute(
+                    "UPDATE materialized_views SET refresh_seconds = %s, last_error = %s WHERE name = %s",
+                    (time.perf_counter() - started, error, name)
+                )
+                await conn.commit()
+            result_cache.invalidate(name)
+
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.list_views()
+                await self.refresh_due()
+                if self.auto_materialize:
+                    for shape in self.candidates()[:max(0, self.max_views - len(self._views))]:
+                        try:
+                            await self.materialize(shape.fingerprint)
+                        except HTTPException as e:
+                            logger.warning("Could not materialize query shape %s: %s", shape.fingerprint, e.detail)
+            except Exception:
+                logger.exception("Query advisor maintenance failed")
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._maintain())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+query_advisor = QueryAdvisor()
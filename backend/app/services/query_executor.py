@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, AsyncGenerator, Dict, List, Optional
+import anyio
+from fastapi import HTTPException
+from psycopg import AsyncConnection, errors
+
+from app.core.config import settings
+from app.core.database import read_db
+from app.core.encoding import json_dumps
+from app.core.metrics import SIZE_BUCKETS, registry
+from app.core.singleflight import SingleFlight
+from app.services.result_encoding import Row, encode_rows
+from app.services.query_advisor import query_advisor
+from app.services.result_cache import result_cache, CachedResult, is_volatile, normalize_sql
+from app.services.result_summary import render_summary
+from app.services.schema_catalog import schema_catalog
+from app.services.sql_shapes import parameterize
+from app.services.query_guard import QueryGuard, query_guard, QueryRejected
+
+logger = logging.getLogger(__name__)
+
+QUERY_ROWS = registry.histogram(
+    "query_result_rows",
+    "Rows returned per executed query, by where they came from",
+    ("source",),
+    SIZE_BUCKETS
+)
+QUERY_TRUNCATED = registry.counter(
+    "query_results_truncated_total",
+    "Query results cut off at a row or byte cap",
+    ("reason",)
+)
+PREPARED_STATEMENTS = registry.counter(
+    "query_prepared_statements_total",
+    "Parameterized executions, by whether the connection had the statement prepared already or it failed and ran unchanged",
+    ("outcome",)
+)
+# What replacing a literal by a parameter can break: its type is unknown or
+# no longer coerced, so an operator or function no longer resolves, or an
+# expression stops matching its GROUP BY. Other errors are the statement's own.
+PARAMETER_ERRORS = (
+    errors.IndeterminateDatatype,
+    errors.DatatypeMismatch,
+    errors.UndefinedFunction,
+    errors.AmbiguousFunction,
+    errors.GroupingError,
+)
+
+RESULT_SUMMARIES = registry.counter(
+    "query_result_summaries_total",
+    "Results sent to the explanation completion as a summary instead of rows"
+)
+
+class QueryResult:
+    """Bounded accumulator of the rows of one query execution.
+
+    Rows are kept as value tuples; each transport encodes them itself.
+    The byte cap applies to the rows encoded as JSON arrays.
+    """
+
+    def __init__(
+        self,
+        max_rows: int = settings.QUERY_MAX_ROWS,
+        max_bytes: int = settings.QUERY_MAX_BYTES
+    ):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.columns: List[str] = []
+        self.column_types: List[str] = []
+        self.rows: List[Row] = []
+        self.byte_count = 0
+        self.truncated = False
+        self.truncated_reason: Optional[str] = None
+
+    @property
+    def row_count(self) -> int:
+        return len(self.rows)
+
+    def add(self, row: Row) -> bool:
+        """Append a row, returning False once a row or byte cap is hit"""
+        if len(self.rows) >= self.max_rows:
+            self._truncate("max_rows")
+            return False
+        size = len(json_dumps(row))
+        if self.byte_count + size > self.max_bytes:
+            self._truncate("max_bytes")
+            return False
+        self.rows.append(row)
+        self.byte_count += size + 1
+        return True
+
+    def _truncate(self, reason: str):
+        self.truncated = True
+        self.truncated_reason = reason
+
+    def load(self, cached: CachedResult):
+        """Populate this result from a cache entry"""
+        self.columns = cached.columns
+        self.column_types = cached.column_types
+        self.rows = list(cached.rows)
+        self.byte_count = cached.byte_count
+        self.truncated = cached.truncated
+        self.truncated_reason = cached.truncated_reason
+
+    def to_json(self) -> str:
+        return encode_rows(self.columns, self.rows)
+
+    def to_tool_content(self, summarize: bool = True) -> str:
+        """Render the rows for the explanation completion, noting truncation.
+
+        Results over RESULT_SUMMARY_THRESHOLD_BYTES are summarized per column;
+        the client still receives every row through the results events.
+        """
+        threshold = settings.RESULT_SUMMARY_THRESHOLD_BYTES
+        if summarize and threshold and self.byte_count > threshold:
+            RESULT_SUMMARIES.inc()
+            content = render_summary(
+                self.columns,
+                self.column_types,
+                self.rows,
+                settings.RESULT_SUMMARY_SAMPLE_ROWS,
+                settings.RESULT_SUMMARY_TOP_VALUES
+            )
+        else:
+            content = self.to_json()
+        if not self.truncated:
+            return content
+        return (
+            f"{content}\n"
+            f"(Results truncated to the first {self.row_count} rows "
+            f"because the {self.truncated_reason} limit was reached.)"
+        )
+
+class QueryExecutor:
+    def __init__(
+        self,
+        batch_rows: int = settings.QUERY_BATCH_ROWS,
+        guard: QueryGuard = query_guard,
+        prepared: bool = settings.QUERY_PREPARED_STATEMENTS,
+        prepared_max: int = settings.QUERY_PREPARED_MAX
+    ):
+        self.batch_rows = batch_rows
+        self.guard = guard
+        # Statements with literals run as prepared statements with the literals as parameters
+        self.prepared = prepared
+        self.prepared_max = prepared_max
+        self._prepared: "weakref.WeakKeyDictionary[AsyncConnection, OrderedDict]" = weakref.WeakKeyDictionary()
+        self.cancelled = 0
+        # Identical statements running at the same time share one execution
+        self.in_flight = SingleFlight("sql_execution")
+
+    async def stream(self, query: str, result: QueryResult) -> AsyncGenerator[List[Row], None]:
+        """Execute a query through a server-side cursor or as a prepared statement, yielding batches of rows"""
+        query = query.strip().rstrip(";")
+        snapshot = await schema_catalog.get_snapshot()
+        cache_key = result_cache.make_key(query, snapshot.fingerprint)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            result.load(cached)
+            self._record(result, "cache")
+            for start in range(0, len(cached.rows), self.batch_rows):
+                yield cached.rows[start:start + self.batch_rows]
+            return
+
+        # Another request is running the same statement: wait for its rows
+        flight_key = None if is_volatile(query) else (snapshot.fingerprint, normalize_sql(query))
+        shared = await self.in_flight.follow(flight_key)
+        if shared is not None:
+            result.load(shared)
+            self._record(result, "coalesced")
+            for start in range(0, len(shared.rows), self.batch_rows):
+                yield shared.rows[start:start + self.batch_rows]
+            return
+
+        # Lead the execution; when a leader ends without a result (its client went
+        # away) its followers get None above and run the statement themselves
+        flight = self.in_flight.lead(flight_key)
+        entry = None
+        started = time.perf_counter()
+        try:
+            async for batch in self._stream_from_database(query, result):
+                yield batch
+            self._record(result, "database")
+
+            tables = result_cache.referenced_tables(query, snapshot.table_names)
+            query_advisor.record(query, time.perf_counter() - started, result.row_count, tables)
+            entry = CachedResult(
+                result.columns,
+                result.column_types,
+                result.rows,
+                result.truncated,
+                result.truncated_reason,
+                result.byte_count,
+                tables,
+                result_cache.ttl_for(tables)
+            )
+            result_cache.set(cache_key, entry)
+        except (HTTPException, QueryRejected) as e:
+            if flight is not None:
+                self.in_flight.settle(flight_key, flight, error=e)
+            raise
+        finally:
+            if flight is not None:
+                self.in_flight.settle(flight_key, flight, entry)
+
+    async def _stream_from_database(self, query: str, result: QueryResult) -> AsyncGenerator[List[Row], None]:
+        statement = parameterize(query) if self.prepared else None
+        try:
+            if statement is not None and statement.params:
+                streamed = False
+                try:
+                    async for batch in self._read(statement.text, statement.params, result):
+                        streamed = True
+                        yield batch
+                    return
+                except PARAMETER_ERRORS as e:
+                    # Parameters can change how Postgres reads a statement;
+                    # run the text as generated before reporting an error
+                    if streamed:
+                        raise
+                    PREPARED_STATEMENTS.inc("fallback")
+                    logger.info("Parameterized statement failed, running it unchanged: %s", e)
+            async for batch in self._read(query, None, result):
+                yield batch
+        except (HTTPException, QueryRejected):
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Query failed: {str(e)}")
+
+    async def _read(
+        self, query: str, params: Optional[Dict[str, Any]], result: QueryResult
+    ) -> AsyncGenerator[List[Row], None]:
+        """Run a guarded statement, as a prepared statement when it has parameters"""
+        async with read_db.get_conn() as conn:
+            async with conn.transaction():
+                query = await self.guard.prepare(conn, query, params)
+                if params:
+                    # Server-side cursors cannot be prepared, so the row cap
+                    # bounds what the client-side cursor fetches instead
+                    query = f"SELECT * FROM ({query}\n) AS prepared_query LIMIT {result.max_rows + 1}"
+                    conn.prepared_max = self.prepared_max
+                    cursor, options = conn.cursor(), {"prepare": True}
+                else:
+                    cursor, options = conn.cursor(name="query_results"), {}
+                async with cursor as cur:
+                    try:
+                        await cur.execute(query, params, **options)
+                        if params:
+                            self._track_prepared(conn, query, params)
+                        result.columns = [col.name for col in cur.description or []]
+                        result.column_types = [col.type_display for col in cur.description or []]
+                        while True:
+                            rows = await cur.fetchmany(self.batch_rows)
+                            if not rows:
+                                return
+                            batch = []
+                            for row in rows:
+                                if not result.add(row):
+                                    break
+                                batch.append(row)
+                            if batch:
+                                yield batch
+                            if result.truncated:
+                                return
+                    except asyncio.CancelledError:
+                        # The client went away; stop the statement before the cursor is closed
+                        await self._cancel_statement(conn)
+                        raise
+
+    def _track_prepared(self, conn: AsyncConnection, query: str, params: Dict[str, Any]):
+        """Count whether psycopg reused a statement already prepared on this connection.
+
+        Mirrors psycopg's own per-connection LRU of `prepared_max` statements,
+        keyed like it by the query text and the parameter types.
+        """
+        prepared = self._prepared.setdefault(conn, OrderedDict())
+        key = (query, tuple(type(param).__name__ for param in params.values()))
+        if key in prepared:
+            prepared.move_to_end(key)
+            PREPARED_STATEMENTS.inc("hit")
+            return
+        PREPARED_STATEMENTS.inc("miss")
+        prepared[key] = None
+        while len(prepared) > self.prepared_max:
+            prepared.popitem(last=False)
+
+    def _record(self, result: QueryResult, source: str):
+        QUERY_ROWS.observe(result.row_count, source)
+        if result.truncated:
+            QUERY_TRUNCATED.inc(result.truncated_reason)
+
+    async def _cancel_statement(self, conn: AsyncConnection):
+        """Ask the server to cancel the statement running on a connection"""
+        self.cancelled += 1
+        with anyio.CancelScope(shield=True):
+            try:
+                await conn.cancel_safe(timeout=5.0)
+            except Exception:
+                logger.exception("Failed to cancel a running query")
+
+    async def execute(self, query: str) -> QueryResult:
+        """Execute a query and collect its bounded result"""
+        result = QueryResult()
+        async for _ in self.stream(query, result):
+            pass
+        return result
+
+query_executor = QueryExecutor()
@@ -0,0 +1,89 @@
+import json
+from typing import Any, Dict, Mapping, Optional, Tuple
+from psycopg import AsyncConnection, sql
+
+from app.core.config import settings
+
+class QueryRejected(Exception):
+    """Generated SQL was refused before execution; reason is shown to the model"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+class QueryGuard:
+    """Read-only, time-boxed execution with an EXPLAIN cost pre-check"""
+
+    def __init__(
+        self,
+        statement_timeout_ms: int = settings.QUERY_STATEMENT_TIMEOUT_MS,
+        lock_timeout_ms: int = settings.QUERY_LOCK_TIMEOUT_MS,
+        max_cost: float = settings.QUERY_MAX_COST,
+        max_rows: int = settings.QUERY_MAX_ROWS,
+        auto_limit: bool = settings.QUERY_AUTO_LIMIT,
+        explain: bool = settings.QUERY_EXPLAIN_ENABLED
+    ):
+        self.statement_timeout_ms = statement_timeout_ms
+        self.lock_timeout_ms = lock_timeout_ms
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.auto_limit = auto_limit
+        self.explain = explain
+        self.rejected = 0
+        self.limited = 0
+
+    async def _plan(
+        self, conn: AsyncConnection, query: str, params: Optional[Mapping[str, Any]] = None
+    ) -> Tuple[float, float, str]:
+        """Estimated total cost, rows and top node type of a query plan"""
+        cur = await conn.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+        plan_json = (await cur.fetchone())[0]
+        if isinstance(plan_json, str):
+            plan_json = json.loads(plan_json)
+        plan: Dict[str, Any] = plan_json[0]["Plan"]
+        return plan["Total Cost"], plan["Plan Rows"], plan["Node Type"]
+
+    def _with_limit(self, query: str) -> str:
+        # One extra row lets the executor detect and report truncation
+        # The newline ends a trailing -- comment before the closing parenthesis
+        return f"SELECT * FROM ({query}\n) AS limited_query LIMIT {self.max_rows + 1}"
+
+    async def prepare(
+        self, conn: AsyncConnection, query: str, params: Optional[Mapping[str, Any]] = None
+    ) -> str:
+        """Lock down the current transaction and return the query to run.
+
+        Must be called first thing inside a transaction. Raises QueryRejected
+        when the plan is too expensive even after adding a LIMIT. A
+        parameterized query is planned with its parameter values.
+        """
+        await conn.execute("SET TRANSACTION READ ONLY")
+        await conn.execute(sql.SQL("SET LOCAL statement_timeout = {}").format(self.statement_timeout_ms))
+        await conn.execute(sql.SQL("SET LOCAL lock_timeout = {}").format(self.lock_timeout_ms))
+        if not self.explain:
+            return query
+
+        cost, rows, node_type = await self._plan(conn, query, params)
+        if self.auto_limit and node_type != "Limit" and (
+            rows > self.max_rows or (self.max_cost and cost > self.max_cost)
+        ):
+            limited = self._with_limit(query)
+            limited_cost, _, _ = await self._plan(conn, limited, params)
+            if not self.max_cost or limited_cost <= self.max_cost:
+                self.limited += 1
+                return limited
+            cost = limited_cost
+
+        if self.max_cost and cost > self.max_cost:
+            self.rejected += 1
+            raise QueryRejected(
+                f"estimated cost {cost:,.0f} exceeds the limit of {self.max_cost:,.0f} "
+                f"(about {rows:,.0f} rows). Use more selective filters, pre-aggregate "
+                f"before joining, avoid cross joins, or add a LIMIT."
+            )
+        return query
+
+    def stats(self) -> Dict[str, int]:
+        return {"rejected": self.rejected, "auto_limited": self.limited}
+
+query_guard = QueryGuard()
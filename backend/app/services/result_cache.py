@@ -0,0 +1,139 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+
+# Quoted literals and identifiers are kept verbatim, everything else is case-folded
+_SQL_TOKENS = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")|([^'\"]+)")
+_IDENTIFIER = re.compile(r"[a-z_][a-z0-9_$]*")
+_VOLATILE = re.compile(
+    r"\b(random|setseed|nextval|setval|clock_timestamp|timeofday|gen_random_uuid)\s*\(",
+    re.IGNORECASE
+)
+
+def normalize_sql(sql: str) -> str:
+    """Case-fold and collapse whitespace outside of quoted literals"""
+    parts = []
+    for quoted, bare in _SQL_TOKENS.findall(sql.strip().rstrip(";")):
+        parts.append(quoted if quoted else " ".join(bare.lower().split()))
+    return " ".join(part for part in parts if part)
+
+def is_volatile(sql: str) -> bool:
+    """Whether the query can return different rows on every run"""
+    return _VOLATILE.search(sql) is not None
+
+class CachedResult:
+    def __init__(
+        self,
+        columns: List[str],
+        column_types: List[str],
+        rows: List[Tuple[Any, ...]],
+        truncated: bool,
+        truncated_reason: Optional[str],
+        byte_count: int,
+        tables: Iterable[str],
+        ttl_seconds: float
+    ):
+        self.columns = columns
+        self.column_types = column_types
+        self.rows = rows
+        self.truncated = truncated
+        self.truncated_reason = truncated_reason
+        self.byte_count = byte_count
+        self.tables = frozenset(tables)
+        self.expires_at = time.monotonic() + ttl_seconds
+
+class ResultCache:
+    """Byte-bounded LRU of query results keyed by normalized SQL and schema version"""
+
+    def __init__(
+        self,
+        max_bytes: int = settings.RESULT_CACHE_MAX_BYTES,
+        default_ttl_seconds: int = settings.RESULT_CACHE_TTL_SECONDS,
+        table_ttls: Optional[Dict[str, int]] = None,
+        enabled: bool = settings.RESULT_CACHE_ENABLED
+    ):
+        self.max_bytes = max_bytes
+        self.default_ttl_seconds = default_ttl_seconds
+        self.table_ttls = table_ttls if table_ttls is not None else settings.RESULT_CACHE_TABLE_TTLS
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def make_key(self, sql: str, schema_fingerprint: str) -> Optional[str]:
+        """Build the cache key, or None when the query must not be cached"""
+        if not self.enabled or is_volatile(sql):
+            return None
+        raw = f"{schema_fingerprint}\x00{normalize_sql(sql)}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def referenced_tables(self, sql: str, known_tables: Iterable[str]) -> List[str]:
+        """Tables from the schema that appear as identifiers in the query"""
+        identifiers = set(_IDENTIFIER.findall(normalize_sql(sql)))
+        return [table for table in known_tables if table.lower() in identifiers]
+
+    def ttl_for(self, tables: Iterable[str]) -> float:
+        """Shortest TTL among the referenced tables, falling back to the default"""
+        ttls = [self.table_ttls[table] for table in tables if table in self.table_ttls]
+        return min(ttls, default=self.default_ttl_seconds)
+
+    def get(self, key: Optional[str]) -> Optional[CachedResult]:
+        if key is None:
+            return None
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at < time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def set(self, key: Optional[str], entry: CachedResult):
+        if key is None or entry.byte_count > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self.total_bytes += entry.byte_count
+        while self.total_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry.byte_count
+
+    def invalidate(self, table: Optional[str] = None) -> int:
+        """Drop every entry, or only the entries that read from a table"""
+        if table is None:
+            keys = list(self._entries)
+        else:
+            keys = [key for key, entry in self._entries.items() if table in entry.tables]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+result_cache = ResultCache()
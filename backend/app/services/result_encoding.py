@@ -0,0 +1,56 @@
+import json
+from typing import Any, Dict, List, Sequence, Tuple
+
+from app.core.encoding import json_dumps
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+RESULT_FORMATS = ("rows", "columnar", "arrow")
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+Row = Tuple[Any, ...]
+
+def encode_rows(columns: List[str], rows: Sequence[Row]) -> str:
+    """JSON array with one object per row"""
+    return json_dumps([dict(zip(columns, row)) for row in rows])
+
+def encode_columnar(rows: Sequence[Row], width: int) -> str:
+    """JSON array with one array of values per column"""
+    if not rows:
+        return json_dumps([[] for _ in range(width)])
+    return json_dumps([list(values) for values in zip(*rows)])
+
+def describe_columns(columns: List[str], column_types: List[str]) -> List[Dict[str, str]]:
+    return [{"name": name, "type": type_name} for name, type_name in zip(columns, column_types)]
+
+def arrow_available() -> bool:
+    return pa is not None
+
+def _arrow_column(values: List[Any]) -> "pa.Array":
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, OverflowError):
+        # Mixed or unsupported values (uuid, json, ranges...) travel as text
+        return pa.array([
+            None if value is None
+            else value if isinstance(value, str)
+            else json.dumps(value, default=str) if isinstance(value, (dict, list))
+            else str(value)
+            for value in values
+        ], type=pa.string())
+
+def to_arrow_ipc(columns: List[str], rows: Sequence[Row], batch_rows: int) -> bytes:
+    """Encode rows as an Apache Arrow IPC stream, with types inferred per column"""
+    values = list(zip(*rows)) if rows else [() for _ in columns]
+    table = pa.Table.from_arrays(
+        [_arrow_column(list(column)) for column in values],
+        names=columns
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=batch_rows)
+    return sink.getvalue().to_pybytes()
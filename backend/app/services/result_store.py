@@ -0,0 +1,43 @@
+import uuid
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.ttl_cache import TTLCache
+from app.services.query_executor import QueryResult
+from app.services.stream_runs import WORKER_ID
+
+class ResultStore:
+    """Recently finished query results, fetchable by id in another encoding.
+
+    Results live in the memory of the worker that ran the query and expire
+    after RESULT_STORE_TTL_SECONDS. Their ids start with the id of that
+    worker, like query stream run ids. Each is kept with the chat it was asked
+    in, so that only the owner of the chat can fetch it.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = settings.RESULT_STORE_MAX_ENTRIES,
+        ttl_seconds: int = settings.RESULT_STORE_TTL_SECONDS
+    ):
+        self._results = TTLCache(max_entries, ttl_seconds)
+
+    def put(self, result: QueryResult, chat_id: int) -> str:
+        query_id = f"{WORKER_ID}.{uuid.uuid4().hex}"
+        self._results.set(query_id, (chat_id, result))
+        return query_id
+
+    def get(self, query_id: str) -> Optional[Tuple[int, QueryResult]]:
+        """The chat id and result stored under query_id"""
+        stored = self._results.get(query_id)
+        worker_id, separator, _ = query_id.partition(".")
+        if stored is None and separator and worker_id != WORKER_ID:
+            raise HTTPException(
+                status_code=421,
+                detail="Result belongs to another worker process; fetching results by id needs a single worker (SERVER_WORKERS=1)"
+            )
+        return stored
+
+result_store = ResultStore()
@@ -0,0 +1,89 @@
+import math
+from collections import Counter
+from datetime import date, time, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.core.encoding import json_dumps
+from app.services.result_encoding import Row
+
+QUANTILES = (("p25", 0.25), ("p50", 0.5), ("p75", 0.75))
+
+def _compact(value: float, rounded: bool = True) -> float:
+    """Whole numbers as ints; other statistics to six significant digits to keep the summary short"""
+    if value.is_integer():
+        return int(value)
+    return float(f"{value:.6g}") if rounded else value
+
+def _quantile(ordered: Sequence[float], q: float) -> float:
+    """Linearly interpolated quantile of sorted values"""
+    position = (len(ordered) - 1) * q
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+def summarize_column(name: str, type_name: str, values: Sequence[Any], top_values: int) -> Dict[str, Any]:
+    """Statistics of one column: numeric spread, time range, or most common values"""
+    present = [value for value in values if value is not None]
+    summary: Dict[str, Any] = {"name": name, "type": type_name, "nulls": len(values) - len(present)}
+    if not present:
+        return summary
+    if all(_is_number(value) for value in present):
+        ordered = sorted(map(float, present))
+        summary["min"] = _compact(ordered[0], rounded=False)
+        summary["max"] = _compact(ordered[-1], rounded=False)
+        summary["mean"] = _compact(math.fsum(ordered) / len(ordered))
+        for label, q in QUANTILES:
+            summary[label] = _compact(_quantile(ordered, q))
+    elif isinstance(present[0], (date, time, timedelta)) and len({type(value) for value in present}) == 1:
+        summary["min"] = min(present)
+        summary["max"] = max(present)
+    else:
+        # JSON and array values are counted by their text
+        counts = Counter(
+            value if isinstance(value, (str, int, float, bool, Decimal, date)) else json_dumps(value)
+            for value in present
+        )
+        summary["distinct"] = len(counts)
+        summary["top_values"] = [[value, count] for value, count in counts.most_common(top_values)]
+    return summary
+
+def summarize_rows(
+    columns: List[str],
+    column_types: List[str],
+    rows: List[Row],
+    sample_rows: int,
+    top_values: int
+) -> Dict[str, Any]:
+    """Compact stand-in for a large result: per-column statistics plus the first and last rows.
+
+    The rows are transposed once so that each column is reduced by builtins
+    (sorted, fsum, Counter) over a single sequence.
+    """
+    column_values = list(zip(*rows)) if rows else [()] * len(columns)
+    types: List[Optional[str]] = list(column_types) + [None] * (len(columns) - len(column_types))
+    return {
+        "row_count": len(rows),
+        "columns": [
+            summarize_column(name, type_name or "", values, top_values)
+            for name, type_name, values in zip(columns, types, column_values)
+        ],
+        "first_rows": rows[:sample_rows],
+        "last_rows": rows[max(sample_rows, len(rows) - sample_rows):]
+    }
+
+def render_summary(
+    columns: List[str],
+    column_types: List[str],
+    rows: List[Row],
+    sample_rows: int,
+    top_values: int
+) -> str:
+    summary = summarize_rows(columns, column_types, rows, sample_rows, top_values)
+    return (
+        f"The query returned {len(rows)} rows, too many to list. Summary of each column "
+        f"(rows are arrays in column order):\n{json_dumps(summary)}"
+    )
@@ -0,0 +1,226 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Dict, List, Any, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.database import db
+
+logger = logging.getLogger(__name__)
+
+# One round trip for every table, view and column in the public schema,
+# including the tables each column references through a foreign key and
+# the comment on each table.
+CATALOG_QUERY = """
+    SELECT c.relname AS table_name,
+           obj_description(c.oid, 'pg_class') AS table_description,
+           a.attname AS column_name,
+           format_type(a.atttypid, a.atttypmod) AS data_type,
+           (
+               SELECT array_agg(DISTINCT rc.relname)
+               FROM pg_catalog.pg_constraint con
+               JOIN pg_catalog.pg_class rc ON rc.oid = con.confrelid
+               WHERE con.conrelid = c.oid
+                 AND con.contype = 'f'
+                 AND a.attnum = ANY(con.conkey)
+           ) AS referenced_tables
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_catalog.pg_attribute a ON a.attrelid = c.oid
+    WHERE n.nspname = 'public'
+      AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+      AND a.attnum > 0
+      AND NOT a.attisdropped
+    ORDER BY c.relname, a.attnum
+"""
+
+
+def build_tools(schema_string: str) -> List[Dict[str, Any]]:
+    """Build the ask_database tool definition for a rendered schema"""
+    return [{
+        "type": "function",
+        "function": {
+            "name": "ask_database",
+            "description": "Use this function to answer database questions.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": f"SQL query using schema:\n{schema_string}",
+                    }
+                },
+                "required": ["query"],
+            }
+        }
+    }]
+
+
+def render_table(table: Dict[str, Any]) -> str:
+    """Render one table, its description and its columns for the tool definition"""
+    lines = [f"Table: {table['table_name']}"]
+    if table.get("description"):
+        lines.append(table["description"])
+    lines.extend(f"- {col['name']} ({col['type']})" for col in table['columns'])
+    return "\n".join(lines)
+
+
+class SchemaSnapshot:
+    """Immutable view of the database schema with precompiled renderings"""
+
+    def __init__(
+        self,
+        tables: List[Dict[str, Any]],
+        version: int,
+        foreign_keys: Optional[Dict[str, Set[str]]] = None
+    ):
+        self.tables = tables
+        self.table_names = [table["table_name"] for table in tables]
+        self.tables_by_name = {table["table_name"]: table for table in tables}
+        self.version = version
+        self.neighbours: Dict[str, Set[str]] = {name: set() for name in self.table_names}
+        for table, referenced in (foreign_keys or {}).items():
+            for other in referenced:
+                if other != table and table in self.neighbours and other in self.neighbours:
+                    self.neighbours[table].add(other)
+                    self.neighbours[other].add(table)
+        self.loaded_at = time.monotonic()
+        self.schema_json = json.dumps(tables, indent=2)
+        relationships = json.dumps(sorted(
+            (table, sorted(others)) for table, others in self.neighbours.items()
+        ))
+        self.fingerprint = hashlib.sha256(
+            (self.schema_json + relationships).encode()
+        ).hexdigest()[:16]
+        self.table_strings = {
+            table["table_name"]: render_table(table) for table in tables
+        }
+        self.schema_string = "\n".join(self.table_strings.values())
+        self.tools = build_tools(self.schema_string)
+
+    def render_subset(self, table_names: List[str]) -> Tuple[str, List[Dict[str, Any]]]:
+        """Render the prompt schema JSON and tool definition for selected tables"""
+        tables = [self.tables_by_name[name] for name in table_names]
+        schema_string = "\n".join(self.table_strings[name] for name in table_names)
+        return json.dumps(tables, indent=2), build_tools(schema_string)
+
+
+class SchemaCatalog:
+    """In-memory schema snapshot refreshed on TTL, on demand or on DDL notifications"""
+
+    def __init__(self, ttl_seconds: int = settings.SCHEMA_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._snapshot: Optional[SchemaSnapshot] = None
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._listen_task: Optional[asyncio.Task] = None
+
+    async def _load(self) -> Tuple[List[Dict[str, Any]], Dict[str, Set[str]]]:
+        """Load all tables, columns and foreign keys in a single catalog query"""
+        async with db.get_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(CATALOG_QUERY)
+                rows = await cur.fetchall()
+
+        tables: Dict[str, List[Dict[str, str]]] = {}
+        descriptions: Dict[str, str] = {}
+        foreign_keys: Dict[str, Set[str]] = {}
+        for table_name, description, column_name, data_type, referenced_tables in rows:
+            tables.setdefault(table_name, []).append(
+                {"name": column_name, "type": data_type}
+            )
+            if description:
+                descriptions[table_name] = description
+            if referenced_tables:
+                foreign_keys.setdefault(table_name, set()).update(referenced_tables)
+        return [
+            # Only commented tables carry a description, so other renderings are unchanged
+            {"table_name": name, "columns": columns, **(
+                {"description": descriptions[name]} if name in descriptions else {}
+            )}
+            for name, columns in tables.items()
+        ], foreign_keys
+
+    async def refresh(self) -> SchemaSnapshot:
+        """Reload the schema and swap in a new snapshot if it changed"""
+        async with self._lock:
+            tables, foreign_keys = await self._load()
+            current = self._snapshot
+            candidate = SchemaSnapshot(
+                tables, (current.version + 1) if current else 1, foreign_keys
+            )
+            if current and candidate.fingerprint == current.fingerprint:
+                # Unchanged schema keeps its version, only the TTL restarts
+                current.loaded_at = candidate.loaded_at
+                return current
+            self._snapshot = candidate
+            return candidate
+
+    def invalidate(self):
+        """Mark the current snapshot stale so the next access reloads it"""
+        if self._snapshot:
+            self._snapshot.loaded_at = float("-inf")
+
+    def _is_stale(self, snapshot: SchemaSnapshot) -> bool:
+        return time.monotonic() - snapshot.loaded_at > self.ttl_seconds
+
+    async def _background_refresh(self):
+        try:
+            await self.refresh()
+        except Exception:
+            logger.exception("Schema catalog refresh failed, keeping previous snapshot")
+
+    def _schedule_refresh(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._background_refresh())
+
+    async def get_snapshot(self) -> SchemaSnapshot:
+        """Return the current snapshot, serving stale data while a refresh runs"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            async with self._lock:
+                snapshot = self._snapshot
+            return snapshot or await self.refresh()
+        if self._is_stale(snapshot):
+            self._schedule_refresh()
+        return snapshot
+
+    async def _listen(self):
+        """Reload the snapshot whenever the DDL event trigger sends a notification"""
+        channel = settings.SCHEMA_LISTEN_CHANNEL
+        while True:
+            try:
+                conn = await db.connect(autocommit=True)
+                async with conn:
+                    await conn.execute(f'LISTEN "{channel}"')
+                    # Catch DDL that happened while we were not listening
+                    self._schedule_refresh()
+                    async for _ in conn.notifies():
+                        self._schedule_refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Schema change listener failed, reconnecting")
+                await asyncio.sleep(5)
+
+    async def start(self):
+        """Warm the snapshot and start listening for schema changes"""
+        await self.refresh()
+        if settings.SCHEMA_LISTEN_ENABLED and self._listen_task is None:
+            self._listen_task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        """Stop background refresh and listener tasks"""
+        for task in (self._listen_task, self._refresh_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._listen_task = None
+        self._refresh_task = None
+
+schema_catalog = SchemaCatalog()
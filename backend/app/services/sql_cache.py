@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+import re
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.encoding import json_dumps
+
+# Punctuation that never changes what is asked. Operators, signs, % and
+# decimal points are kept: "> 100" and "< 100" must not share SQL.
+_PUNCTUATION = re.compile(r"[?,;:]|!(?!=)|\.(?!\d)")
+
+def normalize_question(question: str) -> str:
+    """Case-fold, drop sentence punctuation and collapse whitespace"""
+    return " ".join(_PUNCTUATION.sub(" ", question.casefold()).split())
+
+class SQLCacheBackend(ABC):
+    """Storage interface for generated SQL keyed by question fingerprint"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, sql: str):
+        ...
+
+    @abstractmethod
+    async def clear(self):
+        ...
+
+class MemorySQLCacheBackend(SQLCacheBackend):
+    """Per-process LRU with TTL expiry"""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, sql = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return sql
+
+    async def set(self, key: str, sql: str):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, sql)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def clear(self):
+        self._entries.clear()
+
+class SQLiteSQLCacheBackend(SQLCacheBackend):
+    """Local SQLite file shared by every worker process on the host"""
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sql_cache (
+                    key TEXT PRIMARY KEY,
+                    sql TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sql_cache_last_used ON sql_cache (last_used)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT sql, expires_at FROM sql_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                conn.execute("DELETE FROM sql_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE sql_cache SET last_used = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def _set(self, key: str, sql: str):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO sql_cache (key, sql, expires_at, last_used) VALUES (?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE
+                SET sql = excluded.sql, expires_at = excluded.expires_at, last_used = excluded.last_used
+                """,
+                (key, sql, now + self.ttl_seconds, now)
+            )
+            conn.execute(
+                """
+                DELETE FROM sql_cache WHERE key IN (
+                    SELECT key FROM sql_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,)
+            )
+
+    def _clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sql_cache")
+
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, sql: str):
+        await asyncio.to_thread(self._set, key, sql)
+
+    async def clear(self):
+        await asyncio.to_thread(self._clear)
+
+class SQLCache:
+    """Question-to-SQL cache that lets repeated questions skip the tool-call completion"""
+
+    def __init__(self, backend: SQLCacheBackend, history_free_only: bool = True, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+        self.history_free_only = history_free_only
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def make_key(
+        self, question: str, history: List[Dict[str, Any]], schema_fingerprint: str, model: str
+    ) -> Optional[str]:
+        """Build the cache key, or None when the question depends on chat history.
+
+        The history sent with the question (summary included) is part of the
+        key, so a follow-up only reuses SQL generated in the same conversation.
+        """
+        if not self.enabled or (self.history_free_only and history):
+            return None
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+        raw = "\x00".join((model, schema_fingerprint, normalized, json_dumps(history) if history else ""))
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    async def get(self, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        sql = await self.backend.get(key)
+        if sql is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return sql
+
+    async def set(self, key: Optional[str], sql: str):
+        if key is None:
+            return
+        await self.backend.set(key, sql)
+        self.stores += 1
+
+    async def clear(self):
+        await self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+def create_sql_cache() -> SQLCache:
+    """Build the SQL cache configured in settings"""
+    if settings.SQL_CACHE_BACKEND == "sqlite":
+        backend: SQLCacheBackend = SQLiteSQLCacheBackend(
+            settings.SQL_CACHE_PATH,
+            settings.SQL_CACHE_MAX_ENTRIES,
+            settings.SQL_CACHE_TTL_SECONDS
+        )
+    elif settings.SQL_CACHE_BACKEND == "memory":
+        backend = MemorySQLCacheBackend(
+            settings.SQL_CACHE_MAX_ENTRIES,
+            settings.SQL_CACHE_TTL_SECONDS
+        )
+    else:
+        raise ValueError(f"Unknown SQL_CACHE_BACKEND: {settings.SQL_CACHE_BACKEND}")
+    return SQLCache(
+        backend,
+        history_free_only=settings.SQL_CACHE_HISTORY_FREE_ONLY,
+        enabled=settings.SQL_CACHE_ENABLED
+    )
+
+sql_cache = create_sql_cache()
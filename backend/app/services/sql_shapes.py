@@ -0,0 +1,99 @@
+import hashlib
+import re
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg.types.numeric import Int8
+
+# Comments, dollar-quoted and quoted text are copied verbatim; string and
+# number literals are candidates for parameters.
+_TOKENS = re.compile(
+    r"""
+      (?P<comment>--[^\n]*|/\*.*?\*/)
+    | (?P<dollar>\$(?P<tag>[A-Za-z_]*)\$.*?\$(?P=tag)\$)
+    | (?P<string>(?P<prefix>(?<![\w$])(?:[EeBbXxNn]|[Uu]&))?'(?:[^']|'')*')
+    | (?P<identifier>"(?:[^"]|"")*")
+    | (?P<number>(?<![\w.$])\d+(?:\.\d*)?(?:[eE][+-]?\d+)?(?![\w.]))
+    | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    | (?P<operator><>|!=|<=|>=|=|<|>)
+    | (?P<other>\S)
+    """,
+    re.DOTALL | re.VERBOSE
+)
+
+# Literals right after these take a value, never a type, name or position
+_VALUE_CONTEXT = {"=", "<>", "!=", "<", ">", "<=", ">=", "like", "ilike", "limit", "offset", "between"}
+
+class ParameterizedSQL:
+    """A statement with its value literals extracted as named psycopg parameters"""
+
+    def __init__(self, text: str, params: Dict[str, Any], shape: str):
+        self.text = text
+        self.params = params
+        # The same whatever the values, spacing or keyword case
+        self.shape = shape
+        self.fingerprint = hashlib.sha256(shape.encode()).hexdigest()[:16]
+
+def _literal_value(kind: str, token: str) -> Any:
+    if kind == "string":
+        return token[1:-1].replace("''", "'")
+    if "." in token or "e" in token.lower():
+        return Decimal(token)
+    # A fixed parameter type, so one prepared statement serves every value
+    return Int8(int(token))
+
+def parameterize(sql: str) -> ParameterizedSQL:
+    """Replace the literals compared against, matched, listed in IN (...) or
+    used as LIMIT/OFFSET by placeholders.
+
+    Literals elsewhere (type constants like DATE '...', ORDER BY 1, function
+    arguments such as round(x, 2) or numeric(10, 2)) stay in the text, since
+    a parameter there would change the meaning or the statement would not
+    parse. Repeats of a literal share one placeholder: Postgres only matches
+    a GROUP BY, DISTINCT ON or ORDER BY expression against the select list
+    when both use the same parameter. Every % left in the text is escaped
+    for psycopg.
+    """
+    parts: List[str] = []
+    params: Dict[str, Any] = {}
+    names: Dict[Tuple[str, str], str] = {}
+    shape: List[str] = []
+    position = 0
+    previous: Optional[str] = None
+    in_list = False  # Inside IN (...) while it only holds literals
+    between = False  # Between the two bounds of BETWEEN ... AND ...
+    for match in _TOKENS.finditer(sql):
+        kind = match.lastgroup
+        token = match.group()
+        if kind == "comment":
+            continue
+        if kind == "string" and match.group("prefix"):
+            kind = "other"
+        value_context = (
+            previous in _VALUE_CONTEXT
+            or (in_list and previous in ("(", ","))
+            or (between and previous == "and")
+        )
+        if kind in ("string", "number") and value_context:
+            name = names.get((kind, token))
+            if name is None:
+                name = names[(kind, token)] = f"p{len(names) + 1}"
+                params[name] = _literal_value(kind, token)
+            parts.append(sql[position:match.start()].replace("%", "%%"))
+            parts.append(f"%({name})s")
+            position = match.end()
+            shape.append(f"%({name})s")
+        else:
+            if in_list and token != ",":
+                in_list = False
+            shape.append(token.lower() if kind in ("word", "operator", "other") else token)
+        if previous == "and":
+            between = False
+        lowered = token.lower()
+        if lowered == "(" and previous == "in":
+            in_list = True
+        elif lowered == "between":
+            between = True
+        previous = lowered if kind in ("word", "operator", "other") else kind
+    parts.append(sql[position:].replace("%", "%%"))
+    return ParameterizedSQL("".join(parts), params, " ".join(shape))
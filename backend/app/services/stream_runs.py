@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from typing import AsyncGenerator, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.encoding import json_dumps
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+STREAM_RESUMES = registry.counter(
+    "query_stream_resumes_total",
+    "Reconnections to a query stream, by whether the missed events could be replayed",
+    ("outcome",)
+)
+
+# Builds the SSE events of a run given a check for whether every client left
+EventSource = Callable[[Callable[[], Awaitable[bool]]], AsyncGenerator[str, None]]
+
+# Run ids start with the id of the worker process holding the run
+WORKER_ID = f"{os.getpid():x}{uuid.uuid4().hex[:8]}"
+
+# Time a new run waits for its first reader to attach
+FIRST_READER_SECONDS = 5.0
+_FIRST_READER = object()
+
+class StreamRun:
+    """One query stream running independently of the connections reading it.
+
+    Every event gets the next event id and is kept in a ring buffer of at
+    most `buffer_bytes`, so a client that reconnects with Last-Event-ID is
+    sent what it missed and then follows the live events. Only events every
+    attached reader was sent are evicted: the producer waits for a reader
+    that is a full buffer behind, so a slow client slows the run down rather
+    than losing part of the answer. A run nobody has read for
+    `grace_seconds` is cancelled like a disconnected stream; with no grace
+    period it is cancelled as soon as its last reader leaves.
+    """
+
+    def __init__(self, run_id: str, user_id: int, buffer_bytes: int, grace_seconds: float):
+        self.run_id = run_id
+        self.user_id = user_id
+        self.buffer_bytes = buffer_bytes
+        self.grace_seconds = grace_seconds
+        self._events: Deque[Tuple[int, str]] = deque()
+        self._buffered_bytes = 0
+        self.last_event_id = 0
+        self.subscribers = 0
+        self.abandoned = False
+        self.finished_at: Optional[float] = None
+        self._published = asyncio.Event()
+        # Last event id sent to each attached reader; the first reader is
+        # expected from the start, before its request begins reading
+        self._readers: Dict[object, int] = {_FIRST_READER: 0}
+        self._consumed = asyncio.Event()
+        self._abandon_handle: Optional[asyncio.TimerHandle] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    @property
+    def first_event_id(self) -> int:
+        """The oldest event id still buffered"""
+        return self._events[0][0] if self._events else self.last_event_id + 1
+
+    def start(self, source: EventSource):
+        self._append("data: " + json_dumps({"type": "run", "run_id": self.run_id}) + "\n\n")
+        self._task = asyncio.create_task(self._run(source(self.is_abandoned)))
+        self._schedule_abandon(max(self.grace_seconds, FIRST_READER_SECONDS))
+
+    async def is_abandoned(self) -> bool:
+        return self.abandoned
+
+    async def _run(self, events: AsyncGenerator[str, None]):
+        try:
+            async for event in events:
+                await self.publish(event)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception("Query stream %s failed", self.run_id)
+        finally:
+            self.finished_at = time.monotonic()
+            self._wake()
+
+    async def publish(self, event: str):
+        """Number an SSE event and buffer it, waiting while a reader is too far behind"""
+        self._append(event)
+        while not self._trim():
+            consumed = self._consumed
+            await consumed.wait()
+
+    def _append(self, event: str):
+        self.last_event_id += 1
+        event = f"id: {self.last_event_id}\n{event}"
+        self._events.append((self.last_event_id, event))
+        self._buffered_bytes += len(event)
+        self._trim()
+        self._wake()
+
+    def _trim(self) -> bool:
+        """Evict the oldest events every attached reader was sent while over the budget.
+
+        Returns False when an attached reader holds the buffer over it.
+        """
+        sent = min(self._readers.values(), default=self.last_event_id)
+        while self._buffered_bytes > self.buffer_bytes and len(self._events) > 1:
+            if self._events[0][0] > sent:
+                return False
+            _, dropped = self._events.popleft()
+            self._buffered_bytes -= len(dropped)
+        return True
+
+    def _read(self, reader: object, event_id: Optional[int] = None):
+        """Record what a reader was sent (None once it detached) and wake a waiting producer"""
+        if event_id is None:
+            self._readers.pop(reader, None)
+        else:
+            self._readers[reader] = event_id
+        consumed, self._consumed = self._consumed, asyncio.Event()
+        consumed.set()
+
+    def _wake(self):
+        published, self._published = self._published, asyncio.Event()
+        published.set()
+
+    async def subscribe(self, last_event_id: int = 0) -> AsyncGenerator[str, None]:
+        """The events after last_event_id, then the live ones until the run ends"""
+        reader = object()
+        self.subscribers += 1
+        if self._abandon_handle is not None:
+            self._abandon_handle.cancel()
+            self._abandon_handle = None
+        try:
+            if last_event_id + 1 < self.first_event_id:
+                yield "data: " + json_dumps({
+                    "type": "error",
+                    "content": "The missed part of this answer is no longer available, please ask again"
+                }) + "\n\n"
+                return
+            self._read(reader, last_event_id)
+            self._read(_FIRST_READER)
+            while True:
+                published = self._published
+                for event_id, event in list(self._events):
+                    if event_id > last_event_id:
+                        last_event_id = event_id
+                        self._read(reader, event_id)
+                        yield event
+                if self.done and last_event_id >= self.last_event_id:
+                    return
+                await published.wait()
+        finally:
+            self._read(reader)
+            self.subscribers -= 1
+            self._schedule_abandon()
+
+    def _schedule_abandon(self, delay: Optional[float] = None):
+        if self.subscribers or self.done or self._abandon_handle is not None:
+            return
+        delay = self.grace_seconds if delay is None else delay
+        if delay <= 0:
+            self._abandon()
+            return
+        self._abandon_handle = asyncio.get_running_loop().call_later(delay, self._abandon)
+
+    def _abandon(self):
+        self._abandon_handle = None
+        self._read(_FIRST_READER)
+        if self.subscribers == 0 and not self.done:
+            self.abandoned = True
+            self.cancel()
+
+    def cancel(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    async def wait(self):
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+
+class StreamRunRegistry:
+    """The query streams of this worker, kept `ttl_seconds` after they end for late reconnects.
+
+    Runs live in the memory of the worker process that started them, so
+    only that process can resume or stop them.
+    """
+
+    def __init__(
+        self,
+        max_runs: int = settings.STREAM_RUN_MAX_RUNS,
+        buffer_bytes: int = settings.STREAM_RUN_BUFFER_BYTES,
+        grace_seconds: float = settings.STREAM_RUN_RESUME_GRACE_SECONDS,
+        ttl_seconds: float = settings.STREAM_RUN_TTL_SECONDS
+    ):
+        self.max_runs = max_runs
+        self.buffer_bytes = buffer_bytes
+        self.grace_seconds = grace_seconds
+        self.ttl_seconds = ttl_seconds
+        self._runs: Dict[str, StreamRun] = {}
+
+    @property
+    def running(self) -> int:
+        return sum(1 for run in self._runs.values() if not run.done)
+
+    def _expire(self):
+        now = time.monotonic()
+        for run_id, run in list(self._runs.items()):
+            if run.done and now - run.finished_at > self.ttl_seconds:
+                del self._runs[run_id]
+
+    def start(self, source: EventSource, user_id: int) -> StreamRun:
+        """Start producing the events of a user's query stream in the background"""
+        self._expire()
+        if len(self._runs) >= self.max_runs:
+            finished = sorted((run for run in self._runs.values() if run.done), key=lambda run: run.finished_at)
+            if not finished:
+                raise HTTPException(status_code=503, detail="Server busy, please retry")
+            del self._runs[finished[0].run_id]
+        run = StreamRun(f"{WORKER_ID}.{uuid.uuid4().hex}", user_id, self.buffer_bytes, self.grace_seconds)
+        self._runs[run.run_id] = run
+        run.start(source)
+        return run
+
+    def get(self, run_id: str, user_id: int) -> StreamRun:
+        """A run of the user; other users' runs are reported as not found"""
+        self._expire()
+        run = self._runs.get(run_id)
+        worker_id, separator, _ = run_id.partition(".")
+        if run is None and separator and worker_id != WORKER_ID:
+            raise HTTPException(
+                status_code=421,
+                detail="Query stream belongs to another worker process; resuming streams needs a single worker (SERVER_WORKERS=1)"
+            )
+        if run is None or run.user_id != user_id:
+            raise HTTPException(status_code=404, detail="Query stream not found")
+        return run
+
+    def resume(self, run_id: str, user_id: int, last_event_id: Optional[str]) -> AsyncGenerator[str, None]:
+        """Events of a run after the Last-Event-ID a reconnecting client sent"""
+        run = self.get(run_id, user_id)
+        try:
+            after = int(last_event_id) if last_event_id else 0
+        except ValueError:
+            after = 0
+        STREAM_RESUMES.inc("replayed" if after + 1 >= run.first_event_id else "expired")
+        return run.subscribe(after)
+
+    async def stop(self):
+        """Cancel the runs still going at shutdown; their partial answers are saved"""
+        runs = [run for run in self._runs.values() if not run.done]
+        for run in runs:
+            run.cancel()
+        await asyncio.gather(*(run.wait() for run in runs))
+
+stream_runs = StreamRunRegistry()
@@ -0,0 +1,91 @@
+from typing import Iterator, Tuple
+
+from app.core.database import pool_manager, read_db
+from app.core.metrics import Samples, registry
+from app.core.security import password_hasher
+from app.services.job_service import job_service
+from app.services.message_writer import message_writer
+from app.services.query_advisor import query_advisor
+from app.services.query_executor import query_executor
+from app.services.query_guard import query_guard
+from app.services.result_cache import result_cache
+from app.services.sql_cache import sql_cache
+from app.services.stream_runs import stream_runs
+
+Family = Tuple[str, str, str, Samples]
+
+def _pool_metrics() -> Iterator[Family]:
+    stats = pool_manager.stats()
+    gauges = (
+        ("in_use", "Connections checked out"),
+        ("waiting", "Clients waiting for a connection"),
+        ("size", "Open connections"),
+        ("available", "Idle connections"),
+    )
+    for key, documentation in gauges:
+        yield (f"db_pool_{key}", "gauge", documentation, [
+            ({"pool": name}, pool[key]) for name, pool in stats.items() if key in pool
+        ])
+    yield ("db_pool_healthy", "gauge", "1 when the pool passed its last health check", [
+        ({"pool": name}, int(pool["healthy"])) for name, pool in stats.items()
+    ])
+    yield ("db_pool_checkouts_total", "counter", "Connections handed out", [
+        ({"pool": name}, pool["checkouts"]) for name, pool in stats.items()
+    ])
+    yield ("db_pool_checkout_errors_total", "counter", "Checkouts that failed or timed out", [
+        ({"pool": name}, pool["checkout_errors"]) for name, pool in stats.items()
+    ])
+    yield ("db_pool_checkout_wait_seconds_avg", "gauge", "Mean wait for a connection", [
+        ({"pool": name}, pool["avg_checkout_ms"] / 1000) for name, pool in stats.items()
+    ])
+    yield ("db_pool_checkout_wait_seconds_max", "gauge", "Longest wait for a connection", [
+        ({"pool": name}, pool["max_checkout_ms"] / 1000) for name, pool in stats.items()
+    ])
+    yield ("db_pool_usage_seconds_total", "counter", "Time connections spent checked out", [
+        ({"pool": name}, pool["usage_ms"] / 1000) for name, pool in stats.items() if "usage_ms" in pool
+    ])
+    yield ("db_replica_fallbacks_total", "counter", "Read queries sent to the primary after a replica failed", [
+        ({}, read_db.fallbacks)
+    ])
+
+def _cache_metrics() -> Iterator[Family]:
+    for name, stats in (("sql", sql_cache.stats()), ("result", result_cache.stats())):
+        yield (f"{name}_cache_hits_total", "counter", f"{name} cache hits", [({}, stats["hits"])])
+        yield (f"{name}_cache_misses_total", "counter", f"{name} cache misses", [({}, stats["misses"])])
+    yield ("result_cache_bytes", "gauge", "Bytes held by the result cache", [({}, result_cache.total_bytes)])
+    yield ("result_cache_evictions_total", "counter", "Result cache evictions", [({}, result_cache.evictions)])
+
+def _service_metrics() -> Iterator[Family]:
+    guard = query_guard.stats()
+    yield ("query_guard_rejected_total", "counter", "Queries refused by the cost check", [({}, guard["rejected"])])
+    yield ("query_guard_auto_limited_total", "counter", "Queries wrapped in a LIMIT", [({}, guard["auto_limited"])])
+    yield ("query_cancelled_total", "counter", "Running statements cancelled after a disconnect", [
+        ({}, query_executor.cancelled)
+    ])
+    yield ("message_writer_written_total", "counter", "Chat messages persisted", [({}, message_writer.written)])
+    yield ("message_writer_dropped_total", "counter", "Chat messages that could not be persisted", [
+        ({}, message_writer.dropped)
+    ])
+    yield ("message_writer_queue_depth", "gauge", "Turns waiting to be written", [
+        ({}, message_writer.queue_depth)
+    ])
+    yield ("query_streams_running", "gauge", "Query streams still producing events in this process", [
+        ({}, stream_runs.running)
+    ])
+    yield ("query_jobs_running", "gauge", "Query jobs running in this process", [({}, job_service.running)])
+    yield ("advisor_query_shapes", "gauge", "SQL shapes tracked by the query advisor", [
+        ({}, query_advisor.shape_count)
+    ])
+    yield ("advisor_views", "gauge", "Materialized views created by the query advisor", [
+        ({}, query_advisor.view_count)
+    ])
+    yield ("password_hash_in_flight", "gauge", "bcrypt calls running or queued", [
+        ({}, password_hasher.in_flight)
+    ])
+
+registry.register_collector(_pool_metrics)
+registry.register_collector(_cache_metrics)
+registry.register_collector(_service_metrics)
+
+def render_metrics() -> str:
+    return registry.render()
@@ -0,0 +1,140 @@
+-- Synthetic stand-in for the dvdrental sample database, with the same row
+-- counts for the tables used by the benchmark queries. Safe to re-run: tables
+-- are only created and filled when missing or empty, so an existing dvdrental
+-- database is left untouched.
+
+CREATE TABLE IF NOT EXISTS actor (
+    actor_id SERIAL PRIMARY KEY,
+    first_name VARCHAR(45) NOT NULL,
+    last_name VARCHAR(45) NOT NULL,
+    last_update TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS category (
+    category_id SERIAL PRIMARY KEY,
+    name VARCHAR(25) NOT NULL,
+    last_update TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS film (
+    film_id SERIAL PRIMARY KEY,
+    title VARCHAR(255) NOT NULL,
+    description TEXT,
+    release_year INTEGER,
+    rental_duration SMALLINT NOT NULL DEFAULT 3,
+    rental_rate NUMERIC(4,2) NOT NULL DEFAULT 4.99,
+    length SMALLINT,
+    replacement_cost NUMERIC(5,2) NOT NULL DEFAULT 19.99,
+    rating VARCHAR(10),
+    last_update TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS film_actor (
+    actor_id INTEGER NOT NULL REFERENCES actor (actor_id),
+    film_id INTEGER NOT NULL REFERENCES film (film_id),
+    last_update TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (actor_id, film_id)
+);
+
+CREATE TABLE IF NOT EXISTS film_category (
+    film_id INTEGER NOT NULL REFERENCES film (film_id),
+    category_id INTEGER NOT NULL REFERENCES category (category_id),
+    last_update TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (film_id, category_id)
+);
+
+CREATE TABLE IF NOT EXISTS customer (
+    customer_id SERIAL PRIMARY KEY,
+    store_id SMALLINT NOT NULL,
+    first_name VARCHAR(45) NOT NULL,
+    last_name VARCHAR(45) NOT NULL,
+    email VARCHAR(50),
+    activebool BOOLEAN NOT NULL DEFAULT true,
+    create_date DATE NOT NULL DEFAULT CURRENT_DATE,
+    last_update TIMESTAMP DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS inventory (
+    inventory_id SERIAL PRIMARY KEY,
+    film_id INTEGER NOT NULL REFERENCES film (film_id),
+    store_id SMALLINT NOT NULL,
+    last_update TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS rental (
+    rental_id SERIAL PRIMARY KEY,
+    rental_date TIMESTAMP NOT NULL,
+    inventory_id INTEGER NOT NULL REFERENCES inventory (inventory_id),
+    customer_id INTEGER NOT NULL REFERENCES customer (customer_id),
+    return_date TIMESTAMP,
+    staff_id SMALLINT NOT NULL,
+    last_update TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS payment (
+    payment_id SERIAL PRIMARY KEY,
+    customer_id INTEGER NOT NULL REFERENCES customer (customer_id),
+    staff_id SMALLINT NOT NULL,
+    rental_id INTEGER NOT NULL REFERENCES rental (rental_id),
+    amount NUMERIC(5,2) NOT NULL,
+    payment_date TIMESTAMP NOT NULL
+);
+
+INSERT INTO actor (first_name, last_name)
+SELECT 'Actor' || g, 'Surname' || (g % 121)
+FROM generate_series(1, 200) g
+WHERE NOT EXISTS (SELECT 1 FROM actor);
+
+INSERT INTO category (name)
+SELECT 'Category ' || g
+FROM generate_series(1, 16) g
+WHERE NOT EXISTS (SELECT 1 FROM category);
+
+INSERT INTO film (title, description, release_year, rental_duration, rental_rate, length, rating)
+SELECT
+    'Film ' || g,
+    'A synthetic film description number ' || g,
+    2006,
+    3 + g % 5,
+    (ARRAY[0.99, 2.99, 4.99])[1 + g % 3],
+    46 + g % 140,
+    (ARRAY['G', 'PG', 'PG-13', 'R', 'NC-17'])[1 + g % 5]
+FROM generate_series(1, 1000) g
+WHERE NOT EXISTS (SELECT 1 FROM film);
+
+INSERT INTO film_actor (actor_id, film_id)
+SELECT 1 + (g / 1000 * 37 + g * 7919) % 200, 1 + g % 1000
+FROM generate_series(1, 5462) g
+WHERE NOT EXISTS (SELECT 1 FROM film_actor);
+
+INSERT INTO film_category (film_id, category_id)
+SELECT g, 1 + g % 16
+FROM generate_series(1, 1000) g
+WHERE NOT EXISTS (SELECT 1 FROM film_category);
+
+INSERT INTO customer (store_id, first_name, last_name, email)
+SELECT 1 + g % 2, 'Customer' || g, 'Surname' || (g % 300), 'customer' || g || '@example.com'
+FROM generate_series(1, 599) g
+WHERE NOT EXISTS (SELECT 1 FROM customer);
+
+INSERT INTO inventory (film_id, store_id)
+SELECT 1 + g % 1000, 1 + g % 2
+FROM generate_series(1, 4581) g
+WHERE NOT EXISTS (SELECT 1 FROM inventory);
+
+INSERT INTO rental (rental_date, inventory_id, customer_id, return_date, staff_id)
+SELECT
+    timestamp '2005-05-24' + g * interval '25 minutes',
+    1 + (g * 31) % 4581,
+    1 + (g * 17) % 599,
+    timestamp '2005-05-24' + g * interval '25 minutes' + (1 + g % 9) * interval '1 day',
+    1 + g % 2
+FROM generate_series(1, 16044) g
+WHERE NOT EXISTS (SELECT 1 FROM rental);
+
+INSERT INTO payment (customer_id, staff_id, rental_id, amount, payment_date)
+SELECT r.customer_id, r.staff_id, r.rental_id, (ARRAY[0.99, 2.99, 4.99, 5.99])[1 + r.rental_id % 4], r.rental_date
+FROM rental r
+WHERE r.rental_id <= 14596 AND NOT EXISTS (SELECT 1 FROM payment);
+
+ANALYZE;
@@ -0,0 +1,188 @@
+"""OpenAI-compatible chat completions stand-in for offline benchmarks.
+
+Serves POST /v1/chat/completions. Requests that carry tools get a scripted
+ask_database tool call whose SQL is picked from SCRIPTED_SQL by the question;
+all other requests get a canned answer. Streamed responses wait --latency-ms
+before the first chunk and then emit --tokens-per-second chunks of about four
+characters, like a real model, and end with a usage chunk when asked for one.
+
+    cd backend && python -m benchmarks.fake_openai --port 8100 --latency-ms 400
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 python run.py
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+import zlib
+from typing import Any, AsyncIterator, Dict, List
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+# Queries over the dvdrental tables seeded by benchmarks/dvdrental_seed.sql
+SCRIPTED_SQL = [
+    """SELECT f.title, COUNT(r.rental_id) AS rental_count
+FROM film f
+JOIN inventory i ON f.film_id = i.film_id
+JOIN rental r ON i.inventory_id = r.inventory_id
+GROUP BY f.film_id
+ORDER BY rental_count DESC
+LIMIT 10""",
+    """SELECT c.customer_id, c.first_name || ' ' || c.last_name AS customer_name,
+  COUNT(p.payment_id) AS payments, SUM(p.amount) AS total_paid
+FROM customer c
+JOIN payment p ON c.customer_id = p.customer_id
+GROUP BY c.customer_id
+ORDER BY total_paid DESC
+LIMIT 50""",
+    """SELECT cat.name AS category, COUNT(*) AS films, AVG(f.rental_rate) AS avg_rate
+FROM category cat
+JOIN film_category fc ON cat.category_id = fc.category_id
+JOIN film f ON fc.film_id = f.film_id
+GROUP BY cat.name
+ORDER BY films DESC""",
+    """SELECT a.first_name, a.last_name, COUNT(fa.film_id) AS films
+FROM actor a
+JOIN film_actor fa ON a.actor_id = fa.actor_id
+GROUP BY a.actor_id
+ORDER BY films DESC""",
+    """SELECT rental_id, rental_date, return_date, customer_id
+FROM rental
+ORDER BY rental_date DESC
+LIMIT 500""",
+]
+
+ANSWER = (
+    "The query returned the rows shown above. The first rows are the largest "
+    "values, and the distribution drops off quickly after the top entries, "
+    "which suggests a small number of items account for most of the activity. "
+    "You can narrow the result down further by adding a date range or a category."
+)
+
+def approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def pieces(text: str, size: int = 4) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+def last_user_message(messages: List[Dict[str, Any]]) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user" and isinstance(message.get("content"), str):
+            return message["content"]
+    return ""
+
+def prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum(approx_tokens(json.dumps(message)) for message in messages)
+
+class FakeOpenAI:
+    def __init__(self, latency: float, tokens_per_second: float, answer_tokens: int):
+        self.latency = latency
+        self.interval = 1 / tokens_per_second if tokens_per_second > 0 else 0.0
+        words = ANSWER.split(" ")
+        self.answer = " ".join(words[i % len(words)] for i in range(answer_tokens))
+        self.requests = 0
+
+    def scripted_sql(self, question: str) -> str:
+        return SCRIPTED_SQL[zlib.crc32(question.encode()) % len(SCRIPTED_SQL)]
+
+    def _chunk(self, completion_id: str, model: str, delta: Dict[str, Any], finish=None) -> str:
+        return "data: " + json.dumps({
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]
+        }) + "\n\n"
+
+    async def _stream(self, body: Dict[str, Any]) -> AsyncIterator[str]:
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = body.get("model", "fake")
+        await asyncio.sleep(self.latency)
+        if body.get("tools"):
+            arguments = json.dumps({"query": self.scripted_sql(last_user_message(body["messages"]))})
+            yield self._chunk(completion_id, model, {
+                "role": "assistant",
+                "tool_calls": [{
+                    "index": 0,
+                    "id": f"call_{uuid.uuid4().hex[:24]}",
+                    "type": "function",
+                    "function": {"name": "ask_database", "arguments": ""}
+                }]
+            })
+            for piece in pieces(arguments):
+                await asyncio.sleep(self.interval)
+                yield self._chunk(completion_id, model, {
+                    "tool_calls": [{"index": 0, "function": {"arguments": piece}}]
+                })
+            completion, finish = arguments, "tool_calls"
+        else:
+            yield self._chunk(completion_id, model, {"role": "assistant", "content": ""})
+            for piece in pieces(self.answer):
+                await asyncio.sleep(self.interval)
+                yield self._chunk(completion_id, model, {"content": piece})
+            completion, finish = self.answer, "stop"
+        yield self._chunk(completion_id, model, {}, finish)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield "data: " + json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [],
+                "usage": self._usage(body, completion)
+            }) + "\n\n"
+        yield "data: [DONE]\n\n"
+
+    def _usage(self, body: Dict[str, Any], completion: str) -> Dict[str, int]:
+        prompt = prompt_tokens(body.get("messages", []))
+        completion_tokens = approx_tokens(completion)
+        return {
+            "prompt_tokens": prompt,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt + completion_tokens
+        }
+
+    async def completions(self, request: Request):
+        body = await request.json()
+        self.requests += 1
+        if body.get("stream"):
+            return StreamingResponse(self._stream(body), media_type="text/event-stream")
+        # Non-streamed calls (history summaries, tool-less explanations)
+        await asyncio.sleep(self.latency + self.interval * approx_tokens(self.answer))
+        return JSONResponse({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.answer},
+                "finish_reason": "stop"
+            }],
+            "usage": self._usage(body, self.answer)
+        })
+
+def create_app(latency: float, tokens_per_second: float, answer_tokens: int) -> Starlette:
+    fake = FakeOpenAI(latency, tokens_per_second, answer_tokens)
+    return Starlette(routes=[Route("/v1/chat/completions", fake.completions, methods=["POST"])])
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency-ms", type=float, default=400, help="delay before the first chunk")
+    parser.add_argument("--tokens-per-second", type=float, default=80)
+    parser.add_argument("--answer-tokens", type=int, default=120, help="words in each explanation")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    app = create_app(args.latency_ms / 1000, args.tokens_per_second, args.answer_tokens)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
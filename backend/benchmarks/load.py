@@ -0,0 +1,369 @@
+"""Offline load test of the API with a stand-in for OpenAI.
+
+Starts benchmarks.fake_openai and the API (serve.py with --workers) pointed at
+it, signs up --concurrency users and lets each of them loop over a weighted
+mix of /query SSE streams, logins and chat listings for --duration seconds.
+Reports requests/s and p50/p95/p99 latency per operation, time to the first
+explanation token of /query, and the peak resident memory of every worker.
+
+Both databases must be reachable with the settings from .env: the auth
+database created by sql/auth_db_init.sql and an analytics database holding
+dvdrental. --seed fills --analytics-db with a synthetic dvdrental of the same
+size (benchmarks/dvdrental_seed.sql), so a scratch database works too.
+
+    cd backend && python -m benchmarks.load --workers 2 --concurrency 50 --duration 60
+    python -m benchmarks.load --save baseline.json
+    python -m benchmarks.load --baseline baseline.json  # exits 1 on a regression
+
+With --url an already running deployment is measured instead; it has to be
+configured with OPENAI_BASE_URL pointing at a fake_openai instance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import httpx  # noqa: E402
+import psycopg  # noqa: E402
+from psycopg.conninfo import make_conninfo  # noqa: E402
+
+from app.core.auth_database import auth_db  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.core.database import analytics_conninfo  # noqa: E402
+from benchmarks import fake_openai  # noqa: E402
+from migrate import split_statements  # noqa: E402
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+SEED_FILE = Path(__file__).parent / "dvdrental_seed.sql"
+
+QUESTIONS = [
+    "Which films were rented the most?",
+    "Who are our best paying customers?",
+    "How many films are in each category and what do they cost?",
+    "Which actors appear in the most films?",
+    "Show the latest rentals",
+]
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+class Recorder:
+    """Latency samples (seconds) and error counts per operation"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, operation: str, seconds: float):
+        self.samples.setdefault(operation, []).append(seconds)
+
+    def error(self, operation: str):
+        self.errors[operation] = self.errors.get(operation, 0) + 1
+
+    def summary(self, elapsed: float) -> Dict[str, Dict[str, float]]:
+        return {
+            operation: {
+                "count": len(samples),
+                "errors": self.errors.get(operation, 0),
+                "rps": len(samples) / elapsed,
+                "p50_ms": percentile(samples, 50) * 1000,
+                "p95_ms": percentile(samples, 95) * 1000,
+                "p99_ms": percentile(samples, 99) * 1000,
+            }
+            for operation, samples in sorted(self.samples.items())
+        }
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, args, index: int):
+        self.client = client
+        self.recorder = recorder
+        self.args = args
+        self.username = f"bench_{args.run_id}_{index}"
+        self.password = "benchmark-password"
+        self.headers: Dict[str, str] = {}
+        self.chat_id: Optional[int] = None
+
+    async def setup(self):
+        response = await self.client.post("/api/v1/auth/signup", json={
+            "username": self.username,
+            "email": f"{self.username}@example.com",
+            "password": self.password
+        })
+        response.raise_for_status()
+        await self.login()
+        response = await self.client.post("/api/v1/chats", json={"title": "Benchmark"}, headers=self.headers)
+        response.raise_for_status()
+        self.chat_id = response.json()["id"]
+
+    async def login(self):
+        start = time.perf_counter()
+        response = await self.client.post(
+            "/api/v1/auth/login", data={"username": self.username, "password": self.password}
+        )
+        if response.status_code != 200:
+            self.recorder.error("login")
+            return
+        self.recorder.add("login", time.perf_counter() - start)
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def list_chats(self):
+        start = time.perf_counter()
+        response = await self.client.get("/api/v1/chats", headers=self.headers)
+        if response.status_code != 200:
+            self.recorder.error("chats")
+            return
+        self.recorder.add("chats", time.perf_counter() - start)
+
+    async def query(self):
+        question = random.choice(QUESTIONS)
+        if self.args.distinct_questions:
+            # Defeat the question-to-SQL cache for a share of the questions
+            question += f" (variant {random.randrange(self.args.distinct_questions)})"
+        start = time.perf_counter()
+        first_token = None
+        failed = False
+        async with self.client.stream("POST", "/api/v1/query", json={
+            "question": question,
+            "chat_id": self.chat_id,
+            "result_format": self.args.result_format
+        }, headers=self.headers) as response:
+            if response.status_code != 200:
+                self.recorder.error("query")
+                return
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                event_type = json.loads(line[6:]).get("type")
+                if event_type == "token" and first_token is None:
+                    first_token = time.perf_counter() - start
+                elif event_type == "error":
+                    failed = True
+                elif event_type == "end":
+                    break
+        if failed:
+            self.recorder.error("query")
+            return
+        self.recorder.add("query", time.perf_counter() - start)
+        if first_token is not None:
+            self.recorder.add("query_ttft", first_token)
+
+    async def run(self, deadline: float, mix: Dict[str, float]):
+        actions = {"query": self.query, "login": self.login, "chats": self.list_chats}
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        while time.perf_counter() < deadline:
+            operation = random.choices(names, weights)[0]
+            try:
+                await actions[operation]()
+            except httpx.HTTPError:
+                self.recorder.error(operation)
+
+def rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+def worker_pids(pid: int) -> List[int]:
+    """uvicorn worker processes of a server pid (the pid itself with one worker)"""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as children:
+            candidates = [int(child) for child in children.read().split()]
+    except OSError:
+        return [pid]
+    workers = []
+    for child in candidates:
+        try:
+            with open(f"/proc/{child}/cmdline", "rb") as cmdline:
+                if b"spawn_main" in cmdline.read():
+                    workers.append(child)
+        except OSError:
+            continue
+    return workers or [pid]
+
+async def sample_memory(pid: int, peaks: Dict[int, float], stop: asyncio.Event):
+    while not stop.is_set():
+        for worker in worker_pids(pid):
+            peaks[worker] = max(peaks.get(worker, 0.0), rss_mb(worker))
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=1.0)
+        except asyncio.TimeoutError:
+            pass
+
+def seed(args):
+    conninfo = make_conninfo(analytics_conninfo(settings.DB_HOST), dbname=args.analytics_db)
+    print(f"Seeding a synthetic dvdrental into {args.analytics_db}...")
+    with psycopg.connect(conninfo, autocommit=True) as conn:
+        for statement in split_statements(SEED_FILE.read_text()):
+            conn.execute(statement)
+
+def check_auth_database():
+    with psycopg.connect(auth_db.conninfo) as conn:
+        if conn.execute("SELECT to_regclass('users')").fetchone()[0] is None:
+            sys.exit(f"{settings.AUTH_DB_NAME} has no users table, create it with sql/auth_db_init.sql")
+
+def start_servers(args) -> List[subprocess.Popen]:
+    fake = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.fake_openai",
+            "--port", str(args.fake_port),
+            "--latency-ms", str(args.latency_ms),
+            "--tokens-per-second", str(args.tokens_per_second),
+            "--answer-tokens", str(args.answer_tokens),
+        ],
+        cwd=BACKEND_DIR
+    )
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.fake_port}/v1",
+        "OPENAI_API_KEY": "benchmark",
+        "DB_NAME": args.analytics_db,
+        "SERVER_HOST": "127.0.0.1",
+        "SERVER_PORT": str(args.port),
+        "SERVER_WORKERS": str(args.workers),
+    }
+    api = subprocess.Popen([sys.executable, "serve.py"], cwd=BACKEND_DIR, env=env)
+    return [fake, api]
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 60.0) -> Dict[str, float]:
+    """Startup timings reported by /health once a worker has warmed up"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            response = await client.get("/health")
+            if response.status_code == 200:
+                return {"ready": time.perf_counter() - start, **response.json()["startup_seconds"]}
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"API not ready after {timeout:.0f}s")
+
+async def run(args, api: Optional[subprocess.Popen]) -> Dict:
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=120.0) as client:
+        startup = await wait_until_ready(client)
+        print(f"API ready after {startup['ready']:.1f}s ({startup})")
+        recorder = Recorder()
+        users = [VirtualUser(client, recorder, args, i) for i in range(args.concurrency)]
+        await asyncio.gather(*(user.setup() for user in users))
+        recorder.samples.clear()
+
+        peaks: Dict[int, float] = {}
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_memory(api.pid, peaks, stop)) if api else None
+        print(f"Running {args.concurrency} users for {args.duration:.0f}s...")
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(user.run(deadline, args.mix) for user in users))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        if sampler:
+            await sampler
+
+    return {
+        "workers": args.workers,
+        "concurrency": args.concurrency,
+        "duration_s": elapsed,
+        "startup_seconds": startup,
+        "operations": recorder.summary(elapsed),
+        "peak_rss_mb": {str(pid): round(mb, 1) for pid, mb in sorted(peaks.items())},
+    }
+
+def report(results: Dict):
+    print(f"\n{'operation':<12}{'count':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for operation, stats in results["operations"].items():
+        print(
+            f"{operation:<12}{stats['count']:>8}{stats['errors']:>8}{stats['rps']:>9.1f}"
+            f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}"
+        )
+    for pid, mb in results["peak_rss_mb"].items():
+        print(f"worker {pid}: peak RSS {mb:.1f} MB")
+
+def regressions(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Operations whose p95 latency grew or throughput fell by more than the tolerance"""
+    found = []
+    for operation, stats in results["operations"].items():
+        before = baseline["operations"].get(operation)
+        if not before:
+            continue
+        if before["p95_ms"] and stats["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            found.append(f"{operation}: p95 {before['p95_ms']:.1f} -> {stats['p95_ms']:.1f} ms")
+        if stats["rps"] < before["rps"] * (1 - tolerance):
+            found.append(f"{operation}: {before['rps']:.1f} -> {stats['rps']:.1f} req/s")
+    return found
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("query", "login", "chats"):
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="measure a running API instead of starting one")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=20, help="simulated users")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("query=6,chats=3,login=1"))
+    parser.add_argument("--distinct-questions", type=int, default=20,
+                        help="question variants per base question, 0 to always hit the SQL cache")
+    parser.add_argument("--result-format", choices=["rows", "columnar", "arrow"], default="rows")
+    parser.add_argument("--analytics-db", default=settings.DB_NAME)
+    parser.add_argument("--seed", action="store_true", help="seed a synthetic dvdrental first")
+    parser.add_argument("--fake-port", type=int, default=8100)
+    fake_openai.add_arguments(parser)
+    parser.add_argument("--save", help="write the results as JSON")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression, 0.2 = 20%%")
+    args = parser.parse_args()
+    args.run_id = uuid.uuid4().hex[:8]
+
+    if args.seed:
+        seed(args)
+    check_auth_database()
+    processes = []
+    api = None
+    if not args.url:
+        processes = start_servers(args)
+        api = processes[1]
+        args.url = f"http://127.0.0.1:{args.port}"
+    try:
+        results = asyncio.run(run(args, api))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+
+    report(results)
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=2))
+    if args.baseline:
+        found = regressions(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        return 1 if found else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
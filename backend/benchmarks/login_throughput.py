@@ -0,0 +1,78 @@
+"""Login throughput vs. streaming latency benchmark.
+
+Simulates SSE streams that emit a token every --interval-ms while a burst of
+logins verifies bcrypt passwords, once with verification inline on the event
+loop (the old behaviour) and once through the bounded password-hash pool.
+Reports logins/s and how late the stream ticks fired.
+
+    cd backend && python -m benchmarks.login_throughput --logins 200 --streams 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.core.security import PasswordHasher, get_password_hash, verify_password  # noqa: E402
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+async def stream(interval: float, stop: asyncio.Event, lateness: list):
+    """Emit a token every interval and record how late each one was"""
+    loop = asyncio.get_running_loop()
+    expected = loop.time() + interval
+    while not stop.is_set():
+        await asyncio.sleep(max(0.0, expected - loop.time()))
+        lateness.append((loop.time() - expected) * 1000)
+        expected += interval
+
+async def run(mode: str, args, hashed: str):
+    hasher = PasswordHasher(args.workers, args.logins)
+
+    async def login():
+        if mode == "inline":
+            verify_password("password", hashed)
+            await asyncio.sleep(0)
+        else:
+            await hasher.verify("password", hashed)
+
+    stop = asyncio.Event()
+    lateness: list = []
+    streams = [
+        asyncio.create_task(stream(args.interval_ms / 1000, stop, lateness))
+        for _ in range(args.streams)
+    ]
+    await asyncio.sleep(args.interval_ms / 1000 * 5)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(args.logins)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await asyncio.gather(*streams)
+    hasher.shutdown()
+    print(
+        f"{mode:>9}: {args.logins / elapsed:7.1f} logins/s | stream tick lateness "
+        f"p50={statistics.median(lateness):7.1f} ms "
+        f"p99={percentile(lateness, 99):7.1f} ms "
+        f"max={max(lateness):7.1f} ms"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--streams", type=int, default=20)
+    parser.add_argument("--interval-ms", type=float, default=20.0)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    hashed = get_password_hash("password")
+    for mode in ("inline", "offloaded"):
+        asyncio.run(run(mode, args, hashed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Chat and message page load benchmark on a seeded auth database.
+
+Creates a scratch schema in the auth database, seeds --messages messages
+(--hot-chat-share of them in a single long chat) across --chats chats, and
+times the keyset page queries of ChatService at increasing depths, before and
+after adding the indexes of sql/migrations/001. The old unpaginated message
+query is timed for comparison. With the indexes, page loads should take the
+same time at every depth.
+
+    cd backend && python -m benchmarks.pagination --messages 1000000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from psycopg import AsyncConnection  # noqa: E402
+
+from app.core.auth_database import auth_db  # noqa: E402
+from app.services.chat_service import (  # noqa: E402
+    CHATS_PAGE_AFTER_QUERY, CHATS_PAGE_QUERY, MESSAGES_PAGE_BEFORE_QUERY, MESSAGES_PAGE_QUERY
+)
+from migrate import MIGRATIONS_DIR, split_statements  # noqa: E402
+
+SCHEMA = "pagination_bench"
+INDEX_MIGRATION = MIGRATIONS_DIR / "001_chat_pagination_indexes.sql"
+
+UNPAGINATED_MESSAGES_QUERY = """
+    SELECT m.id, m.chat_id, m.role, m.content, m.created_at
+    FROM messages m
+    JOIN chats c ON m.chat_id = c.id
+    WHERE c.user_id = %s AND m.chat_id = %s
+    ORDER BY m.created_at
+"""
+
+async def seed(conn: AsyncConnection, args):
+    print(f"Seeding {args.messages:,} messages in {args.chats:,} chats of {args.users:,} users...")
+    hot_messages = int(args.messages * args.hot_chat_share)
+    await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    await conn.execute(f"CREATE SCHEMA {SCHEMA}")
+    await conn.execute(f"SET search_path TO {SCHEMA}")
+    await conn.execute(
+        """
+        CREATE TABLE chats (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER,
+            title VARCHAR(255),
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    await conn.execute(
+        """
+        CREATE TABLE messages (
+            id SERIAL PRIMARY KEY,
+            chat_id INTEGER REFERENCES chats(id) ON DELETE CASCADE,
+            role VARCHAR(20) NOT NULL,
+            content TEXT NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    # Chat 1 belongs to user 1 and holds the hot share of all messages
+    await conn.execute(
+        """
+        INSERT INTO chats (user_id, title, created_at)
+        SELECT (g - 1) %% %s + 1, 'Chat ' || g, now() - g * interval '1 minute'
+        FROM generate_series(1, %s) g
+        """,
+        (args.users, args.chats)
+    )
+    await conn.execute(
+        """
+        INSERT INTO messages (chat_id, role, content, created_at)
+        SELECT
+            CASE WHEN g <= %s THEN 1 ELSE (g %% %s) + 1 END,
+            CASE WHEN g %% 2 = 0 THEN 'user' ELSE 'assistant' END,
+            repeat('lorem ipsum ', 20),
+            now() - g * interval '1 second'
+        FROM generate_series(1, %s) g
+        """,
+        (hot_messages, args.chats, args.messages)
+    )
+    await conn.execute("ANALYZE chats")
+    await conn.execute("ANALYZE messages")
+    return hot_messages
+
+async def timed(conn: AsyncConnection, query: str, params, repeat: int) -> float:
+    """Median wall time in ms of executing a query and fetching all its rows"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cur = await conn.execute(query, params)
+        await cur.fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+async def keyset_at(conn: AsyncConnection, query: str, params, offset: int):
+    """(created_at, id) of the row at an offset, i.e. the cursor a client holds at that depth"""
+    cur = await conn.execute(query + " OFFSET %s LIMIT 1", (*params, offset))
+    return await cur.fetchone()
+
+async def measure(conn: AsyncConnection, label: str, args, hot_messages: int):
+    limit = args.page_size
+    print(f"\n{label}")
+    for fraction in (0.0, 0.5, 0.99):
+        depth = int(hot_messages * fraction)
+        if depth == 0:
+            ms = await timed(conn, MESSAGES_PAGE_QUERY, (1, 1, limit + 1), args.repeat)
+        else:
+            position = await keyset_at(
+                conn,
+                "SELECT created_at, id FROM messages WHERE chat_id = %s ORDER BY created_at DESC, id DESC",
+                (1,),
+                depth
+            )
+            ms = await timed(
+                conn, MESSAGES_PAGE_BEFORE_QUERY, (1, 1, *position, limit + 1), args.repeat
+            )
+        print(f"  messages page at depth {depth:>9,}: {ms:8.2f} ms")
+
+    chats_per_user = args.chats // args.users
+    for fraction in (0.0, 0.5, 0.99):
+        depth = int(chats_per_user * fraction)
+        if depth == 0:
+            ms = await timed(conn, CHATS_PAGE_QUERY, (1, limit + 1), args.repeat)
+        else:
+            position = await keyset_at(
+                conn,
+                "SELECT created_at, id FROM chats WHERE user_id = %s ORDER BY created_at DESC, id DESC",
+                (1,),
+                depth
+            )
+            ms = await timed(conn, CHATS_PAGE_AFTER_QUERY, (1, *position, limit + 1), args.repeat)
+        print(f"  chats page at depth {depth:>12,}: {ms:8.2f} ms")
+
+    ms = await timed(conn, UNPAGINATED_MESSAGES_QUERY, (1, 1), max(1, args.repeat // 5))
+    print(f"  unpaginated hot chat ({hot_messages:,} rows): {ms:8.2f} ms")
+
+async def run(args):
+    conn = await AsyncConnection.connect(auth_db.conninfo, autocommit=True)
+    try:
+        hot_messages = await seed(conn, args)
+        await measure(conn, "Without indexes", args, hot_messages)
+        for statement in split_statements(INDEX_MIGRATION.read_text()):
+            await conn.execute(statement)
+        await conn.execute("ANALYZE chats")
+        await conn.execute("ANALYZE messages")
+        await measure(conn, "With the 001 migration indexes", args, hot_messages)
+    finally:
+        if not args.keep:
+            await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--hot-chat-share", type=float, default=0.2)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help=f"keep the {SCHEMA} schema afterwards")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Apply the versioned migrations in sql/migrations to the auth database.
+
+Files are named NNN_description.sql and applied in order; applied versions
+are recorded in schema_migrations. Statements run one at a time in
+autocommit mode so that CREATE INDEX CONCURRENTLY works, which means a
+migration must be safe to re-run (IF NOT EXISTS) if it fails halfway.
+
+    cd backend && python migrate.py
+"""
+import sys
+from pathlib import Path
+from typing import List
+
+import psycopg
+
+from app.core.auth_database import auth_db
+
+MIGRATIONS_DIR = Path(__file__).parent / "sql" / "migrations"
+
+def split_statements(text: str) -> List[str]:
+    """Statements of a migration file; comments are dropped, ';' ends a statement"""
+    lines = [line for line in text.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+def main() -> int:
+    with psycopg.connect(auth_db.conninfo, autocommit=True) as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        applied = {row[0] for row in conn.execute("SELECT version FROM schema_migrations")}
+        for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+            version = int(path.name.split("_", 1)[0])
+            if version in applied:
+                continue
+            print(f"Applying {path.name}")
+            for statement in split_statements(path.read_text()):
+                conn.execute(statement)
+            conn.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                (version, path.stem)
+            )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,13 @@
+from pathlib import Path
+
 import uvicorn
 
 if __name__ == "__main__":
+    # Development server; use serve.py in production
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
         port=8000,
         reload=True, # Enable auto-reload during development
-        reload_dirs=["/home/minecraftjuicer/vencovsky_projekt/backend/app"]
-        )
\ No newline at end of file
+        reload_dirs=[str(Path(__file__).parent / "app")]
+        )
@@ -0,0 +1,46 @@
+"""Production entry point: prefork uvicorn workers on uvloop and httptools.
+
+Every worker opens its connection pools and warms the schema catalog, prompt
+indexes and tokenizer before it accepts connections, then logs its cold-start
+time. On SIGTERM or SIGINT the workers stop accepting connections and give
+in-flight SSE streams SERVER_GRACEFUL_TIMEOUT_SECONDS to finish; streams still
+running after that are cancelled (their partial answers are saved) and the
+message writer is flushed.
+
+    cd backend && python serve.py
+"""
+import copy
+import importlib.util
+import os
+import time
+
+import uvicorn
+from uvicorn.config import LOGGING_CONFIG
+
+from app.core.config import settings
+
+def installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+def main():
+    # Workers report the time from here to being ready as their cold start
+    os.environ["SERVER_LAUNCHED_AT"] = str(time.time())
+
+    log_config = copy.deepcopy(LOGGING_CONFIG)
+    log_config["loggers"]["app"] = {"handlers": ["default"], "level": "INFO", "propagate": False}
+
+    uvicorn.run(
+        "app.main:app",
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=settings.SERVER_WORKERS or os.cpu_count() or 1,
+        loop="uvloop" if installed("uvloop") else "asyncio",
+        http="httptools" if installed("httptools") else "h11",
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT_SECONDS,
+        log_config=log_config,
+        access_log=False, # Request latency is exported on /metrics
+        proxy_headers=True
+    )
+
+if __name__ == "__main__":
+    main()
@@ -20,6 +20,64 @@ CREATE TABLE chats (
 CREATE TABLE messages (
     id SERIAL PRIMARY KEY,
     chat_id INTEGER REFERENCES chats(id) ON DELETE CASCADE,
+    role VARCHAR(20) NOT NULL,
     content TEXT NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
+
+CREATE TABLE chat_summaries (
+    chat_id INTEGER PRIMARY KEY REFERENCES chats(id) ON DELETE CASCADE,
+    summary TEXT NOT NULL,
+    upto_message_id INTEGER NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Keep in step with sql/migrations (apply those to existing databases with migrate.py)
+CREATE INDEX chats_user_id_created_at_id_idx ON chats (user_id, created_at DESC, id DESC);
+CREATE INDEX messages_chat_id_created_at_id_idx ON messages (chat_id, created_at, id);
+
+CREATE TABLE query_jobs (
+    id UUID PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    chat_id INTEGER REFERENCES chats(id) ON DELETE SET NULL,
+    question TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    sql_query TEXT,
+    result TEXT,
+    row_count INTEGER,
+    truncated BOOLEAN,
+    explanation TEXT,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE,
+    expires_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX query_jobs_status_created_at_idx ON query_jobs (status, created_at);
+CREATE INDEX query_jobs_user_id_created_at_idx ON query_jobs (user_id, created_at DESC);
+CREATE INDEX query_jobs_expires_at_idx ON query_jobs (expires_at);
+
+CREATE TABLE materialized_views (
+    name VARCHAR(63) PRIMARY KEY,
+    fingerprint VARCHAR(16) NOT NULL UNIQUE,
+    definition TEXT NOT NULL,
+    source_tables TEXT[] NOT NULL DEFAULT '{}',
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    refreshed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    refresh_seconds DOUBLE PRECISION,
+    last_error TEXT
+);
+
+CREATE TABLE schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO schema_migrations (version, name) VALUES
+    (1, '001_chat_pagination_indexes'),
+    (2, '002_query_jobs'),
+    (3, '003_materialized_views'),
+    (4, '004_chat_summaries');
@@ -0,0 +1,8 @@
+-- Keyset pagination of chats per user and of messages per chat.
+-- messages(chat_id, ...) also serves the history loader and ON DELETE CASCADE,
+-- chats(user_id, ...) the per-user deletes.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS chats_user_id_created_at_id_idx
+    ON chats (user_id, created_at DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS messages_chat_id_created_at_id_idx
+    ON messages (chat_id, created_at, id);
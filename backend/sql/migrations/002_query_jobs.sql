@@ -0,0 +1,24 @@
+-- Asynchronous question jobs and their stored results (app/services/job_service.py).
+CREATE TABLE IF NOT EXISTS query_jobs (
+    id UUID PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    chat_id INTEGER REFERENCES chats(id) ON DELETE SET NULL,
+    question TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    sql_query TEXT,
+    result TEXT,
+    row_count INTEGER,
+    truncated BOOLEAN,
+    explanation TEXT,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE,
+    expires_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Claiming the oldest queued job, listing a user's jobs, deleting expired ones
+CREATE INDEX IF NOT EXISTS query_jobs_status_created_at_idx ON query_jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS query_jobs_user_id_created_at_idx ON query_jobs (user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS query_jobs_expires_at_idx ON query_jobs (expires_at);
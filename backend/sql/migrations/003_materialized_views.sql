@@ -0,0 +1,12 @@
+-- Materialized views created in the analytics database by the query advisor
+-- (app/services/query_advisor.py), and when each was last refreshed.
+CREATE TABLE IF NOT EXISTS materialized_views (
+    name VARCHAR(63) PRIMARY KEY,
+    fingerprint VARCHAR(16) NOT NULL UNIQUE,
+    definition TEXT NOT NULL,
+    source_tables TEXT[] NOT NULL DEFAULT '{}',
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    refreshed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    refresh_seconds DOUBLE PRECISION,
+    last_error TEXT
+);
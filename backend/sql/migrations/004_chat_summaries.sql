@@ -0,0 +1,13 @@
+-- Summaries of older chat turns used by the history manager, and the
+-- messages.role column it reads. Rows stored before role existed are taken
+-- as user messages.
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS role VARCHAR(20) NOT NULL DEFAULT 'user';
+
+ALTER TABLE messages ALTER COLUMN role DROP DEFAULT;
+
+CREATE TABLE IF NOT EXISTS chat_summaries (
+    chat_id INTEGER PRIMARY KEY REFERENCES chats(id) ON DELETE CASCADE,
+    summary TEXT NOT NULL,
+    upto_message_id INTEGER NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,22 @@
+-- Run against the analytics database (e.g. dvdrental) as a superuser.
+-- Notifies the API's schema catalog whenever DDL changes the schema so it
+-- reloads its cached snapshot instead of waiting for the TTL.
+
+CREATE OR REPLACE FUNCTION notify_schema_catalog_changed()
+RETURNS event_trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify('schema_catalog_changed', tg_tag);
+END;
+$$;
+
+DROP EVENT TRIGGER IF EXISTS schema_catalog_ddl_end;
+CREATE EVENT TRIGGER schema_catalog_ddl_end
+    ON ddl_command_end
+    EXECUTE FUNCTION notify_schema_catalog_changed();
+
+DROP EVENT TRIGGER IF EXISTS schema_catalog_sql_drop;
+CREATE EVENT TRIGGER schema_catalog_sql_drop
+    ON sql_drop
+    EXECUTE FUNCTION notify_schema_catalog_changed();
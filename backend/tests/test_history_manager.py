@@ -0,0 +1,23 @@
+from app.services.history_manager import ChatHistory, HistoryMessage
+
+def test_merge_adds_turns_saved_by_other_workers_before_pending_ones():
+    history = ChatHistory(None, 0, [HistoryMessage(1, "user", "a"), HistoryMessage(2, "assistant", "b")])
+    pending = HistoryMessage(None, "user", "mine")
+    history.messages.append(pending)
+
+    history.merge([(3, "user", "c"), (4, "assistant", "d")])
+
+    assert [(m.id, m.content) for m in history.messages] == [
+        (1, "a"), (2, "b"), (3, "c"), (4, "d"), (None, "mine")
+    ]
+    assert history.last_message_id == 4
+
+def test_merge_matches_rows_to_messages_this_worker_is_saving():
+    pending = HistoryMessage(None, "user", "mine")
+    history = ChatHistory(None, 7, [pending])
+
+    history.merge([(8, "user", "mine")])
+    history.merge([(8, "user", "mine")])
+
+    assert [m.id for m in history.messages] == [8]
+    assert pending.id == 8
@@ -0,0 +1,19 @@
+import pytest
+from fastapi import HTTPException
+
+from app.services.query_executor import QueryResult
+from app.services.result_store import ResultStore
+from app.services.stream_runs import WORKER_ID
+
+def test_results_are_fetched_by_id_from_their_worker():
+    store = ResultStore()
+    result = QueryResult()
+    query_id = store.put(result, 7)
+    assert query_id.startswith(f"{WORKER_ID}.")
+    assert store.get(query_id) == (7, result)
+    assert store.get(f"{WORKER_ID}.missing") is None
+
+def test_results_of_another_worker_are_misdirected():
+    with pytest.raises(HTTPException) as raised:
+        ResultStore().get("otherworker.0123")
+    assert raised.value.status_code == 421
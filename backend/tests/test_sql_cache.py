@@ -0,0 +1,11 @@
+from app.services.sql_cache import normalize_question
+
+def test_sentence_punctuation_and_case_are_ignored():
+    assert normalize_question("How many films are there?") == normalize_question("how many  films, are there.")
+
+def test_operators_signs_and_decimals_are_kept():
+    assert normalize_question("films longer than > 100 minutes") != normalize_question("films longer than < 100 minutes")
+    assert normalize_question("rentals with amount != 5") != normalize_question("rentals with amount = 5")
+    assert normalize_question("payments of 5.99") != normalize_question("payments of 5 99")
+    assert normalize_question("balance below -10 or +10%") == "balance below -10 or +10%"
+    assert normalize_question("Payments of 5.99.") == "payments of 5.99"
@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+from app.services.sql_shapes import parameterize
+
+def test_comparison_literals_become_parameters():
+    statement = parameterize("SELECT * FROM film WHERE title = 'Alien''s' AND length > 120")
+    assert statement.text == "SELECT * FROM film WHERE title = %(p1)s AND length > %(p2)s"
+    assert statement.params == {"p1": "Alien's", "p2": 120}
+
+def test_repeated_literal_shares_one_placeholder():
+    expression = "CASE WHEN length > 120 THEN 'long' ELSE 'short' END"
+    statement = parameterize(f"SELECT {expression}, count(*) FROM film GROUP BY {expression}")
+    assert statement.text.count("%(p1)s") == 2
+    assert statement.params == {"p1": 120}
+    assert "'long'" in statement.text
+
+def test_in_list():
+    statement = parameterize("SELECT * FROM film WHERE rating IN ('G', 'PG') AND film_id IN (1, 2, 1)")
+    assert statement.text == "SELECT * FROM film WHERE rating IN (%(p1)s, %(p2)s) AND film_id IN (%(p3)s, %(p4)s, %(p3)s)"
+    assert statement.params == {"p1": "G", "p2": "PG", "p3": 1, "p4": 2}
+
+def test_in_subquery_keeps_its_literals():
+    statement = parameterize("SELECT * FROM film WHERE film_id IN (SELECT film_id FROM inventory WHERE store_id = 1)")
+    assert statement.text == "SELECT * FROM film WHERE film_id IN (SELECT film_id FROM inventory WHERE store_id = %(p1)s)"
+
+def test_between_bounds():
+    statement = parameterize("SELECT * FROM payment WHERE amount BETWEEN 1.5 AND 4 AND customer_id = 7")
+    assert statement.text == "SELECT * FROM payment WHERE amount BETWEEN %(p1)s AND %(p2)s AND customer_id = %(p3)s"
+    assert statement.params == {"p1": Decimal("1.5"), "p2": 4, "p3": 7}
+
+def test_type_prefixed_strings_stay_in_the_text():
+    statement = parameterize("SELECT * FROM rental WHERE rental_date > DATE '2005-06-01' AND note = E'a\\nb'")
+    assert statement.text == "SELECT * FROM rental WHERE rental_date > DATE '2005-06-01' AND note = E'a\\nb'"
+    assert statement.params == {}
+
+def test_percent_signs_are_escaped():
+    statement = parameterize("SELECT amount % 2, title FROM film WHERE title LIKE 'A%' AND length > 60")
+    assert statement.text == "SELECT amount %% 2, title FROM film WHERE title LIKE %(p1)s AND length > %(p2)s"
+    assert statement.params == {"p1": "A%", "p2": 60}
+
+def test_positions_and_function_arguments_stay_in_the_text():
+    statement = parameterize("SELECT round(amount, 2) FROM payment ORDER BY 1 LIMIT 10")
+    assert statement.text == "SELECT round(amount, 2) FROM payment ORDER BY 1 LIMIT %(p1)s"
+
+def test_shape_ignores_values_spacing_and_case():
+    first = parameterize("SELECT * FROM film WHERE film_id=5")
+    second = parameterize("select *  from film where film_id = 7")
+    assert first.fingerprint == second.fingerprint
+    assert first.fingerprint != parameterize("SELECT * FROM film WHERE length = 5").fingerprint
@@ -0,0 +1,64 @@
+import asyncio
+
+from app.services.stream_runs import StreamRun
+
+def _source(count: int, size: int):
+    def source(is_abandoned):
+        async def events():
+            # No await between events, like a result served from the cache
+            for i in range(count):
+                yield f"data: {i:0{size}d}\n\n"
+        return events()
+    return source
+
+async def _read_all(run: StreamRun, delay: float = 0.0):
+    events = []
+    async for event in run.subscribe():
+        events.append(event)
+        await asyncio.sleep(delay)
+    return events
+
+def test_attached_reader_gets_every_event_of_a_burst_larger_than_the_buffer():
+    async def scenario():
+        run = StreamRun("w.run", 1, buffer_bytes=1000, grace_seconds=0)
+        run.start(_source(10, 300))
+        events = await _read_all(run, delay=0.01)
+        await run.wait()
+        return events
+
+    events = asyncio.run(scenario())
+    assert len(events) == 11
+    assert all("no longer available" not in event for event in events)
+    assert events[-1].startswith("id: 11\n")
+
+def test_producer_waits_for_a_slow_reader_and_the_buffer_stays_bounded():
+    async def scenario():
+        run = StreamRun("w.run", 1, buffer_bytes=1000, grace_seconds=0)
+        run.start(_source(20, 300))
+        peak = 0
+        events = []
+        async for event in run.subscribe():
+            events.append(event)
+            peak = max(peak, run._buffered_bytes)
+            await asyncio.sleep(0)
+        await run.wait()
+        return events, peak
+
+    events, peak = asyncio.run(scenario())
+    assert len(events) == 21
+    # At most one event beyond the budget while the producer waits
+    assert peak <= 1000 + 320
+
+def test_detached_run_evicts_and_a_late_resume_reports_the_gap():
+    async def scenario():
+        run = StreamRun("w.run", 1, buffer_bytes=1000, grace_seconds=5)
+        run.start(_source(10, 300))
+        first = run.subscribe()
+        await first.__anext__()
+        await first.aclose()
+        await run.wait()
+        return [event async for event in run.subscribe(1)]
+
+    events = asyncio.run(scenario())
+    assert len(events) == 1
+    assert "no longer available" in events[0]
@@ -21,10 +21,16 @@ function removeAuthToken() {
 // ---------------------------------------------------------------------------
 let activeChatId = null;
 let messages = new Map();  // chatId -> array of messages
+// The API returns chats and messages a page at a time; X-Next-Cursor loads the next one
+let loadedChats = [];
+let chatsCursor = null;
+let messageCursors = new Map();  // chatId -> cursor of the older messages not loaded yet
 let isBotResponding = false;
 
 // The AbortController reference will be set whenever we start a streaming fetch.
 let abortController = null;
+// Run id and last event id of the answer being streamed, for resuming and stopping it
+let activeRun = null;
 
 // ---------------------------------------------------------------------------
 // 4. DOMContentLoaded: Set up all event listeners
@@ -244,13 +250,18 @@ function logout() {
 // ---------------------------------------------------------------------------
 // 7. Chat Management
 // ---------------------------------------------------------------------------
-async function loadChats() {
+async function loadChats(more = false) {
   try {
-    const response = await fetch(`${API_BASE_URL}/api/v1/chats`, {
+    const cursor = more ? chatsCursor : null;
+    const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+    const response = await fetch(`${API_BASE_URL}/api/v1/chats${query}`, {
       headers: { Authorization: `Bearer ${getAuthToken()}` },
     });
     if (response.ok) {
-      const chats = await response.json();
+      const page = await response.json();
+      loadedChats = more ? loadedChats.concat(page) : page;
+      chatsCursor = response.headers.get("X-Next-Cursor");
+      const chats = loadedChats;
       renderChatList(chats);
       // Auto-select first chat if none is selected
       if (!activeChatId && chats.length > 0) {
@@ -275,7 +286,9 @@ function renderChatList(chatsData) {
       <span class="chat-name">${chat.title}</span>
       <button class="delete-btn" onclick="event.stopPropagation(); deleteChat(${chat.id})">×</button>
     </div>
-  `).join("");
+  `).join("") + (chatsCursor ? `<button class="load-more-btn" id="loadMoreChats">Load older chats</button>` : "");
+
+  document.getElementById("loadMoreChats")?.addEventListener("click", () => loadChats(true));
 
   document.querySelectorAll(".chat-item").forEach(item => {
     item.addEventListener("click", async () => {
@@ -289,20 +302,24 @@ function renderChatList(chatsData) {
   });
 }
 
-async function loadChatMessages(chatId) {
+async function loadChatMessages(chatId, more = false) {
   try {
-    const response = await fetch(`${API_BASE_URL}/api/v1/chats/${chatId}/messages`, {
+    const cursor = more ? messageCursors.get(chatId) : null;
+    const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+    const response = await fetch(`${API_BASE_URL}/api/v1/chats/${chatId}/messages${query}`, {
       headers: { Authorization: `Bearer ${getAuthToken()}` },
     });
     if (!response.ok) {
       throw new Error("Failed to load messages.");
     }
+    messageCursors.set(chatId, response.headers.get("X-Next-Cursor"));
     const chatData = await response.json();
     console.log("Received chat data:", chatData);
     
-    // Clear existing messages first
+    // Clear existing messages first; older pages are rendered above the current ones
     const chatWindow = document.getElementById("chatWindow");
-    if (chatWindow) {
+    const previousHeight = chatWindow ? chatWindow.scrollHeight : 0;
+    if (chatWindow && !more) {
       chatWindow.innerHTML = "";
     }
     
@@ -329,7 +346,18 @@ async function loadChatMessages(chatId) {
     });
 
     console.log("Mapped messages:", mapped);
-    
+
+    if (more) {
+      // Keep the view on the message that was at the top before
+      const combined = mapped.concat(messages.get(chatId) || []);
+      messages.set(chatId, combined);
+      renderMessages(combined);
+      if (chatWindow) {
+        chatWindow.scrollTop = chatWindow.scrollHeight - previousHeight;
+      }
+      return;
+    }
+
     messages.set(chatId, mapped);
     renderMessages(mapped);
 
@@ -373,6 +401,15 @@ function renderMessages(messageList) {
 
   console.log("Rendering messages:", messageList); // Debug log
 
+  const chatId = activeChatId;
+  if (messageCursors.get(chatId)) {
+    const loadMore = document.createElement("button");
+    loadMore.className = "load-more-btn";
+    loadMore.textContent = "Load earlier messages";
+    loadMore.addEventListener("click", () => loadChatMessages(chatId, true));
+    chatWindow.appendChild(loadMore);
+  }
+
   messageList.forEach(msg => {
     const messageDiv = document.createElement("div");
     messageDiv.className = `message ${msg.sender}`;
@@ -465,9 +502,27 @@ async function sendMessage() {
 
   // Create a new AbortController for this request
   abortController = new AbortController();
+  activeRun = { runId: null, lastEventId: 0 };
+  const run = activeRun;
+
+  const botDiv = addMessage("bot", "");
+  let botResponse = "";
+
+  const handleEvent = ({ type, content, run_id }) => {
+    if (type === "run") {
+      run.runId = run_id;
+    } else if (type === "token") {
+      botResponse += content;
+      botDiv.querySelector("p").textContent = botResponse;
+    } else if (type === "end") {
+      saveToHistory(userInput, botResponse);
+    } else if (type === "error") {
+      botDiv.querySelector("p").textContent = content;
+    }
+  };
 
   try {
-    const response = await fetch(`${API_BASE_URL}/api/v1/query`, {
+    let response = await fetch(`${API_BASE_URL}/api/v1/query`, {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
@@ -476,42 +531,31 @@ async function sendMessage() {
       },
       // Pass the signal so we can cancel
       signal: abortController.signal,
-      body: JSON.stringify({ question: userInput, chat_id: activeChatId }),
+      body: JSON.stringify({
+        question: userInput,
+        chat_id: activeChatId,
+        result_format: "columnar",
+      }),
     });
 
-    const reader = response.body.getReader();
-    const decoder = new TextDecoder();
-    let botResponse = "";
-    let partialLine = "";
-
-    const botDiv = addMessage("bot", "");
-
-    while (true) {
-      const { done, value } = await reader.read();
-      if (done) break;
-
-      partialLine += decoder.decode(value, { stream: true });
-      const lines = partialLine.split("\n");
-      partialLine = lines.pop(); // keep incomplete chunk
-
-      for (const line of lines) {
-        if (!line.startsWith("data: ")) continue;
-        try {
-          const { type, content } = JSON.parse(line.slice(6));
-          if (type === "token") {
-            botResponse += content;
-            botDiv.querySelector("p").textContent = botResponse;
-          } else if (type === "end") {
-            saveToHistory(userInput, botResponse);
-          }
-        } catch (e) {
-          console.error("Error parsing SSE line:", e);
-          botDiv.querySelector("p").textContent = "Error processing response.";
-        }
+    // A dropped connection resumes the same answer from the last event received
+    for (let attempt = 0; ; attempt++) {
+      try {
+        await readEvents(response, run, handleEvent);
+        break;
+      } catch (error) {
+        if (error.name === "AbortError" || !run.runId || attempt >= 3) throw error;
+        await new Promise(resolve => setTimeout(resolve, 500 * (attempt + 1)));
+        response = await fetch(`${API_BASE_URL}/api/v1/query/runs/${run.runId}/events`, {
+          headers: {
+            "Accept": "text/event-stream",
+            "Last-Event-ID": String(run.lastEventId),
+            Authorization: `Bearer ${getAuthToken()}`,
+          },
+          signal: abortController.signal,
+        });
+        if (!response.ok) throw error;
       }
-      // Scroll to bottom
-      document.getElementById("chatWindow").scrollTop =
-        document.getElementById("chatWindow").scrollHeight;
     }
   } catch (error) {
     if (error.name === "AbortError") {
@@ -523,6 +567,38 @@ async function sendMessage() {
   } finally {
     // Reset the controller for the next request
     abortController = null;
+    activeRun = null;
+  }
+}
+
+async function readEvents(response, run, handleEvent) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let partialLine = "";
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+
+    partialLine += decoder.decode(value, { stream: true });
+    const lines = partialLine.split("\n");
+    partialLine = lines.pop(); // keep incomplete chunk
+
+    for (const line of lines) {
+      if (line.startsWith("id: ")) {
+        run.lastEventId = Number(line.slice(4));
+        continue;
+      }
+      if (!line.startsWith("data: ")) continue;
+      try {
+        handleEvent(JSON.parse(line.slice(6)));
+      } catch (e) {
+        console.error("Error parsing SSE line:", e);
+      }
+    }
+    // Scroll to bottom
+    document.getElementById("chatWindow").scrollTop =
+      document.getElementById("chatWindow").scrollHeight;
   }
 }
 
@@ -638,6 +714,13 @@ function setupChatInteraction() {
   if (stopBtn) {
     // Call a separate function or inline logic
     stopBtn.addEventListener("click", () => {
+      if (activeRun && activeRun.runId) {
+        // Stop the work on the server too, not just this connection
+        fetch(`${API_BASE_URL}/api/v1/query/runs/${activeRun.runId}`, {
+          method: "DELETE",
+          headers: { Authorization: `Bearer ${getAuthToken()}` },
+        }).catch(() => {});
+      }
       if (abortController) {
         abortController.abort();
       }